@@ -3,7 +3,8 @@ CloudFront URL testing, previews, and status indicators."""
 
 from django.contrib import admin
 from django.utils.html import format_html
-from .models import Video, Position, Technique, Guard, Tag
+from . import jobs
+from .models import Job, Video, Position, Technique, Guard, Tag
 
 
 # -----------------------------
@@ -25,12 +26,23 @@ class VideoAdmin(admin.ModelAdmin):
         'unsigned_video_link',
         'video_preview',
         'thumbnail_preview',
+        # File metadata (bjj.metadata)
+        'duration',
+        'width',
+        'height',
+        'bitrate',
+        'video_codec',
+        'audio_codec',
+        'file_size',
+        'faststart',
+        'probed_at',
     )
     list_filter = (
         'position',
         'technique',
         'guard',
         'tags',
+        'faststart',
     )
     search_fields = ('title',)
 
@@ -113,3 +125,20 @@ class GuardAdmin(admin.ModelAdmin):
 @admin.register(Tag)
 class TagAdmin(admin.ModelAdmin):
     list_display = ('name',)
+
+
+# -----------------------------
+# Background Jobs
+# -----------------------------
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('kind', 'payload', 'status', 'attempts', 'run_at', 'locked_by', 'updated_at')
+    list_filter = ('status', 'kind')
+    readonly_fields = ('attempts', 'locked_at', 'locked_by', 'last_error', 'created_at', 'updated_at')
+    ordering = ('-id',)
+    actions = ('retry_jobs',)
+
+    @admin.action(description="Retry selected jobs now")
+    def retry_jobs(self, request, queryset):
+        count = jobs.retry(queryset)
+        self.message_user(request, f"{count} jobs queued to run again.")
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class BjjConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'bjj'
+
+    def ready(self):
+        from . import signals  # noqa: F401  (registers signal handlers)
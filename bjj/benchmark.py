@@ -0,0 +1,300 @@
+"""Load-test harness for the public views (``manage.py benchmark_views``).
+
+``seed_catalog`` fills an empty database with a synthetic catalog: videos
+spread over guards, positions and techniques, and tags whose popularity
+follows a Zipf curve, so a few tags sit on a large share of the videos, as
+real tags do. Counts, tag caches and indexes are rebuilt as after an import.
+
+``local_stubs`` points CloudFront signing at a throwaway RSA key and an
+unroutable domain (signatures are still computed, so their cost is in the
+numbers) and replaces the S3 client with one that fails on any call.
+
+``plan_requests`` samples the URLs to fetch per view with a seeded RNG, so
+two runs against the same catalog request the same pages. They are fetched
+in-process with the Django test client (``run_client``) or over HTTP by a
+pool of processes (``run_http``), and summarised by ``summarize``.
+"""
+
+import contextlib
+import os
+import random
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from multiprocessing import get_context
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.core.wsgi import get_wsgi_application
+from django.db import transaction
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from jiujitsuteria.utils import aws
+from jiujitsuteria.utils.cloudfront import signed_url_cache
+from . import caching, counts
+from .models import CATEGORY_MODELS, Tag, Video
+from .tag_index import VERSION_NAME as TAG_INDEX_VERSION
+from .tag_matcher import VERSION_NAME as TAG_MATCHER_VERSION
+from .versions import bump_version
+
+VIEWS = ("index", "category_list", "category_videos", "tag_search", "video_detail")
+
+BATCH_SIZE = 5000
+
+TERMS = (
+    "armbar", "triangle", "kimura", "omoplata", "sweep", "pass", "escape", "takedown", "choke",
+    "heel hook", "knee cut", "berimbolo", "back take", "mount", "side control", "half guard",
+    "closed guard", "spider guard", "de la riva", "x guard", "butterfly", "single leg", "double leg",
+    "guillotine", "darce", "ezekiel", "loop choke", "wrist lock", "toe hold", "kneebar", "nogi",
+)
+
+
+# -----------------------------
+# Stats
+# -----------------------------
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    index = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies, errors, wall_seconds):
+    """Throughput and latency percentiles (ms) of one view's requests."""
+    latencies = sorted(latencies)
+    if not latencies:
+        return {"requests": 0, "errors": errors}
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / wall_seconds, 2) if wall_seconds else None,
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p90_ms": round(percentile(latencies, 90) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "max_ms": round(latencies[-1] * 1000, 3),
+    }
+
+
+# -----------------------------
+# Catalog
+# -----------------------------
+def tag_names(count):
+    """``count`` distinct tag names built from BJJ terms (``armbar``, ``armbar 2``, ...)."""
+    return [TERMS[i % len(TERMS)] + (f" {i // len(TERMS) + 1}" if i >= len(TERMS) else "") for i in range(count)]
+
+
+def seed_catalog(videos, tags, tags_per_video, categories, seed=0, log=lambda message: None):
+    """Create the synthetic catalog in the (empty) current database."""
+    rng = random.Random(seed)
+
+    with transaction.atomic():
+        tag_objs = Tag.objects.bulk_create([Tag(name=name) for name in tag_names(tags)])
+        tag_ids = [tag.pk for tag in tag_objs]
+        category_ids = {}
+        for field, model in CATEGORY_MODELS.items():
+            objs = model.objects.bulk_create(
+                [model(name=f"{field.title()} {i + 1}") for i in range(categories)]
+            )
+            category_ids[field] = [obj.pk for obj in objs]
+    log(f"🔹 {tags} tags, {categories} categories per type")
+
+    weights = [1 / (rank + 1) for rank in range(len(tag_ids))]  # Zipf, s=1
+    fields = list(CATEGORY_MODELS)
+    public_domain = getattr(settings, "CLOUDFRONT_PUBLIC_DOMAIN", None) or "thumbs.example.invalid"
+    created = 0
+    while created < videos:
+        batch = []
+        for n in range(created, min(videos, created + BATCH_SIZE)):
+            field = fields[n % len(fields)]
+            category = rng.choice(category_ids[field])
+            base = f"{field.title()}/{field.title()}_{category}/video_{n}"
+            thumbnail = f"https://{public_domain}/{base}.jpg"
+            batch.append(Video(
+                title=f"{rng.choice(TERMS).title()} drill {n}",
+                video_url=f"https://{settings.CLOUDFRONT_DOMAIN}/{base}.mp4",
+                thumbnail_url=thumbnail,
+                thumbnail_srcset={"webp": [[320, thumbnail.replace(".jpg", "-320.webp")]],
+                                  "jpg": [[320, thumbnail]]},
+                duration=rng.uniform(30, 900),
+                **{f"{field}_id": category},
+            ))
+        with transaction.atomic():
+            batch = Video.objects.bulk_create(batch)
+            links = []
+            for video in batch:
+                k = max(0, min(len(tag_ids), round(rng.gauss(tags_per_video, tags_per_video / 3))))
+                chosen = set()
+                while len(chosen) < k:
+                    chosen.update(rng.choices(tag_ids, weights, k=k - len(chosen)))
+                links += [Video.tags.through(video_id=video.pk, tag_id=tag_id) for tag_id in chosen]
+            Video.tags.through.objects.bulk_create(links, batch_size=BATCH_SIZE)
+            Video.refresh_tag_cache([video.pk for video in batch])
+        created += len(batch)
+        log(f"🔹 {created}/{videos} videos")
+
+    counts.recount()
+    bump_version(TAG_INDEX_VERSION)
+    bump_version(TAG_MATCHER_VERSION)
+    caching.invalidate()
+
+
+def catalog_stats():
+    videos = Video.objects.count()
+    links = Video.tags.through.objects.count()
+    return {
+        "videos": videos,
+        "tags": Tag.objects.count(),
+        "categories": {field: model.objects.count() for field, model in CATEGORY_MODELS.items()},
+        "tag_links": links,
+        "tags_per_video": round(links / videos, 2) if videos else 0,
+    }
+
+
+# -----------------------------
+# Local stubs
+# -----------------------------
+def write_throwaway_key():
+    """Write a 2048-bit PKCS#1 RSA key to a temporary file and return its path."""
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    pem = private_key.private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.TraditionalOpenSSL,  # PKCS#1, readable by both backends
+        encryption_algorithm=serialization.NoEncryption(),
+    )
+    with tempfile.NamedTemporaryFile(suffix=".pem", delete=False) as key_file:
+        key_file.write(pem)
+    return key_file.name
+
+
+def _offline_s3_client():
+    """An S3 client whose every call raises (botocore ``Stubber`` with no responses queued)."""
+    import boto3.session
+    from botocore.stub import Stubber
+
+    client = boto3.session.Session(
+        aws_access_key_id="benchmark", aws_secret_access_key="benchmark", region_name="us-east-1"
+    ).client("s3")
+    Stubber(client).activate()
+    return client
+
+
+@contextlib.contextmanager
+def local_stubs(**overrides):
+    """Sign with a throwaway key for a fake domain and keep S3 offline while active."""
+    key_file = write_throwaway_key()
+    stubbed = override_settings(
+        CLOUDFRONT_DOMAIN="video.example.invalid",
+        CLOUDFRONT_PUBLIC_DOMAIN="thumbs.example.invalid",
+        CLOUDFRONT_KEY_ID="BENCHMARKKEY",
+        CLOUDFRONT_KEY_FILE=key_file,
+        CLOUDFRONT_SIGNED_URL_CACHE_ALIAS=None,
+        AWS_PRIVATE_VIDEO_BUCKET="benchmark-private",
+        ALLOWED_HOSTS=["*"],
+        **overrides,
+    )
+    try:
+        with stubbed, aws.use_client("s3", _offline_s3_client()):
+            signed_url_cache.clear()
+            yield
+    finally:
+        signed_url_cache.clear()
+        os.remove(key_file)
+
+
+# -----------------------------
+# Requests
+# -----------------------------
+def plan_requests(views, count, seed=0):
+    """``{view: [path, ...]}``: ``count`` sampled URLs per view from the current catalog."""
+    rng = random.Random(seed)
+    category_ids = {
+        field: list(model.objects.filter(video_count__gt=0).values_list("pk", flat=True))
+        for field, model in CATEGORY_MODELS.items()
+    }
+    category_ids = {field: ids for field, ids in category_ids.items() if ids}
+    tags = list(Tag.objects.filter(video_count__gt=0).values_list("name", flat=True))
+    video_ids = list(Video.objects.values_list("pk", flat=True))
+
+    def path(view):
+        if view == "index":
+            return reverse("bjj:index")
+        if view == "category_list":
+            return reverse("bjj:category_list", args=[rng.choice(list(CATEGORY_MODELS))])
+        if view == "category_videos":
+            field = rng.choice(list(category_ids))
+            return reverse("bjj:category_videos", args=[field, rng.choice(category_ids[field])])
+        if view == "tag_search":
+            return f"{reverse('bjj:tag_search')}?{urlencode({'q': ' '.join(rng.sample(tags, rng.randint(1, 2)))})}"
+        if view == "video_detail":
+            return reverse("bjj:video_detail", args=[rng.choice(video_ids)])
+        raise ValueError(f"Unknown view: {view}")
+
+    return {view: [path(view) for _ in range(count)] for view in views}
+
+
+def run_client(paths):
+    """Fetch ``paths`` one after another with the Django test client; return the summary."""
+    client = Client()
+    latencies, errors = [], 0
+    started = time.perf_counter()
+    for path in paths:
+        request_started = time.perf_counter()
+        response = client.get(path)
+        latencies.append(time.perf_counter() - request_started)
+        errors += response.status_code != 200
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+
+def _fetch_all(args):
+    """Worker process: fetch each URL; return ``(latencies, errors)``."""
+    base_url, paths = args
+    latencies, errors = [], 0
+    for path in paths:
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(base_url + path, timeout=60) as response:
+                response.read()
+        except (urllib.error.URLError, OSError):
+            errors += 1
+            continue
+        latencies.append(time.perf_counter() - started)
+    return latencies, errors
+
+
+def run_http(base_url, paths, concurrency):
+    """Fetch ``paths`` from ``base_url`` with ``concurrency`` processes; return the summary."""
+    chunks = [(base_url, paths[i::concurrency]) for i in range(concurrency)]
+    # fork: workers only need the arguments, not a fresh Django setup
+    with get_context("fork").Pool(concurrency) as pool:
+        started = time.perf_counter()
+        results = pool.map(_fetch_all, chunks)
+        wall = time.perf_counter() - started
+    latencies = [latency for chunk, _ in results for latency in chunk]
+    return summarize(latencies, sum(errors for _, errors in results), wall)
+
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+@contextlib.contextmanager
+def local_server():
+    """Serve the site from a thread of this process; yields its base URL."""
+    server = ThreadedWSGIServer(("127.0.0.1", 0), _QuietHandler, allow_reuse_address=False)
+    server.set_app(get_wsgi_application())
+    thread = threading.Thread(target=server.serve_forever, name="benchmark-server", daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
@@ -0,0 +1,165 @@
+"""Versioned page and fragment caching for the public BJJ views.
+
+Everything rendered from videos, tags and categories is keyed by one
+``content`` version that ``bjj.signals`` bumps on any change, so cached
+pages and fragments are never served stale and never need to be deleted
+one by one.
+
+Pages are rendered under ``deferred_signing``: signed CloudFront URLs are
+written as placeholders and spliced in by ``splice_signed_urls`` each time
+the page is served, so cached HTML never holds an expiring signature. Only
+the placeholders issued by that render (stored with the cached page) are
+signed. Pages are keyed on the query parameters their view reads.
+Whole pages are cached for anonymous GET requests only; the video card grid
+is cached as a fragment (``bjj/includes/video_grid.html``) for everyone.
+
+``BJJ_PAGE_CACHE_TIMEOUT`` sets the lifetime in seconds; 0 disables caching.
+
+Pages about one object (a category, a tag, a video) also answer conditional
+GETs with ``conditional_page``: the ETag and Last-Modified come from the
+object's ``updated_at``, which ``bjj.signals`` touches whenever anything shown
+on its page changes, so a 304 costs one indexed lookup and no rendering.
+"""
+
+import datetime
+import hashlib
+from functools import wraps
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils import timezone
+from django.utils.cache import patch_vary_headers
+from django.views.decorators.http import condition
+
+from jiujitsuteria.utils.cloudfront import (
+    deferred_signing,
+    signing_epoch,
+    splice_signed_urls,
+)
+from .models import CATEGORY_MODELS, Tag, Video
+from .versions import bump_version, get_version
+
+VERSION_NAME = "content"
+
+
+def cache_timeout():
+    return getattr(settings, "BJJ_PAGE_CACHE_TIMEOUT", 600)
+
+
+def content_version():
+    return get_version(VERSION_NAME)
+
+
+def invalidate():
+    """Expire every cached page and fragment."""
+    bump_version(VERSION_NAME)
+
+
+def touch_videos(video_ids):
+    """Touch ``updated_at`` of the videos and every category and tag page that shows them."""
+    video_ids = list(video_ids)
+    if not video_ids:
+        return
+    now = timezone.now()
+    Video.objects.filter(pk__in=video_ids).update(updated_at=now)
+    for model in CATEGORY_MODELS.values():
+        model.objects.filter(video__in=video_ids).update(updated_at=now)
+    Tag.objects.filter(videos__in=video_ids).update(updated_at=now)
+
+
+def _page_key(request, params):
+    query = urlencode([(name, request.GET.getlist(name)) for name in params], doseq=True)
+    url = f"{request.get_host()}{request.path}?{query}"
+    digest = hashlib.md5(url.encode("utf-8")).hexdigest()
+    return f"bjj:page:{content_version()}:{digest}"
+
+
+def _is_cacheable(request, params):
+    return (
+        request.method in ("GET", "HEAD")
+        and cache_timeout() > 0
+        and not request.user.is_authenticated
+        # Other parameters (tracking tags, junk) would each need an entry,
+        # and the page may echo them (share links): render those uncached
+        and set(request.GET) <= set(params)
+    )
+
+
+def _finish(response, content, issued):
+    """Sign the placeholders issued for the page."""
+    response.content = splice_signed_urls(content, issued)
+    patch_vary_headers(response, ["Cookie"])
+    return response
+
+
+def cached_page(view=None, *, params=()):
+    """Serve anonymous GETs of ``view`` from the versioned page cache.
+
+    ``params`` are the query parameters the view reads; they are part of
+    the cache key, and requests with any other parameter bypass the cache::
+
+        @cached_page(params=("q", *PAGE_PARAMS))
+    """
+    if view is None:
+        return lambda view: cached_page(view, params=params)
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        cacheable = _is_cacheable(request, params)
+        if cacheable:
+            key = _page_key(request, params)
+            entry = cache.get(key)
+            if entry is not None:
+                content, content_type, issued = entry
+                return _finish(HttpResponse(content_type=content_type), content, issued)
+
+        with deferred_signing() as issued:
+            response = view(request, *args, **kwargs)
+        if response.streaming or response.status_code != 200:
+            return response
+
+        content = response.content.decode(response.charset)
+        if cacheable:
+            cache.set(key, (content, response["Content-Type"], dict(issued)), cache_timeout())
+        return _finish(response, content, issued)
+
+    return wrapper
+
+
+def conditional_page(get_object, signed=False, expires_in=None):
+    """Answer conditional GETs for a view from one object's ``updated_at``.
+
+    ``get_object(**view_kwargs)`` returns ``(model, pk)``. Validators also
+    cover the viewer, since the navigation differs for staff. For views that
+    embed signed URLs (``signed=True``) they cover the signed-URL bucket too
+    (see ``signing_epoch``), so a browser never keeps a page whose
+    signatures have rotated.
+    """
+    def signed_at():
+        return signing_epoch(expires_in) if signed else 0
+
+    def updated_at(request, **kwargs):
+        # condition() asks for the ETag and Last-Modified separately
+        if not hasattr(request, "_bjj_updated_at"):
+            model, pk = get_object(**kwargs)
+            request._bjj_updated_at = (
+                model.objects.filter(pk=pk).values_list("updated_at", flat=True).first()
+                if model is not None else None
+            )
+        return request._bjj_updated_at
+
+    def last_modified(request, *args, **kwargs):
+        updated = updated_at(request, **kwargs)
+        if updated is None:
+            return None
+        return max(updated, datetime.datetime.fromtimestamp(signed_at(), datetime.timezone.utc))
+
+    def etag(request, *args, **kwargs):
+        updated = updated_at(request, **kwargs)
+        if updated is None:
+            return None
+        return f"{updated.timestamp():.6f}-{signed_at()}-{request.user.pk or 0}"
+
+    return condition(etag_func=etag, last_modified_func=last_modified)
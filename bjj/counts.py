@@ -0,0 +1,72 @@
+"""Materialized video counts for categories and tags.
+
+``video_count`` columns on Position, Technique, Guard and Tag are adjusted
+incrementally by ``bjj.signals`` when a video is created, deleted, changes
+category or gains/loses tags, so listing pages never aggregate. The sorted
+listing of each type is additionally cached under a per-type version.
+``manage.py recount_videos`` rebuilds the columns after bulk edits that
+bypass signals (``QuerySet.update``, raw SQL, fixtures).
+"""
+
+from django.core.cache import cache
+from django.db.models import Count, F
+from django.db.models.functions import Greatest
+
+from .models import CATEGORY_MODELS, Tag
+from .versions import bump_version, get_version
+
+COUNTED_MODELS = {**CATEGORY_MODELS, "tag": Tag}
+CATEGORY_FIELDS = tuple(CATEGORY_MODELS)  # Video FK names: position, technique, guard
+
+LISTING_TIMEOUT = 60 * 60 * 24
+
+
+def _version_name(count_type):
+    return f"categories:{count_type}"
+
+
+def adjust(count_type, ids, delta):
+    """Add ``delta`` to ``video_count`` for the given ids of one type."""
+    ids = [pk for pk in ids if pk is not None]
+    if not ids or not delta:
+        return
+    COUNTED_MODELS[count_type].objects.filter(pk__in=ids).update(
+        video_count=Greatest(F("video_count") + delta, 0)
+    )
+    bump_version(_version_name(count_type))
+
+
+def invalidate(count_type):
+    """Drop the cached listing for a type (e.g. after a rename)."""
+    bump_version(_version_name(count_type))
+
+
+def category_listing(count_type):
+    """Return ``[{"id", "name", "video_count"}]`` for one type, sorted by name (cached)."""
+    version = get_version(_version_name(count_type))
+    key = f"bjj:listing:{count_type}:{version}"
+    listing = cache.get(key)
+    if listing is None:
+        listing = list(
+            COUNTED_MODELS[count_type].objects.order_by("name").values("id", "name", "video_count")
+        )
+        cache.set(key, listing, LISTING_TIMEOUT)
+    return listing
+
+
+def recount(count_types=None):
+    """Recompute ``video_count`` from scratch; returns the number of rows changed."""
+    changed = 0
+    for count_type in count_types or COUNTED_MODELS:
+        model = COUNTED_MODELS[count_type]
+        related = "videos" if model is Tag else "video"
+        stale = [
+            obj for obj in model.objects.annotate(actual=Count(related))
+            if obj.video_count != obj.actual
+        ]
+        for obj in stale:
+            obj.video_count = obj.actual
+        model.objects.bulk_update(stale, ["video_count"], batch_size=500)
+        changed += len(stale)
+        invalidate(count_type)
+    return changed
@@ -1,26 +1,41 @@
 """
 This module handles video uploads to S3 and saves metadata in the database.
 It uses Django forms to validate and process the upload.
-It sanitizes file paths to ensure they are S3-compatible.
-It uploads to AWS S3 and serves through CloudFront.
+Browsers normally upload straight to S3 (see bjj.uploads) and only send the
+metadata here; VideoUploadForm is the server-side fallback.
 """
 
-import re
-import boto3
 from django import forms
-from django.conf import settings
-from botocore.exceptions import ClientError
 from .models import Video
+from .uploads import UploadError, content_hash, create_video, existing_upload, upload_file, video_key
 
 
-# --- AWS Setup ---
-s3 = boto3.client("s3", region_name="ap-southeast-1")  # adjust if needed
-BUCKET_NAME = "bjj-video-storage"
+class VideoMetadataForm(forms.ModelForm):
+    """Metadata for a direct-to-S3 upload; the file itself never reaches the server."""
+    filename = forms.CharField(max_length=255)
+    size = forms.IntegerField(min_value=1)
+    # Computed by the browser, so only trusted once the probe job has checked it
+    content_hash = forms.RegexField(r"^[0-9a-f]{64}$", required=False)  # empty: no dedup
 
+    class Meta:
+        model = Video
+        fields = ["title", "guard", "position", "technique", "tags"]
+
+    def key(self):
+        return video_key(self.instance, self.cleaned_data["filename"])
 
-def sanitize_path(path: str) -> str:
-    """Make a path S3-safe (alphanumeric, _, ., -, / allowed)."""
-    return re.sub(r"[^a-zA-Z0-9/_\.-]", "_", path)
+    def existing(self):
+        """The video already holding this file at ``key()``, or None; raises ``DuplicateUpload``."""
+        return existing_upload(self.cleaned_data["content_hash"], self.key())
+
+    def save(self, key, replaced=True):
+        try:
+            return create_video(
+                self.instance, key, self.cleaned_data.get("tags"),
+                claimed_hash=self.cleaned_data["content_hash"], replaced=replaced,
+            )
+        except UploadError as e:
+            raise forms.ValidationError(f"❌ {e}")
 
 
 class VideoUploadForm(forms.ModelForm):
@@ -33,56 +48,19 @@ class VideoUploadForm(forms.ModelForm):
     def save(self, commit=True):
         instance = super().save(commit=False)
         uploaded_file = self.cleaned_data["file"]
+        key = video_key(instance, uploaded_file.name)
 
-        # ✅ Build path: Category/SubCategory/filename
-        if instance.guard:
-            key = f"Guard/{instance.guard.name}/{uploaded_file.name}"
-        elif instance.position:
-            key = f"Position/{instance.position.name}/{uploaded_file.name}"
-        elif instance.technique:
-            key = f"Technique/{instance.technique.name}/{uploaded_file.name}"
-        else:
-            key = f"Uncategorized/{uploaded_file.name}"
+        # A first pass over the file, so a duplicate is refused before uploading
+        digest = content_hash(uploaded_file)
 
-        key = sanitize_path(key)
-
-        # ✅ Upload to S3
         try:
-            s3.upload_fileobj(
-                uploaded_file,
-                BUCKET_NAME,
-                key,
-                ExtraArgs={
-                    "ContentType": "video/mp4",
-                    "CacheControl": "max-age=31536000, public",
-                },
+            # ✅ Upload to S3 (multipart, parts sent in parallel), unless this file is already at this key
+            replaced = existing_upload(digest, key) is None
+            if replaced:
+                upload_file(uploaded_file, key)
+            # ✅ Save or update DB entry (no duplicates) with tags
+            return create_video(
+                instance, key, self.cleaned_data.get("tags") if commit else None, digest, replaced=replaced
             )
-        except Exception as e:
-            raise forms.ValidationError(f"❌ Failed to upload video to S3: {e}")
-
-        # ✅ Use CloudFront URL (clean, no ?v=)
-        cloudfront_domain = getattr(settings, "CLOUDFRONT_DOMAIN", "")
-        if not cloudfront_domain:
-            raise forms.ValidationError("CloudFront domain is not configured in settings.")
-
-        clean_url = f"{cloudfront_domain}/{key}"
-
-        # ✅ Save or update DB entry (no duplicates)
-        video, created = Video.objects.update_or_create(
-            video_url=clean_url,
-            defaults={
-                "title": instance.title,
-                "guard": instance.guard,
-                "position": instance.position,
-                "technique": instance.technique,
-            },
-        )
-
-        if commit:
-            video.save()
-            self.save_m2m()
-            # ✅ Save tags (many-to-many)
-            if "tags" in self.cleaned_data:
-                video.tags.set(self.cleaned_data["tags"])
-
-        return video
+        except UploadError as e:
+            raise forms.ValidationError(f"❌ {e}")
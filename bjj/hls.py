@@ -0,0 +1,217 @@
+"""HLS adaptive-bitrate packaging for videos in the private S3 bucket.
+
+``package_hls`` transcodes a video with local ffmpeg into a ladder of
+renditions (``BJJ_HLS_LADDER``, never above the source height) cut into
+``BJJ_HLS_SEGMENT_SECONDS`` MPEG-TS segments, with keyframes aligned across
+renditions so players can switch at any segment. Everything goes under the
+video's own key prefix (``Guard/X/sweep.mp4`` → ``Guard/X/sweep/hls/``)::
+
+    master.m3u8
+    360p/index.m3u8  360p/seg_00000.ts ...
+    720p/index.m3u8  720p/seg_00000.ts ...
+
+Playlists are served through ``bjj.views.video_playlist``, which rewrites
+them on the fly (``signed_playlist``): variant playlists point back at the
+view, segments at CloudFront with the query string of one wildcard policy
+covering the whole ``hls/`` prefix. Relative URIs can't carry a signature,
+so this is what lets the browser fetch segments directly from CloudFront.
+"""
+
+import hashlib
+import mimetypes
+import os
+import posixpath
+import re
+import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+
+from jiujitsuteria.utils.cloudfront import get_signed_url, signing_scope
+
+MASTER_PLAYLIST = "master.m3u8"
+PLAYLIST_TYPE = "application/vnd.apple.mpegurl"
+
+# Playlist names accepted from URLs, relative to the hls/ prefix
+PLAYLIST_NAME = re.compile(r"(?:[\w-]+/)?[\w-]+\.m3u8")
+
+DEFAULT_LADDER = ((360, 800), (540, 1600), (720, 3000), (1080, 5000))  # (height, video kbps)
+AUDIO_BITRATE = "128k"
+UPLOAD_WORKERS = 8
+
+_VIDEO_SIZE = re.compile(rb"Stream #\d+:\d+.*?: Video: .*?, (\d{2,5})x(\d{2,5})")
+_URI_ATTRIBUTE = re.compile(r'URI="([^"]+)"')
+
+CONTENT_TYPES = {
+    ".m3u8": (PLAYLIST_TYPE, "max-age=60"),
+    ".ts": ("video/mp2t", "max-age=31536000"),
+}
+
+
+class PackagingError(Exception):
+    pass
+
+
+def hls_prefix_for(s3_key):
+    """``Guard/X/sweep.mp4`` → ``Guard/X/sweep/hls/``"""
+    base, _ = os.path.splitext(s3_key)
+    return f"{base}/hls/"
+
+
+def ladder():
+    return tuple(getattr(settings, "BJJ_HLS_LADDER", DEFAULT_LADDER))
+
+
+def segment_seconds():
+    return getattr(settings, "BJJ_HLS_SEGMENT_SECONDS", 4)
+
+
+def url_ttl():
+    """Seconds the segment signatures in a served playlist stay valid."""
+    return getattr(settings, "BJJ_HLS_URL_TTL", 6 * 3600)
+
+
+# -----------------------------
+# Transcoding
+# -----------------------------
+def probe_streams(source):
+    """Return ``(height, has_audio)`` of ``source`` from ffmpeg's stream listing."""
+    result = subprocess.run(["ffmpeg", "-hide_banner", "-i", source], capture_output=True, check=False)
+    match = _VIDEO_SIZE.search(result.stderr)
+    if not match:
+        raise PackagingError("could not find a video stream")
+    return int(match.group(2)), b": Audio: " in result.stderr
+
+
+def renditions_for(height):
+    """Ladder rungs up to the source height, or one rung at the source height if it is smaller."""
+    rungs = [(h, kbps) for h, kbps in ladder() if h <= height]
+    return rungs or [(height - height % 2, ladder()[0][1])]
+
+
+def transcode(source, outdir):
+    """Encode ``source`` into the HLS ladder in ``outdir``; return the rendition heights."""
+    height, has_audio = probe_streams(source)
+    rungs = renditions_for(height)
+    seconds = segment_seconds()
+
+    split = "".join(f"[s{i}]" for i in range(len(rungs)))
+    scales = [f"[s{i}]scale=-2:{h}[v{i}]" for i, (h, _) in enumerate(rungs)]
+    args = [
+        "ffmpeg", "-loglevel", "error", "-y", "-i", source,
+        "-filter_complex", f"[0:v]split={len(rungs)}{split};" + ";".join(scales),
+    ]
+    streams = []
+    for i, (h, kbps) in enumerate(rungs):
+        args += [
+            "-map", f"[v{i}]",
+            f"-c:v:{i}", "libx264", f"-b:v:{i}", f"{kbps}k",
+            f"-maxrate:v:{i}", f"{kbps * 107 // 100}k", f"-bufsize:v:{i}", f"{kbps * 3 // 2}k",
+        ]
+        if has_audio:
+            args += ["-map", "0:a:0"]
+            streams.append(f"v:{i},a:{i},name:{h}p")
+        else:
+            streams.append(f"v:{i},name:{h}p")
+    if has_audio:
+        args += ["-c:a", "aac", "-b:a", AUDIO_BITRATE, "-ac", "2"]
+    args += [
+        "-preset", "veryfast", "-profile:v", "main", "-pix_fmt", "yuv420p",
+        # a keyframe at every segment boundary, at the same time in every rendition
+        "-force_key_frames", f"expr:gte(t,n_forced*{seconds})", "-sc_threshold", "0",
+        "-f", "hls",
+        "-hls_time", str(seconds),
+        "-hls_playlist_type", "vod",
+        "-hls_flags", "independent_segments",
+        "-hls_segment_filename", os.path.join(outdir, "%v", "seg_%05d.ts"),
+        "-master_pl_name", MASTER_PLAYLIST,
+        "-var_stream_map", " ".join(streams),
+        os.path.join(outdir, "%v", "index.m3u8"),
+    ]
+    subprocess.run(args, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    if not os.path.exists(os.path.join(outdir, MASTER_PLAYLIST)):
+        raise PackagingError("ffmpeg produced no master playlist")
+    return [h for h, _ in rungs]
+
+
+def _upload_tree(s3_client, outdir, prefix):
+    def upload(path):
+        name = os.path.relpath(path, outdir).replace(os.sep, "/")
+        ext = os.path.splitext(name)[1]
+        content_type, cache_control = CONTENT_TYPES.get(ext, (mimetypes.guess_type(name)[0], "max-age=60"))
+        s3_client.upload_file(
+            path,
+            settings.AWS_PRIVATE_VIDEO_BUCKET,
+            prefix + name,
+            ExtraArgs={"ContentType": content_type or "application/octet-stream", "CacheControl": cache_control},
+        )
+        return prefix + name
+
+    paths = [os.path.join(root, name) for root, _, names in os.walk(outdir) for name in names]
+    segments = [path for path in paths if not path.endswith(".m3u8")]
+    with ThreadPoolExecutor(max_workers=UPLOAD_WORKERS, thread_name_prefix="hls") as pool:
+        list(pool.map(upload, segments))
+    # Playlists last, so a playlist never points at a missing segment
+    playlists = [upload(path) for path in paths if path.endswith(".m3u8")]
+    cache.delete_many([_playlist_cache_key(key) for key in playlists])
+
+
+def package_hls(s3_client, s3_key):
+    """Transcode and upload the HLS ladder for ``s3_key``; return the master playlist key."""
+    prefix = hls_prefix_for(s3_key)
+    with tempfile.TemporaryDirectory(prefix="bjj-hls-") as workdir:
+        video_path = os.path.join(workdir, "source.mp4")
+        outdir = os.path.join(workdir, "hls")
+        os.mkdir(outdir)
+        s3_client.download_file(settings.AWS_PRIVATE_VIDEO_BUCKET, s3_key, video_path)
+        transcode(video_path, outdir)
+        _upload_tree(s3_client, outdir, prefix)
+    return prefix + MASTER_PLAYLIST
+
+
+# -----------------------------
+# Serving
+# -----------------------------
+def _playlist_cache_key(key):
+    return f"bjj:hls:{hashlib.md5(key.encode('utf-8')).hexdigest()}"
+
+
+def playlist_text(s3_client, key):
+    """Playlist body from the private bucket; playlists are small and cached."""
+    cache_key = _playlist_cache_key(key)
+    text = cache.get(cache_key)
+    if text is None:
+        body = s3_client.get_object(Bucket=settings.AWS_PRIVATE_VIDEO_BUCKET, Key=key)["Body"]
+        text = body.read().decode("utf-8")
+        cache.set(cache_key, text, 24 * 3600)
+    return text
+
+
+def signed_playlist(text, prefix, name, playlist_url):
+    """Rewrite the URIs in playlist ``text``, stored at ``prefix + name``.
+
+    Nested playlists become ``playlist_url(name)``, with ``name`` relative
+    to ``prefix``; everything else becomes a CloudFront URL signed with the
+    wildcard policy for ``prefix``.
+    """
+    directory = posixpath.dirname(prefix + name)
+
+    def rewrite(uri):
+        target = posixpath.normpath(posixpath.join(directory, uri))
+        if not target.startswith(prefix):
+            raise PackagingError(f"playlist URI outside its prefix: {uri}")
+        if target.endswith(".m3u8"):
+            return playlist_url(target[len(prefix):])
+        return get_signed_url(target, expires_in=url_ttl())
+
+    lines = []
+    with signing_scope(prefix):
+        for line in text.splitlines():
+            if line and not line.startswith("#"):
+                line = rewrite(line.strip())
+            elif line.startswith("#") and 'URI="' in line:
+                line = _URI_ATTRIBUTE.sub(lambda m: f'URI="{rewrite(m.group(1))}"', line)
+            lines.append(line)
+    return "\n".join(lines) + "\n"
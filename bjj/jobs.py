@@ -0,0 +1,234 @@
+"""Database-backed background jobs for post-upload processing.
+
+Jobs are ``Job`` rows, so no broker is needed and a job enqueued inside a
+transaction only becomes visible when it commits. ``manage.py run_jobs``
+workers claim them with ``SELECT ... FOR UPDATE SKIP LOCKED``, so any
+number of workers share the queue without taking the same job (SQLite has
+no row locks: run a single worker there).
+
+A job that raises is retried with exponential backoff until it has run
+``max_attempts`` times, then marked failed. A running job's lock is renewed
+while it runs (long transcodes included); a job whose worker died is claimed
+again once its lock is older than ``BJJ_JOB_LOCK_TIMEOUT`` seconds.
+Handlers are registered per kind and must be safe to run twice::
+
+    @handler("thumbnail")
+    def make_thumbnails(video_id, force=False): ...
+
+    enqueue("thumbnail", video_id=video.pk)
+"""
+
+import contextlib
+import random
+import threading
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from jiujitsuteria.utils.aws import get_client
+from . import caching, hls, metadata, search, uploads
+from .models import Job, Video
+from .tag_index import VERSION_NAME as TAG_INDEX_VERSION
+from .thumbnails import ThumbnailError, generate_thumbnail, video_s3_key
+from .versions import bump_version
+
+HANDLERS = {}
+
+BACKOFF_BASE = 30        # seconds before the first retry, doubled on each one
+BACKOFF_MAX = 60 * 60
+
+# Queued by the probe job of an upload once it succeeds: it fills in the
+# duration they use and may rewrite the file in place (faststart remux).
+AFTER_PROBE_JOBS = ("thumbnail", "hls")
+
+
+def handler(kind):
+    def register(func):
+        HANDLERS[kind] = func
+        return func
+    return register
+
+
+def lock_timeout():
+    return getattr(settings, "BJJ_JOB_LOCK_TIMEOUT", 15 * 60)
+
+
+def enqueue(kind, run_at=None, max_attempts=None, **payload):
+    """Queue a ``kind`` job with ``payload`` as handler kwargs.
+
+    Returns the new job, or None when the same job is already waiting.
+    """
+    if kind not in HANDLERS:
+        raise ValueError(f"Unknown job kind: {kind}")
+    if Job.objects.filter(kind=kind, payload=payload, status=Job.QUEUED).exists():
+        return None
+    job = Job(kind=kind, payload=payload, run_at=run_at or timezone.now())
+    if max_attempts is not None:
+        job.max_attempts = max_attempts
+    job.save()
+    return job
+
+
+def enqueue_post_upload(video_id, claimed_hash=""):
+    """Queue probing (then thumbnails and HLS) and indexing for one newly uploaded video.
+
+    A ``claimed_hash`` from the browser is checked by the probe job.
+    """
+    payload = {"claimed_hash": claimed_hash} if claimed_hash else {}
+    enqueue("probe", video_id=video_id, then=list(AFTER_PROBE_JOBS), **payload)
+    enqueue("index", video_id=video_id)
+
+
+def backoff(attempts):
+    """Delay before retrying a job that has failed ``attempts`` times (with jitter)."""
+    delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempts - 1))
+    return timedelta(seconds=delay * random.uniform(0.75, 1.0))
+
+
+def claim(worker):
+    """Lock the next due job for ``worker`` and mark it running, or return None."""
+    now = timezone.now()
+    with transaction.atomic():
+        job = (
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(
+                Q(status=Job.QUEUED, run_at__lte=now)
+                | Q(status=Job.RUNNING, locked_at__lt=now - timedelta(seconds=lock_timeout()))
+            )
+            .order_by("run_at", "id")
+            .first()
+        )
+        if job is None:
+            return None
+        job.status = Job.RUNNING
+        job.attempts += 1
+        job.locked_at = now
+        job.locked_by = worker
+        job.save(update_fields=["status", "attempts", "locked_at", "locked_by", "updated_at"])
+    return job
+
+
+@contextlib.contextmanager
+def heartbeat(job):
+    """Renew ``job``'s lock in the background while the block runs."""
+    stop = threading.Event()
+
+    def beat():
+        while not stop.wait(lock_timeout() / 3):
+            Job.objects.filter(pk=job.pk, locked_by=job.locked_by).update(locked_at=timezone.now())
+        connection.close()  # this thread's own connection
+
+    thread = threading.Thread(target=beat, name=f"job-{job.pk}-heartbeat", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def run(job):
+    """Run a claimed job and record the outcome; return True on success."""
+    try:
+        if job.attempts > job.max_attempts:
+            raise RuntimeError(f"Gave up after {job.max_attempts} attempts (worker lost)")
+        with heartbeat(job):
+            HANDLERS[job.kind](**job.payload)
+    except Exception:
+        job.last_error = traceback.format_exc()
+        if job.attempts >= job.max_attempts or job.kind not in HANDLERS:
+            job.status = Job.FAILED
+        else:
+            job.status = Job.QUEUED
+            job.run_at = timezone.now() + backoff(job.attempts)
+    else:
+        job.status = Job.DONE
+        job.last_error = ""
+    job.locked_at = None
+    job.locked_by = ""
+    job.save(update_fields=["status", "run_at", "last_error", "locked_at", "locked_by", "updated_at"])
+    return job.status == Job.DONE
+
+
+def retry(jobs):
+    """Queue ``jobs`` (a queryset) to run again now with a fresh attempt count."""
+    return jobs.exclude(status=Job.RUNNING).update(
+        status=Job.QUEUED, attempts=0, run_at=timezone.now(), last_error="", updated_at=timezone.now()
+    )
+
+
+# -----------------------------
+# Handlers
+# -----------------------------
+@handler("probe")
+def probe_metadata(video_id, remux=None, then=(), claimed_hash=""):
+    """Store one video's file metadata; remux it for faststart if asked (see bjj.metadata).
+
+    ``remux`` defaults to ``BJJ_REMUX_FASTSTART``. The ``then`` job kinds
+    are queued for the video afterwards. ``claimed_hash``, computed by the
+    browser before a direct upload, becomes the video's ``content_hash``
+    only if the uploaded object matches it (read before any remux).
+    """
+    video = Video.objects.filter(pk=video_id).first()
+    if video is None:
+        return
+    s3_key = video_s3_key(video)
+    if not s3_key:
+        raise metadata.MetadataError(f"No valid S3 key for video {video_id}")
+    s3_client = get_client("s3")
+    verified = bool(claimed_hash) and uploads.object_hash(s3_client, s3_key) == claimed_hash
+    if remux is None:
+        remux = getattr(settings, "BJJ_REMUX_FASTSTART", False)
+    fields, _ = metadata.probe_and_remux(s3_client, s3_key, remux)
+    if verified:
+        fields["content_hash"] = claimed_hash
+    metadata.save_metadata(video, fields)
+    for kind in then:
+        # A re-uploaded file replaces the old thumbnails and renditions
+        enqueue(kind, video_id=video_id, force=True)
+
+
+@handler("thumbnail")
+def make_thumbnails(video_id, force=False):
+    """Generate one video's thumbnails and storyboard (see bjj.thumbnails)."""
+    video = Video.objects.filter(pk=video_id).first()
+    if video is None or (video.thumbnail_srcset and not force):
+        return
+    s3_key = video_s3_key(video)
+    if not s3_key:
+        raise ThumbnailError(f"No valid S3 key for video {video_id}")
+    fields = generate_thumbnail(get_client("s3"), s3_key, duration=video.duration)
+    for name, value in fields.items():
+        setattr(video, name, value)
+    video.save(update_fields=list(fields))
+
+
+@handler("hls")
+def make_hls(video_id, force=False):
+    """Transcode one video into the HLS ladder (see bjj.hls)."""
+    video = Video.objects.filter(pk=video_id).first()
+    if video is None or (video.hls_playlist_key and not force):
+        return
+    s3_key = video_s3_key(video)
+    if not s3_key:
+        raise hls.PackagingError(f"No valid S3 key for video {video_id}")
+    video.hls_playlist_key = hls.package_hls(get_client("s3"), s3_key)
+    video.save(update_fields=["hls_playlist_key"])
+
+
+@handler("index")
+def index_video(video_id=None, video_ids=()):
+    """Rebuild the tag cache and search document of one video (or of
+    ``video_ids``, queued by a tag or category rename) and the cached indexes."""
+    requested = [pk for pk in (video_id, *video_ids) if pk is not None]
+    video_ids = list(Video.objects.filter(pk__in=requested).values_list("pk", flat=True))
+    if not video_ids:
+        return
+    Video.refresh_tag_cache(video_ids)
+    search.index_videos(video_ids)
+    bump_version(TAG_INDEX_VERSION)
+    caching.invalidate()
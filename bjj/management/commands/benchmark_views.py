@@ -0,0 +1,171 @@
+"""
+Django management command to load-test the public views against a synthetic
+catalog (throughput and latency percentiles per view, saved as JSON).
+
+Runs in a separate test database (``test_<NAME>``), never the configured
+one. With --keepdb the seeded catalog is kept and reused by later runs, so
+results from different commits can be compared on the same data.
+"""
+
+import contextlib
+import datetime
+import json
+import logging
+import platform
+import subprocess
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_databases, teardown_databases
+
+from bjj import benchmark
+from bjj.models import Video
+
+
+def _git_commit():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True, cwd=settings.BASE_DIR
+        ).stdout.strip()
+        dirty = bool(subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"],
+            capture_output=True, text=True, check=True, cwd=settings.BASE_DIR,
+        ).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit, dirty
+
+
+class Command(BaseCommand):
+    help = "Benchmark the public views on a synthetic catalog (req/s, p50/p99 latency) and save JSON results"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--videos", type=int, default=10000, help="Videos to seed (default 10000)")
+        parser.add_argument("--tags", type=int, default=2000, help="Tags to seed (default 2000)")
+        parser.add_argument("--tags-per-video", type=float, default=6, help="Mean tags per video (default 6)")
+        parser.add_argument("--categories", type=int, default=30, help="Guards, positions and techniques each (default 30)")
+        parser.add_argument(
+            "--view",
+            action="append",
+            choices=benchmark.VIEWS,
+            help="View to benchmark (repeatable, default: all)",
+        )
+        parser.add_argument("--requests", type=int, default=300, help="Measured requests per view (default 300)")
+        parser.add_argument("--warmup", type=int, default=30, help="Unmeasured requests per view first (default 30)")
+        parser.add_argument(
+            "--driver",
+            choices=("client", "http", "both"),
+            default="both",
+            help="In-process test client, HTTP from several processes, or both (default)",
+        )
+        parser.add_argument("--concurrency", type=int, default=4, help="HTTP driver processes (default 4)")
+        parser.add_argument(
+            "--url",
+            help="Drive this running server instead of a local one (it must serve the benchmark database)",
+        )
+        parser.add_argument(
+            "--no-page-cache",
+            action="store_true",
+            help="Render every request (BJJ_PAGE_CACHE_TIMEOUT=0)",
+        )
+        parser.add_argument("--seed", type=int, default=0, help="Random seed for the catalog and URLs (default 0)")
+        parser.add_argument("--keepdb", action="store_true", help="Keep the benchmark database and reuse its catalog")
+        parser.add_argument(
+            "--output",
+            help="JSON results file (default: benchmark-<commit>.json)",
+        )
+
+    def handle(self, *args, **options):
+        self.verbosity = options["verbosity"]
+        views = options["view"] or list(benchmark.VIEWS)
+        drivers = ["client", "http"] if options["driver"] == "both" else [options["driver"]]
+        if options["concurrency"] < 1:
+            raise CommandError("❌ --concurrency must be at least 1")
+        if self.verbosity < 2:
+            # Budget warnings and 404s would drown the results
+            logging.getLogger("jiujitsuteria.middleware").setLevel(logging.ERROR)
+            logging.getLogger("django.request").setLevel(logging.ERROR)
+
+        overrides = {"BJJ_PAGE_CACHE_TIMEOUT": 0} if options["no_page_cache"] else {}
+        old_config = setup_databases(self.verbosity, interactive=False, keepdb=options["keepdb"])
+        try:
+            with benchmark.local_stubs(**overrides):
+                catalog = self.prepare_catalog(options)
+                results = self.run(views, drivers, options)
+        finally:
+            teardown_databases(old_config, self.verbosity, keepdb=options["keepdb"])
+
+        commit, dirty = _git_commit()
+        report = {
+            "commit": commit,
+            "dirty": dirty,
+            "started_at": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "database": connection.vendor,
+            "catalog": catalog,
+            "options": {
+                name: options[name]
+                for name in ("requests", "warmup", "concurrency", "seed", "no_page_cache", "url")
+            },
+            "results": results,
+        }
+        output = options["output"] or f"benchmark-{(commit or 'unknown')[:12]}.json"
+        with open(output, "w") as results_file:
+            json.dump(report, results_file, indent=2)
+        self.stdout.write(f"🎉 Results saved to {output}")
+
+    def prepare_catalog(self, options):
+        if Video.objects.exists():
+            self.stdout.write("🔹 Reusing the catalog in the benchmark database")
+        else:
+            self.stdout.write(
+                f"🔹 Seeding {options['videos']} videos, {options['tags']} tags "
+                f"(~{options['tags_per_video']:g} per video)..."
+            )
+            benchmark.seed_catalog(
+                options["videos"], options["tags"], options["tags_per_video"], options["categories"],
+                seed=options["seed"], log=self.stdout.write if self.verbosity > 1 else lambda message: None,
+            )
+        catalog = benchmark.catalog_stats()
+        self.stdout.write(
+            f"🔹 Catalog: {catalog['videos']} videos, {catalog['tags']} tags, "
+            f"{catalog['tags_per_video']} tags per video"
+        )
+        return catalog
+
+    def run(self, views, drivers, options):
+        plans = benchmark.plan_requests(views, options["warmup"] + options["requests"], seed=options["seed"])
+        results = {}
+        for driver in drivers:
+            self.stdout.write(f"🔹 {driver}" + (f" ({options['concurrency']} processes)" if driver == "http" else ""))
+            self.stdout.write(f"{'view':<18}{'req/s':>10}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'errors':>8}")
+            with self.target(driver, options) as base_url:
+                results[driver] = {}
+                for view in views:
+                    warmup, measured = plans[view][:options["warmup"]], plans[view][options["warmup"]:]
+                    if driver == "client":
+                        benchmark.run_client(warmup)
+                        summary = benchmark.run_client(measured)
+                    else:
+                        benchmark.run_http(base_url, warmup, options["concurrency"])
+                        summary = benchmark.run_http(base_url, measured, options["concurrency"])
+                    results[driver][view] = summary
+                    self.stdout.write(self.format_row(view, summary))
+        return results
+
+    def target(self, driver, options):
+        if driver == "http" and not options["url"]:
+            return benchmark.local_server()
+        return contextlib.nullcontext(options["url"] and options["url"].rstrip("/"))
+
+    def format_row(self, view, summary):
+        if not summary["requests"]:
+            return f"{view:<18}❌ every request failed ({summary['errors']} errors)"
+        return (
+            f"{view:<18}{summary['rps']:>10.1f}{summary['p50_ms']:>10.2f}"
+            f"{summary['p90_ms']:>10.2f}{summary['p99_ms']:>10.2f}{summary['errors']:>8}"
+        )
+
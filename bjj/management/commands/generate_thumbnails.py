@@ -1,91 +1,118 @@
 """
 Django management command to generate thumbnails for videos stored in S3
 and update their records with CloudFront public URLs.
+
+Videos are processed concurrently (see bjj.thumbnails) and progress is
+checkpointed, so an interrupted run picks up where it stopped. Frames are
+extracted from ranged reads of the video, not a full download, and so are
+the storyboard tiles (one seek per tile); ``--compare N`` reports bytes and
+time of each thumbnail method on N videos.
 """
 
-import os
-import tempfile
-import boto3
-import subprocess
-from urllib.parse import urlparse
 from django.core.management.base import BaseCommand
-from django.conf import settings
+from jiujitsuteria.utils.aws import get_client
 from bjj.models import Video
+from bjj.thumbnails import METHODS, Checkpoint, ThumbnailPipeline, compare_methods, video_s3_key
 
 
 class Command(BaseCommand):
     help = "Generate thumbnails for all videos and upload to public S3 bucket, updating DB"
 
-    def handle(self, *args, **options):
-        s3_client = boto3.client("s3")
-
-        private_bucket = settings.AWS_PRIVATE_VIDEO_BUCKET  # your private videos bucket
-        public_bucket = settings.AWS_PUBLIC_THUMBNAIL_BUCKET  # jiujitsuteria-mediia
-        public_cdn = settings.CLOUDFRONT_PUBLIC_DOMAIN       # d3ix9aup7044ea.cloudfront.net
-
-        videos = Video.objects.all()
-        self.stdout.write(f"🔹 Processing {videos.count()} videos for thumbnails...")
-
-        for video in videos:
-            try:
-                self.stdout.write(f"📹 Processing: {video.title}")
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=4,
+            help="Videos processed in parallel (default: 4)",
+        )
+        parser.add_argument(
+            "--method",
+            choices=METHODS,
+            default="ranged",
+            help="How video bytes are fetched for ffmpeg (default: ranged)",
+        )
+        parser.add_argument(
+            "--compare",
+            type=int,
+            metavar="N",
+            help="Compare fetch methods on the first N videos (nothing is uploaded or saved)",
+        )
+        parser.add_argument(
+            "--no-storyboard",
+            action="store_true",
+            help="Skip the hover-preview sprite sheet and WebVTT track",
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Regenerate thumbnails even if the video already has them",
+        )
+        parser.add_argument(
+            "--checkpoint",
+            default="generate_thumbnails.checkpoint.json",
+            help="Progress file used to resume an interrupted run",
+        )
+        parser.add_argument(
+            "--restart",
+            action="store_true",
+            help="Ignore an existing checkpoint and start over",
+        )
 
-                # Extract video key from its URL (private bucket)
-                parsed = urlparse(video.video_url or "")
-                s3_key = parsed.path.lstrip("/") if parsed.path else None
-
-                if not s3_key:
-                    self.stdout.write(f"❌ Skipping {video.title}: no valid S3 key")
+    def handle(self, *args, **options):
+        s3_client = get_client("s3")
+
+        if options["compare"]:
+            return self.compare(s3_client, options["compare"])
+
+        checkpoint = Checkpoint(options["checkpoint"])
+        if options["restart"]:
+            checkpoint.clear()
+        elif checkpoint.done:
+            self.stdout.write(f"🔁 Resuming: {len(checkpoint.done)} videos already done")
+
+        videos = Video.objects.order_by("id")
+        self.stdout.write(f"🔹 Processing {videos.count()} videos with {options['workers']} workers...")
+
+        pipeline = ThumbnailPipeline(
+            s3_client,
+            workers=options["workers"],
+            force=options["force"],
+            checkpoint=checkpoint,
+            report=self.stdout.write,
+            method=options["method"],
+            storyboard=not options["no_storyboard"],
+        )
+        stats = pipeline.run(videos.iterator())
+
+        elapsed = stats["elapsed"]
+        rate = stats["processed"] / elapsed if elapsed else 0.0
+        self.stdout.write(
+            f"🎉 Thumbnail generation complete in {elapsed:.1f}s ({rate:.2f} videos/s): "
+            f"{stats['generated']} generated, "
+            f"{stats['skipped']} skipped, {stats['failed']} failed."
+        )
+        if stats["failed"]:
+            self.stdout.write(f"🔁 Re-run to retry failures; progress is kept in {options['checkpoint']}")
+        else:
+            checkpoint.clear()
+
+    def compare(self, s3_client, limit):
+        totals = {method: [0, 0.0, 0] for method in METHODS}  # bytes, seconds, successes
+        for video in Video.objects.order_by("id")[:limit]:
+            s3_key = video_s3_key(video)
+            if not s3_key:
+                continue
+            self.stdout.write(f"📹 {video.title}")
+            for method, (fetched, seconds) in compare_methods(s3_client, s3_key).items():
+                if seconds is None:
+                    self.stdout.write(f"   {method:<9} failed")
                     continue
-
-                # Download video temporarily
-                with tempfile.NamedTemporaryFile(suffix=".mp4", delete=False) as temp_video:
-                    s3_client.download_file(private_bucket, s3_key, temp_video.name)
-                    temp_video_path = temp_video.name
-
-                # Generate thumbnail with ffmpeg
-                with tempfile.NamedTemporaryFile(suffix=".jpg", delete=False) as temp_thumb:
-                    thumb_path = temp_thumb.name
-
-                subprocess.run(
-                    [
-                        "ffmpeg",
-                        "-i", temp_video_path,
-                        "-ss", "00:00:01.000",  # capture frame at 1s
-                        "-vframes", "1",
-                        "-vf", "scale=320:-1",  # width=320px, keep aspect ratio
-                        thumb_path,
-                    ],
-                    check=True,
-                    stdout=subprocess.DEVNULL,
-                    stderr=subprocess.DEVNULL,
-                )
-
-                # Define thumbnail key in public bucket
-                thumbnail_key = f"thumbnails/{os.path.splitext(s3_key)[0]}.jpg"
-
-                # Upload to public bucket
-                s3_client.upload_file(
-                    thumb_path,
-                    public_bucket,
-                    thumbnail_key,
-                    ExtraArgs={"ContentType": "image/jpeg", "ACL": "public-read"},
-                )
-
-                # Build public CloudFront URL
-                public_url = f"https://{public_cdn}/{thumbnail_key}"
-
-                # Save thumbnail URL in DB (always update)
-                video.thumbnail_url = public_url
-                video.save(update_fields=["thumbnail_url"])
-
-                self.stdout.write(f"✅ Thumbnail updated for {video.title}")
-
-                # Cleanup temp files
-                os.remove(temp_video_path)
-                os.remove(thumb_path)
-
-            except Exception as e:
-                self.stdout.write(f"❌ Failed {video.title}: {e}")
-
-        self.stdout.write("🎉 Thumbnail generation complete. All thumbnails uploaded & DB updated!")
+                mib = f"{fetched / 1048576:9.2f} MiB" if fetched is not None else "        ? MiB"
+                self.stdout.write(f"   {method:<9} {mib} {seconds:7.2f}s")
+                totals[method][0] += fetched or 0
+                totals[method][1] += seconds
+                totals[method][2] += 1
+
+        self.stdout.write("🎉 Totals:")
+        for method, (fetched, seconds, count) in totals.items():
+            self.stdout.write(f"   {method:<9} {fetched / 1048576:9.2f} MiB {seconds:7.2f}s over {count} videos")
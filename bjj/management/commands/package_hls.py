@@ -0,0 +1,62 @@
+"""
+Transcode videos into HLS renditions (see bjj.hls) and record the master
+playlist on each video.
+
+New uploads are packaged by the background job queue; this command
+backfills existing videos, either inline or by queueing jobs for
+``run_jobs`` workers (``--enqueue``).
+"""
+
+from django.core.management.base import BaseCommand
+from bjj import jobs
+from bjj.models import Video
+
+
+class Command(BaseCommand):
+    help = "Package videos as adaptive-bitrate HLS in the private bucket"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "video_ids",
+            nargs="*",
+            type=int,
+            help="Only these videos (default: every video without HLS)",
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Repackage videos that already have HLS renditions",
+        )
+        parser.add_argument(
+            "--enqueue",
+            action="store_true",
+            help="Queue background jobs instead of transcoding here",
+        )
+
+    def handle(self, *args, **options):
+        videos = Video.objects.order_by("id")
+        if options["video_ids"]:
+            videos = videos.filter(pk__in=options["video_ids"])
+        if not options["force"]:
+            videos = videos.filter(hls_playlist_key="")
+
+        if options["enqueue"]:
+            queued = sum(
+                jobs.enqueue("hls", video_id=pk, force=options["force"]) is not None
+                for pk in videos.values_list("pk", flat=True)
+            )
+            self.stdout.write(f"🎉 Queued {queued} HLS jobs.")
+            return
+
+        packaged = failed = 0
+        for video in videos.only("id", "title"):
+            self.stdout.write(f"📹 {video.title}")
+            try:
+                jobs.make_hls(video.pk, force=True)
+            except Exception as e:
+                self.stdout.write(f"❌ Failed {video.title}: {e}")
+                failed += 1
+                continue
+            packaged += 1
+
+        self.stdout.write(f"🎉 HLS packaging complete: {packaged} packaged, {failed} failed.")
@@ -0,0 +1,104 @@
+"""
+Probe videos for duration, resolution, bitrate, codecs, file size and
+faststart layout (see bjj.metadata) and store them on each video.
+
+Probes only read headers and indexes, so they run in parallel; database
+writes stay on the main thread. ``--remux`` rewrites files whose index sits
+at the end so playback starts immediately.
+"""
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+from jiujitsuteria.utils.aws import get_client
+from bjj import jobs
+from bjj.metadata import probe_and_remux, save_metadata
+from bjj.models import Video
+from bjj.thumbnails import video_s3_key
+
+
+class Command(BaseCommand):
+    help = "Store ffprobe metadata on videos and flag (or fix) non-faststart MP4s"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "video_ids",
+            nargs="*",
+            type=int,
+            help="Only these videos (default: every video not probed yet)",
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Probe videos again even if they already have metadata",
+        )
+        parser.add_argument(
+            "--remux",
+            action="store_true",
+            help="Move the MP4 index to the front of files that need it (rewrites them in S3)",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=8,
+            help="Videos probed in parallel (default: 8)",
+        )
+        parser.add_argument(
+            "--enqueue",
+            action="store_true",
+            help="Queue background jobs instead of probing here",
+        )
+
+    def handle(self, *args, **options):
+        videos = Video.objects.order_by("id")
+        if options["video_ids"]:
+            videos = videos.filter(pk__in=options["video_ids"])
+        if not options["force"]:
+            videos = videos.filter(probed_at__isnull=True)
+
+        if options["enqueue"]:
+            queued = sum(
+                jobs.enqueue("probe", video_id=pk, remux=options["remux"]) is not None
+                for pk in videos.values_list("pk", flat=True)
+            )
+            self.stdout.write(f"🎉 Queued {queued} probe jobs.")
+            return
+
+        s3_client = get_client("s3")
+
+        probed = failed = not_faststart = 0
+        with ThreadPoolExecutor(max_workers=max(1, options["workers"]), thread_name_prefix="probe") as pool:
+            futures = {}
+            for video in videos.iterator():
+                s3_key = video_s3_key(video)
+                if not s3_key:
+                    self.stdout.write(f"❌ Skipping {video.title}: no valid S3 key")
+                    failed += 1
+                    continue
+                futures[pool.submit(probe_and_remux, s3_client, s3_key, options["remux"])] = video
+
+            for future in as_completed(futures):
+                video = futures[future]
+                try:
+                    fields, remuxed = future.result()
+                except Exception as e:
+                    self.stdout.write(f"❌ Failed {video.title}: {e}")
+                    failed += 1
+                    continue
+
+                save_metadata(video, fields)
+                probed += 1
+
+                layout = "remuxed to faststart" if remuxed else {
+                    True: "faststart", False: "⚠️ moov at end", None: "not MP4",
+                }[video.faststart]
+                not_faststart += video.faststart is False
+                size = f"{video.width}x{video.height}" if video.width else "no video"
+                self.stdout.write(
+                    f"✅ {video.title}: {video.duration or 0:.1f}s {size} "
+                    f"{video.video_codec or '?'}/{video.audio_codec or '-'} {layout}"
+                )
+
+        self.stdout.write(f"🎉 Probed {probed} videos, {failed} failed.")
+        if not_faststart:
+            self.stdout.write(f"⚠️ {not_faststart} videos need the MP4 index moved to the front; re-run with --remux.")
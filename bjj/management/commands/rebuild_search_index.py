@@ -0,0 +1,26 @@
+"""
+Rebuild full-text search documents for every video (or selected ones).
+"""
+
+from django.core.management.base import BaseCommand
+from bjj.models import Video
+from bjj.search import index_videos
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index (PostgreSQL search_vector / SQLite FTS5)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "video_ids",
+            nargs="*",
+            type=int,
+            help="Only reindex these video ids (default: all videos)",
+        )
+
+    def handle(self, *args, **options):
+        video_ids = options["video_ids"] or None
+        total = len(video_ids) if video_ids else Video.objects.count()
+        self.stdout.write(f"🔹 Indexing {total} videos...")
+        index_videos(video_ids)
+        self.stdout.write(f"🎉 Done! {total} search documents rebuilt.")
@@ -0,0 +1,22 @@
+"""
+Recompute the materialized video counts on categories and tags.
+"""
+
+from django.core.management.base import BaseCommand
+from bjj.counts import COUNTED_MODELS, recount
+
+
+class Command(BaseCommand):
+    help = "Rebuild video_count on positions, techniques, guards and tags"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "types",
+            nargs="*",
+            choices=sorted(COUNTED_MODELS),
+            help="Only recount these types (default: all)",
+        )
+
+    def handle(self, *args, **options):
+        changed = recount(options["types"] or None)
+        self.stdout.write(f"🎉 Done! {changed} counts corrected.")
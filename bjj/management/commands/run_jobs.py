@@ -0,0 +1,68 @@
+"""
+Run background jobs (see bjj.jobs) until stopped.
+
+Start as many workers as needed, on one or several machines; they share the
+queue through the database. ``--burst`` exits once no job is due, which
+suits cron or a one-off catch-up.
+"""
+
+import os
+import signal
+import socket
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from bjj import jobs
+
+
+class Command(BaseCommand):
+    help = "Process queued background jobs (probing, thumbnails, HLS packaging, indexing)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--burst",
+            action="store_true",
+            help="Exit when no job is due instead of waiting for more",
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=2.0,
+            help="Seconds to wait between polls of an empty queue (default: 2)",
+        )
+
+    def handle(self, *args, **options):
+        worker = f"{socket.gethostname()}:{os.getpid()}"
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        self.stdout.write(f"🔹 Worker {worker} started")
+
+        processed = failed = 0
+        while not self.stopping:
+            close_old_connections()
+            job = jobs.claim(worker)
+            if job is None:
+                if options["burst"]:
+                    break
+                time.sleep(options["sleep"])
+                continue
+
+            started = time.monotonic()
+            ok = jobs.run(job)
+            processed += 1
+            elapsed = time.monotonic() - started
+            if ok:
+                self.stdout.write(f"✅ {job.kind} {job.payload} ({elapsed:.1f}s)")
+            else:
+                failed += 1
+                retry = f"retry at {job.run_at:%H:%M:%S}" if job.status == job.QUEUED else "gave up"
+                error = job.last_error.strip().splitlines()[-1]
+                self.stdout.write(f"❌ {job.kind} {job.payload} attempt {job.attempts}: {error} ({retry})")
+
+        self.stdout.write(f"🎉 Worker {worker} stopped: {processed} jobs run, {failed} failed.")
+
+    def stop(self, signum, frame):
+        # Finish the current job, then exit
+        self.stopping = True
@@ -1,12 +1,36 @@
 """
 Sync thumbnails in DB with files already in the public S3 bucket.
+
+The bucket is listed once (paginated ``list_objects_v2``), the diff against
+the DB is computed in memory and changes are written with ``bulk_update``,
+so a sync costs a handful of queries however many videos there are.
 """
 
 import os
-from urllib.parse import urlparse
+
 from django.core.management.base import BaseCommand
 from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from jiujitsuteria.utils.aws import get_client
+from bjj import caching
 from bjj.models import Video
+from bjj.thumbnails import thumbnail_widths, variant_key_for, video_s3_key
+
+MISSING_REPORT_LIMIT = 20
+
+
+def candidate_keys(video_key):
+    """Thumbnail keys for a video, preferred first.
+
+    Current ``generate_thumbnails`` output, then older single-file layouts.
+    """
+    base, _ = os.path.splitext(video_key)
+    return [
+        variant_key_for(video_key, thumbnail_widths()[0], "jpg"),
+        f"thumbnails/{base}.jpg",
+        f"{base}.jpg",
+    ]
 
 
 class Command(BaseCommand):
@@ -18,31 +42,62 @@ class Command(BaseCommand):
             action="store_true",
             help="Only update videos with no thumbnail_url set",
         )
+        parser.add_argument(
+            "--prefix",
+            default="",
+            help="Only list bucket keys under this prefix (default: whole bucket)",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Rows per bulk_update query (default: 1000)",
+        )
+
+    def list_keys(self, bucket, prefix):
+        s3_client = get_client("s3")
+        keys = set()
+        for page in s3_client.get_paginator("list_objects_v2").paginate(Bucket=bucket, Prefix=prefix):
+            keys.update(obj["Key"] for obj in page.get("Contents", []))
+        return keys
 
     def handle(self, *args, **options):
         public_cdn = settings.CLOUDFRONT_PUBLIC_DOMAIN  # d3ix9aup7044ea.cloudfront.net
         only_missing = options["only_missing"]
-        updated = 0
-
-        for video in Video.objects.all():
-            try:
-                # Skip if only_missing is set and video already has a thumbnail
-                if only_missing and video.thumbnail_url:
-                    continue
-
-                parsed = urlparse(video.video_url)
-                key = parsed.path.lstrip("/")   # e.g. Guard/Butterfly_Guard/collar_drag.mp4
-                base, _ = os.path.splitext(key)
-                thumb_key = f"{base}.jpg"
-                public_url = f"https://{public_cdn}/{thumb_key}"
-
-                if video.thumbnail_url != public_url:
-                    video.thumbnail_url = public_url
-                    video.save(update_fields=["thumbnail_url"])
-                    updated += 1
-                    self.stdout.write(f"✅ Updated thumbnail for {video.title}")
-
-            except Exception as e:
-                self.stdout.write(f"❌ Skipped {video.title}: {e}")
-
-        self.stdout.write(f"🎉 Done! {updated} thumbnails updated in DB.")
+
+        keys = self.list_keys(settings.AWS_PUBLIC_THUMBNAIL_BUCKET, options["prefix"])
+        self.stdout.write(f"🔹 {len(keys)} objects listed in the public bucket")
+
+        videos = Video.objects.only("id", "title", "video_url", "thumbnail_url").order_by("id")
+        if only_missing:
+            videos = videos.filter(Q(thumbnail_url__isnull=True) | Q(thumbnail_url=""))
+
+        changed, missing = [], []
+        now = timezone.now()
+        for video in videos.iterator(chunk_size=2000):
+            video_key = video_s3_key(video)  # e.g. Guard/Butterfly_Guard/collar_drag.mp4
+            found = next((key for key in candidate_keys(video_key) if key in keys), None) if video_key else None
+            if found is None:
+                missing.append(video)
+                continue
+
+            public_url = f"https://{public_cdn}/{found}"
+            if video.thumbnail_url != public_url:
+                video.thumbnail_url = public_url
+                video.updated_at = now
+                changed.append(video)
+
+        # bulk_update skips signals: expire cached pages and validators here
+        Video.objects.bulk_update(changed, ["thumbnail_url", "updated_at"], batch_size=options["batch_size"])
+        if changed:
+            caching.touch_videos([video.pk for video in changed])
+            caching.invalidate()
+
+        if missing:
+            self.stdout.write(f"❌ {len(missing)} videos have no thumbnail object in the bucket:")
+            for video in missing[:MISSING_REPORT_LIMIT]:
+                self.stdout.write(f"   - {video.title} (id {video.pk})")
+            if len(missing) > MISSING_REPORT_LIMIT:
+                self.stdout.write(f"   ... and {len(missing) - MISSING_REPORT_LIMIT} more")
+
+        self.stdout.write(f"🎉 Done! {len(changed)} thumbnails updated in DB.")
@@ -0,0 +1,161 @@
+"""File metadata for videos in the private S3 bucket.
+
+``probe_video`` runs ffprobe against a presigned URL (ffprobe reads the
+container header and index, not the media) for duration, resolution,
+bitrate and codecs, and takes the file size and the ``faststart`` flag from
+the top-level MP4 boxes, read with a few small ranged GETs
+(``bjj.thumbnails.top_level_boxes``). A file whose ``moov`` index comes
+after ``mdat`` can't start playing until the browser has fetched its end.
+
+``remux_faststart`` rewrites such a file in place with the index first
+(``ffmpeg -c copy -movflags +faststart``: no re-encoding) and, when
+``CLOUDFRONT_DISTRIBUTION_ID`` is set, invalidates the CloudFront copy so
+byte ranges of the old and new layouts are never mixed.
+
+``probe_and_remux`` and ``save_metadata`` are the steps shared by the
+``probe`` job, run after every upload, and ``manage.py probe_videos``.
+"""
+
+import json
+import os
+import subprocess
+import tempfile
+import time
+
+from django.conf import settings
+from django.utils import timezone
+
+from jiujitsuteria.utils.aws import get_client
+from . import uploads
+from .thumbnails import RangedObject, ThumbnailError, _presigned_url, top_level_boxes
+
+FIELDS = (
+    "duration", "width", "height", "bitrate", "video_codec", "audio_codec",
+    "file_size", "faststart", "probed_at",
+)
+
+BOX_HEAD_BYTES = 64 * 1024  # box headers past this are fetched one ranged GET each
+
+
+class MetadataError(Exception):
+    pass
+
+
+def ffprobe(source):
+    """Return ffprobe's JSON description (format and streams) of ``source``."""
+    result = subprocess.run(
+        ["ffprobe", "-v", "error", "-print_format", "json", "-show_format", "-show_streams", source],
+        capture_output=True,
+        check=False,
+    )
+    if result.returncode != 0:
+        raise MetadataError(f"ffprobe failed: {result.stderr.decode(errors='replace').strip()}")
+    return json.loads(result.stdout)
+
+
+def _number(value, cast):
+    try:
+        return cast(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_probe(info):
+    """Map ffprobe JSON to ``Video`` field values."""
+    streams = info.get("streams", [])
+    fmt = info.get("format", {})
+    video = next(
+        (s for s in streams if s.get("codec_type") == "video" and not s.get("disposition", {}).get("attached_pic")),
+        {},
+    )
+    audio = next((s for s in streams if s.get("codec_type") == "audio"), {})
+    return {
+        "duration": _number(fmt.get("duration") or video.get("duration"), float),
+        "width": _number(video.get("width"), int),
+        "height": _number(video.get("height"), int),
+        "bitrate": _number(fmt.get("bit_rate"), int),
+        "video_codec": video.get("codec_name", "")[:20],
+        "audio_codec": audio.get("codec_name", "")[:20],
+    }
+
+
+def is_faststart(obj):
+    """True if ``moov`` precedes ``mdat`` in an MP4 ``RangedObject``; None if not an MP4."""
+    try:
+        for box_type, _, _ in top_level_boxes(obj):
+            if box_type == "moov":
+                return True
+            if box_type == "mdat":
+                return False
+    except ThumbnailError:
+        pass
+    return None
+
+
+def probe_video(s3_client, s3_key):
+    """Return the metadata fields for ``s3_key`` (see ``FIELDS``)."""
+    obj = RangedObject(s3_client, settings.AWS_PRIVATE_VIDEO_BUCKET, s3_key, head_bytes=BOX_HEAD_BYTES)
+    fields = parse_probe(ffprobe(_presigned_url(s3_client, s3_key)))
+    fields["file_size"] = obj.size
+    fields["faststart"] = is_faststart(obj)
+    fields["probed_at"] = timezone.now()
+    return fields
+
+
+def invalidate_cdn(s3_key):
+    """Drop ``s3_key`` from the CloudFront cache; False if no distribution is configured."""
+    distribution_id = getattr(settings, "CLOUDFRONT_DISTRIBUTION_ID", None)
+    if not distribution_id:
+        return False
+    get_client("cloudfront").create_invalidation(
+        DistributionId=distribution_id,
+        InvalidationBatch={
+            "Paths": {"Quantity": 1, "Items": [f"/{s3_key}"]},
+            "CallerReference": f"bjj-remux-{s3_key}-{time.time()}",
+        },
+    )
+    return True
+
+
+def remux_faststart(s3_client, s3_key):
+    """Move the MP4 index of ``s3_key`` to the front, in place; return the new file size."""
+    with tempfile.TemporaryDirectory(prefix="bjj-remux-") as workdir:
+        source = os.path.join(workdir, "source.mp4")
+        remuxed = os.path.join(workdir, "faststart.mp4")
+        s3_client.download_file(settings.AWS_PRIVATE_VIDEO_BUCKET, s3_key, source)
+        subprocess.run(
+            ["ffmpeg", "-loglevel", "error", "-y", "-i", source,
+             "-map", "0", "-c", "copy", "-movflags", "+faststart", remuxed],
+            check=True,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+        )
+        s3_client.upload_file(
+            remuxed,
+            settings.AWS_PRIVATE_VIDEO_BUCKET,
+            s3_key,
+            ExtraArgs=uploads.EXTRA_ARGS,
+            Config=uploads.transfer_config(),
+        )
+        size = os.path.getsize(remuxed)
+    invalidate_cdn(s3_key)
+    return size
+
+
+def probe_and_remux(s3_client, s3_key, remux=False):
+    """Probe ``s3_key``, first remuxing it if ``remux`` and it isn't faststart.
+
+    Returns ``(fields, remuxed)``.
+    """
+    fields = probe_video(s3_client, s3_key)
+    if fields["faststart"] is False and remux:
+        fields["file_size"] = remux_faststart(s3_client, s3_key)
+        fields["faststart"] = True
+        return fields, True
+    return fields, False
+
+
+def save_metadata(video, fields):
+    for name, value in fields.items():
+        setattr(video, name, value)
+    video.save(update_fields=list(fields))
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.1 on 2026-10-18 01:15
+
+from django.db import migrations, models
+
+
+def backfill_tag_cache(apps, schema_editor):
+    Video = apps.get_model('bjj', 'Video')
+    caches = {}
+    rows = (
+        Video.tags.through.objects
+        .values_list('video_id', 'tag_id', 'tag__name')
+        .order_by('tag__name')
+    )
+    for video_id, tag_id, tag_name in rows:
+        caches.setdefault(video_id, []).append({'id': tag_id, 'name': tag_name})
+    videos = [Video(pk=video_id, tag_cache=tags) for video_id, tags in caches.items()]
+    Video.objects.bulk_update(videos, ['tag_cache'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bjj', '0003_alter_video_thumbnail_url_alter_video_video_url'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='tag_cache',
+            field=models.JSONField(blank=True, default=list, editable=False),
+        ),
+        migrations.RunPython(backfill_tag_cache, migrations.RunPython.noop),
+    ]
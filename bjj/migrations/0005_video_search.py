@@ -0,0 +1,104 @@
+# Generated by Django 5.2.1 on 2026-10-18 01:17
+
+import django.contrib.postgres.search
+from django.db import migrations, models
+
+
+def create_trigram_extension(apps, schema_editor):
+    # TrigramExtension() would query pg_extension when reversed on any backend
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+
+
+def drop_trigram_extension(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP EXTENSION IF EXISTS pg_trgm')
+
+
+def create_search_structures(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE INDEX IF NOT EXISTS bjj_video_search_vector_gin '
+            'ON bjj_video USING gin (search_vector)'
+        )
+        schema_editor.execute(
+            'CREATE INDEX IF NOT EXISTS bjj_video_search_text_trgm '
+            'ON bjj_video USING gin (search_text gin_trgm_ops)'
+        )
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            'CREATE VIRTUAL TABLE IF NOT EXISTS bjj_video_fts USING fts5('
+            "title, tags, categories, tokenize='porter unicode61 remove_diacritics 2')"
+        )
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS bjj_video_fts_vocab USING fts5vocab(bjj_video_fts, 'row')"
+        )
+
+
+def drop_search_structures(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS bjj_video_search_text_trgm')
+        schema_editor.execute('DROP INDEX IF EXISTS bjj_video_search_vector_gin')
+    elif vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS bjj_video_fts_vocab')
+        schema_editor.execute('DROP TABLE IF EXISTS bjj_video_fts')
+
+
+def backfill_search_documents(apps, schema_editor):
+    # Same documents as bjj.search.index_videos, built from the historical
+    # models so later changes to bjj.search can't break this migration
+    Video = apps.get_model('bjj', 'Video')
+    vendor = schema_editor.connection.vendor
+    if vendor not in ('postgresql', 'sqlite'):
+        return
+
+    tags = {}
+    for video_id, tag_name in Video.tags.through.objects.values_list('video_id', 'tag__name'):
+        tags.setdefault(video_id, []).append(tag_name)
+    videos = Video.objects.select_related('position', 'technique', 'guard').order_by('pk')
+    for video in videos.iterator(chunk_size=2000):
+        title = video.title
+        tag_text = ' '.join(tags.get(video.pk, []))
+        categories = ' '.join(c.name for c in (video.position, video.technique, video.guard) if c)
+        if vendor == 'postgresql':
+            from django.contrib.postgres.search import SearchVector
+            from django.db.models import Value
+
+            Video.objects.filter(pk=video.pk).update(
+                search_text=f'{title} {tag_text} {categories}'.strip(),
+                search_vector=(
+                    SearchVector(Value(title), weight='A', config='english')
+                    + SearchVector(Value(tag_text), weight='B', config='english')
+                    + SearchVector(Value(categories), weight='C', config='english')
+                ),
+            )
+        else:
+            schema_editor.execute(
+                'INSERT OR REPLACE INTO bjj_video_fts(rowid, title, tags, categories) VALUES (%s, %s, %s, %s)',
+                [video.pk, title, tag_text, categories],
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bjj', '0004_video_tag_cache'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_extension, drop_trigram_extension),
+        migrations.AddField(
+            model_name='video',
+            name='search_text',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='video',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_structures, drop_search_structures),
+        migrations.RunPython(backfill_search_documents, migrations.RunPython.noop),
+    ]
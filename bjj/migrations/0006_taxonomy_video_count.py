@@ -0,0 +1,42 @@
+# Generated by Django 5.2.1 on 2026-10-18 01:20
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_video_counts(apps, schema_editor):
+    for model_name, related in (('Position', 'video'), ('Technique', 'video'), ('Guard', 'video'), ('Tag', 'videos')):
+        model = apps.get_model('bjj', model_name)
+        for obj in model.objects.annotate(actual=Count(related)):
+            model.objects.filter(pk=obj.pk).update(video_count=obj.actual)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bjj', '0005_video_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='guard',
+            name='video_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='position',
+            name='video_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='video_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='technique',
+            name='video_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_video_counts, migrations.RunPython.noop),
+    ]
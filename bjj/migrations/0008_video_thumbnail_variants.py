@@ -0,0 +1,23 @@
+# Generated by Django 5.2.1 on 2026-10-18 01:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bjj', '0007_timestamps'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='thumbnail_placeholder',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='video',
+            name='thumbnail_srcset',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 01:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bjj', '0008_video_thumbnail_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='storyboard_vtt_url',
+            field=models.URLField(blank=True, default='', editable=False),
+        ),
+    ]
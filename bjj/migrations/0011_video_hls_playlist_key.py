@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 01:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bjj', '0010_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='hls_playlist_key',
+            field=models.CharField(blank=True, default='', editable=False, max_length=500),
+        ),
+    ]
@@ -2,13 +2,20 @@
 with private video access via CloudFront signed URLs
 and public thumbnails served via a separate CloudFront distribution."""
 
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 from django.conf import settings
-from jiujitsuteria.utils.cloudfront import generate_signed_url
+from django.utils import timezone
+from jiujitsuteria.utils.cloudfront import get_signed_url
+
+THUMBNAIL_TYPES = {"avif": "image/avif", "webp": "image/webp", "jpg": "image/jpeg"}
 
 
 class Position(models.Model):
     name = models.CharField(max_length=100)
+    video_count = models.PositiveIntegerField(default=0, editable=False)  # maintained by bjj.counts
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)  # also touched by bjj.signals when its videos change
 
     def __str__(self):
         return self.name
@@ -16,6 +23,9 @@ class Position(models.Model):
 
 class Technique(models.Model):
     name = models.CharField(max_length=100)
+    video_count = models.PositiveIntegerField(default=0, editable=False)  # maintained by bjj.counts
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)  # also touched by bjj.signals when its videos change
 
     def __str__(self):
         return self.name
@@ -23,6 +33,9 @@ class Technique(models.Model):
 
 class Guard(models.Model):
     name = models.CharField(max_length=100)
+    video_count = models.PositiveIntegerField(default=0, editable=False)  # maintained by bjj.counts
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)  # also touched by bjj.signals when its videos change
 
     def __str__(self):
         return self.name
@@ -30,6 +43,9 @@ class Guard(models.Model):
 
 class Tag(models.Model):
     name = models.CharField(max_length=50, unique=True)
+    video_count = models.PositiveIntegerField(default=0, editable=False)  # maintained by bjj.counts
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)  # also touched by bjj.signals when its videos change
 
     def __str__(self):
         return self.name
@@ -50,24 +66,127 @@ class Video(models.Model):
         help_text="CloudFront URL to the thumbnail image (public bucket)"
     )
 
+    # Responsive thumbnail variants {"webp": [[width, url], ...], "jpg": ...}
+    # and a tiny blurred data: URI shown while they load (see bjj.thumbnails)
+    thumbnail_srcset = models.JSONField(default=dict, blank=True, editable=False)
+    thumbnail_placeholder = models.TextField(blank=True, default="", editable=False)
+
+    # WebVTT track of storyboard sprite tiles for hover previews and scrubbing
+    storyboard_vtt_url = models.URLField(blank=True, default="", editable=False)
+
+    # Master HLS playlist in the private bucket, next to the file (see bjj.hls)
+    hls_playlist_key = models.CharField(max_length=500, blank=True, default="", editable=False)
+
+    # Content hash of the uploaded file (bjj.uploads.BlockHasher), computed or
+    # checked on the server; the same bytes can't be uploaded for another video
+    content_hash = models.CharField(max_length=64, blank=True, default="", editable=False, db_index=True)
+
+    # File metadata from ffprobe, filled in by bjj.metadata (null until probed).
+    # faststart: the MP4 index (moov) precedes the media, so playback starts
+    # without fetching the end of the file first.
+    duration = models.FloatField(null=True, blank=True, editable=False, db_index=True)  # seconds
+    width = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    height = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    bitrate = models.PositiveIntegerField(null=True, blank=True, editable=False)  # bits/s
+    video_codec = models.CharField(max_length=20, blank=True, default="", editable=False)
+    audio_codec = models.CharField(max_length=20, blank=True, default="", editable=False)
+    file_size = models.BigIntegerField(null=True, blank=True, editable=False)  # bytes
+    faststart = models.BooleanField(null=True, blank=True, editable=False)
+    probed_at = models.DateTimeField(null=True, blank=True, editable=False)
+
     tags = models.ManyToManyField('Tag', related_name='videos', blank=True)
+
+    # Denormalized copy of tags as [{"id": ..., "name": ...}], kept in sync by
+    # bjj.signals so grid cards render without touching the tag tables
+    tag_cache = models.JSONField(default=list, blank=True, editable=False)
+
+    # Full-text search document (title + tags + categories), see bjj.search.
+    # GIN indexes are created by migration 0005 on PostgreSQL only.
+    search_text = models.TextField(blank=True, default="", editable=False)
+    search_vector = SearchVectorField(null=True, blank=True, editable=False)
+
     position = models.ForeignKey('Position', on_delete=models.SET_NULL, null=True, blank=True)
     technique = models.ForeignKey('Technique', on_delete=models.SET_NULL, null=True, blank=True)
     guard = models.ForeignKey('Guard', on_delete=models.SET_NULL, null=True, blank=True)
 
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
     def __str__(self):
         return self.title
 
+    # -----------------------------
+    # Tags for cards and detail pages
+    # -----------------------------
+    @property
+    def card_tags(self):
+        """Return the video's tags (denormalized copy unless BJJ_DENORMALIZED_TAGS is off)."""
+        if getattr(settings, "BJJ_DENORMALIZED_TAGS", True):
+            return self.tag_cache
+        return self.tags.all()
+
+    @classmethod
+    def refresh_tag_cache(cls, video_ids):
+        """Rebuild ``tag_cache`` for the given video ids in two queries."""
+        video_ids = set(video_ids)
+        if not video_ids:
+            return
+        caches = {video_id: [] for video_id in video_ids}
+        rows = (
+            cls.tags.through.objects
+            .filter(video_id__in=video_ids)
+            .values_list("video_id", "tag_id", "tag__name")
+            .order_by("tag__name")
+        )
+        for video_id, tag_id, tag_name in rows:
+            caches[video_id].append({"id": tag_id, "name": tag_name})
+        videos = [cls(pk=video_id, tag_cache=tags) for video_id, tags in caches.items()]
+        cls.objects.bulk_update(videos, ["tag_cache"], batch_size=500)
+
+    # -----------------------------
+    # Responsive thumbnails
+    # -----------------------------
+    def _thumbnail_srcset(self, fmt):
+        return ", ".join(f"{url} {width}w" for width, url in self.thumbnail_srcset.get(fmt, []))
+
+    @property
+    def thumbnail_sources(self):
+        """``[(mime type, srcset)]`` for ``<picture>`` sources, best format first."""
+        return [
+            (THUMBNAIL_TYPES[fmt], self._thumbnail_srcset(fmt))
+            for fmt in ("avif", "webp")
+            if self.thumbnail_srcset.get(fmt)
+        ]
+
+    @property
+    def thumbnail_jpeg_srcset(self):
+        return self._thumbnail_srcset("jpg")
+
+    @property
+    def thumbnail_poster_url(self):
+        """Largest JPEG variant, for the player poster."""
+        variants = self.thumbnail_srcset.get("jpg")
+        return variants[-1][1] if variants else self.thumbnail_url
+
     # -----------------------------
     # CloudFront signed video URL
     # -----------------------------
+    @property
+    def object_key(self):
+        """Return the video's key relative to the private CloudFront distribution."""
+        if not self.video_url:
+            return None
+        return self.video_url.split(f"{settings.CLOUDFRONT_DOMAIN}/")[-1]
+
     @property
     def signed_video_url(self):
-        """Return a CloudFront signed URL for the video file."""
+        """Return a CloudFront signed URL for the video file.
+
+        URLs are cached per expiry bucket (see ``get_signed_url``).
+        """
         if not self.video_url:
             return None
-        path = self.video_url.split(f"{settings.CLOUDFRONT_DOMAIN}/")[-1]
-        return generate_signed_url(path, expires_in=3600)
+        return get_signed_url(self.object_key, expires_in=3600)
 
     # -----------------------------
     # Unsigned fallback (rarely used)
@@ -75,3 +194,45 @@ class Video(models.Model):
     def cloudfront_url(self):
         """Return an unsigned CloudFront URL as a fallback."""
         return self.video_url
+
+
+class Job(models.Model):
+    """A unit of background work run by ``manage.py run_jobs`` (see bjj.jobs)."""
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (QUEUED, "Queued"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    ]
+
+    kind = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)  # not before; pushed back on retry
+    locked_at = models.DateTimeField(null=True, blank=True)
+    locked_by = models.CharField(max_length=100, blank=True, default="")
+    last_error = models.TextField(blank=True, default="")
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "run_at"])]
+
+    def __str__(self):
+        return f"{self.kind} {self.payload}"
+
+
+# Category type (as used in URLs) → model
+CATEGORY_MODELS = {
+    'position': Position,
+    'technique': Technique,
+    'guard': Guard,
+}
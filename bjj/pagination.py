@@ -0,0 +1,146 @@
+"""Pagination helpers for video listings.
+
+Listings are ordered newest first (``-id``). ``KeysetPaginator`` pages them
+by id with ``?after=<id>`` / ``?before=<id>`` cursors, so every page costs
+one indexed range query however deep the user browses, instead of an
+OFFSET scan. Totals come from a cached count rather than a COUNT per
+request. Old ``?page=N`` links keep working through Django's ``Paginator``.
+"""
+
+import hashlib
+from bisect import bisect_left, bisect_right
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
+
+
+# Query parameters read by ``paginate``
+PAGE_PARAMS = ("page", "after", "before")
+
+
+def _negate(value):
+    return -value
+
+
+def cached_count(queryset, timeout=None):
+    """Return ``queryset.count()``, cached for ``BJJ_COUNT_CACHE_TIMEOUT`` seconds."""
+    timeout = timeout if timeout is not None else getattr(settings, "BJJ_COUNT_CACHE_TIMEOUT", 300)
+    key = "bjj:count:" + hashlib.md5(str(queryset.query).encode("utf-8")).hexdigest()
+    return cache.get_or_set(key, queryset.count, timeout)
+
+
+def _cursor(value):
+    try:
+        return int(value) if value not in (None, "") else None
+    except (TypeError, ValueError):
+        return None
+
+
+class KeysetPage:
+    """One page of a keyset-paginated listing (template-compatible with ``Page``)."""
+
+    is_keyset = True
+
+    def __init__(self, object_list, has_next, has_previous, count):
+        self.object_list = object_list
+        self._has_next = has_next
+        self._has_previous = has_previous
+        self.total_count = count
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @staticmethod
+    def _id(item):
+        return item if isinstance(item, int) else item.pk
+
+    @property
+    def next_cursor(self):
+        return self._id(self.object_list[-1]) if self._has_next and self.object_list else None
+
+    @property
+    def previous_cursor(self):
+        return self._id(self.object_list[0]) if self._has_previous and self.object_list else None
+
+
+class KeysetPaginator:
+    """Page a listing ordered by ``-id`` using id cursors.
+
+    ``items`` is either a queryset or a list of ids sorted descending (as
+    returned by the tag index).
+    """
+
+    def __init__(self, per_page=12):
+        self.per_page = per_page
+
+    def paginate(self, items, after=None, before=None, count=None):
+        if isinstance(items, (list, tuple)):
+            return self._paginate_ids(items, after, before, count)
+        return self._paginate_queryset(items, after, before, count)
+
+    def _paginate_queryset(self, queryset, after, before, count):
+        size = self.per_page
+        if count is None:
+            count = cached_count(queryset)
+        if before is not None:
+            rows = list(queryset.filter(id__gt=before).order_by("id")[:size + 1])
+            has_previous = len(rows) > size
+            return KeysetPage(rows[:size][::-1], True, has_previous, count)
+
+        if after is not None:
+            queryset = queryset.filter(id__lt=after)
+        rows = list(queryset.order_by("-id")[:size + 1])
+        return KeysetPage(rows[:size], len(rows) > size, after is not None, count)
+
+    def _paginate_ids(self, ids, after, before, count):
+        size = self.per_page
+        count = len(ids) if count is None else count
+        if before is not None:
+            end = bisect_left(ids, -before, key=_negate)  # first id <= before
+            start = max(0, end - size)
+            return KeysetPage(list(ids[start:end]), True, start > 0, count)
+
+        start = bisect_right(ids, -after, key=_negate) if after is not None else 0  # first id < after
+        return KeysetPage(list(ids[start:start + size]), start + size < len(ids), start > 0, count)
+
+
+def paginate(request, items, per_page=12, count=None):
+    """Return a page of ``items`` (queryset ordered by ``-id`` or list of ids).
+
+    Cursor parameters select keyset mode; a ``?page=`` parameter selects
+    numbered pages; otherwise ``BJJ_PAGINATION_MODE`` decides. Either way
+    the page has ``total_count`` and ``object_list``.
+    """
+    after = _cursor(request.GET.get("after"))
+    before = _cursor(request.GET.get("before"))
+    mode = getattr(settings, "BJJ_PAGINATION_MODE", "keyset")
+
+    if after is not None or before is not None or (mode == "keyset" and not request.GET.get("page")):
+        return KeysetPaginator(per_page).paginate(items, after=after, before=before, count=count)
+
+    paginator = Paginator(items, per_page)
+    if count is None and not isinstance(items, (list, tuple)):
+        count = cached_count(items)
+    if count is not None:
+        paginator.count = count  # skip Paginator's own COUNT query
+    page = paginator.get_page(request.GET.get("page"))
+    page.is_keyset = False
+    page.total_count = paginator.count
+    page.page_links = paginator.get_elided_page_range(page.number, on_each_side=2, on_ends=1)
+    return page
@@ -0,0 +1,163 @@
+"""Full-text video search over titles, tag names and category names.
+
+On PostgreSQL each video stores a weighted ``search_vector`` (GIN indexed)
+and a plain ``search_text`` (trigram GIN indexed); queries are ranked with
+``ts_rank`` and fall back to trigram word similarity when nothing matches,
+which catches typos. On SQLite (dev) the same documents live in an FTS5
+table ranked with ``bm25`` and typos are corrected against the FTS5
+vocabulary, so both backends behave alike.
+
+Documents are refreshed by ``bjj.signals`` and can be rebuilt with
+``manage.py rebuild_search_index``.
+"""
+
+import difflib
+import re
+
+from django.conf import settings
+from django.db import connection
+
+FTS_TABLE = "bjj_video_fts"
+FTS_VOCAB_TABLE = "bjj_video_fts_vocab"
+SEARCH_CONFIG = "english"
+
+_TERM = re.compile(r"\w+", re.UNICODE)
+
+
+def _is_postgres():
+    return connection.vendor == "postgresql"
+
+
+def _documents(video_model, video_ids=None):
+    """Yield ``(id, title, tag names, category names)`` for the given videos."""
+    videos = video_model.objects.select_related("position", "technique", "guard")
+    if video_ids is not None:
+        videos = videos.filter(pk__in=list(video_ids))
+
+    last_pk = 0
+    while True:
+        chunk = list(videos.filter(pk__gt=last_pk).order_by("pk")[:2000])
+        if not chunk:
+            return
+        last_pk = chunk[-1].pk
+        tags = {}
+        rows = (
+            video_model.tags.through.objects
+            .filter(video_id__in=[video.pk for video in chunk])
+            .values_list("video_id", "tag__name")
+        )
+        for video_id, tag_name in rows:
+            tags.setdefault(video_id, []).append(tag_name)
+        for video in chunk:
+            categories = [c.name for c in (video.position, video.technique, video.guard) if c]
+            yield video.pk, video.title, " ".join(tags.get(video.pk, [])), " ".join(categories)
+
+
+# -----------------------------
+# Indexing
+# -----------------------------
+def index_videos(video_ids=None, video_model=None):
+    """(Re)index the given videos, or every video when ``video_ids`` is None."""
+    if video_model is None:
+        from .models import Video as video_model
+
+    if _is_postgres():
+        from django.contrib.postgres.search import SearchVector
+        from django.db.models import Value
+
+        for video_id, title, tags, categories in _documents(video_model, video_ids):
+            video_model.objects.filter(pk=video_id).update(
+                search_text=f"{title} {tags} {categories}".strip(),
+                search_vector=(
+                    SearchVector(Value(title), weight="A", config=SEARCH_CONFIG)
+                    + SearchVector(Value(tags), weight="B", config=SEARCH_CONFIG)
+                    + SearchVector(Value(categories), weight="C", config=SEARCH_CONFIG)
+                ),
+            )
+        return
+
+    if connection.vendor == "sqlite":
+        with connection.cursor() as cursor:
+            if video_ids is None:
+                cursor.execute(f"DELETE FROM {FTS_TABLE}")
+            for video_id, title, tags, categories in _documents(video_model, video_ids):
+                cursor.execute(
+                    f"INSERT OR REPLACE INTO {FTS_TABLE}(rowid, title, tags, categories) VALUES (%s, %s, %s, %s)",
+                    [video_id, title, tags, categories],
+                )
+
+
+def remove_videos(video_ids):
+    """Drop deleted videos from the SQLite FTS table (PostgreSQL rows go with the video)."""
+    if connection.vendor != "sqlite" or not video_ids:
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [[pk] for pk in video_ids])
+
+
+# -----------------------------
+# Querying
+# -----------------------------
+def search_video_ids(query, limit=None):
+    """Return ids of videos matching ``query``, best match first."""
+    limit = limit or getattr(settings, "BJJ_SEARCH_MAX_RESULTS", 1000)
+    terms = _TERM.findall(query.lower())
+    if not terms:
+        return []
+    if _is_postgres():
+        return _search_postgres(query, limit)
+    if connection.vendor == "sqlite":
+        return _search_sqlite(terms, limit)
+    return []
+
+
+def _search_postgres(query, limit):
+    from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramWordSimilarity
+    from django.db.models import F
+    from .models import Video
+
+    search_query = SearchQuery(query, search_type="websearch", config=SEARCH_CONFIG)
+    ids = list(
+        Video.objects.filter(search_vector=search_query)
+        .annotate(rank=SearchRank(F("search_vector"), search_query))
+        .order_by("-rank", "-id")
+        .values_list("id", flat=True)[:limit]
+    )
+    if ids:
+        return ids
+
+    # Nothing matched exactly: likely a typo, rank by trigram word similarity
+    return list(
+        Video.objects.filter(search_text__trigram_word_similar=query)
+        .annotate(rank=TrigramWordSimilarity(query, "search_text"))
+        .order_by("-rank", "-id")
+        .values_list("id", flat=True)[:limit]
+    )
+
+
+def _fts_match(cursor, terms, limit):
+    match = " ".join(f'"{term}"' for term in terms)
+    cursor.execute(
+        f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s "
+        f"ORDER BY bm25({FTS_TABLE}, 10.0, 4.0, 2.0), rowid DESC LIMIT %s",
+        [match, limit],
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+def _search_sqlite(terms, limit):
+    with connection.cursor() as cursor:
+        ids = _fts_match(cursor, terms, limit)
+        if ids:
+            return ids
+
+        # Nothing matched exactly: correct each term against the index vocabulary
+        cursor.execute(f"SELECT term FROM {FTS_VOCAB_TABLE}")
+        vocabulary = [row[0] for row in cursor.fetchall()]
+        corrected = []
+        for term in terms:
+            close = difflib.get_close_matches(term, vocabulary, n=1, cutoff=0.7)
+            corrected.append(close[0] if close else term)
+        if corrected == terms:
+            return []
+        return _fts_match(cursor, corrected, limit)
@@ -0,0 +1,206 @@
+"""Signal handlers that keep denormalized video data, materialized counts,
+search documents, in-memory indexes, cached pages and ``updated_at`` stamps
+in sync with video, tag and category changes."""
+
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import caching, counts, jobs, search
+from .models import CATEGORY_MODELS, Tag, Video
+from .tag_index import VERSION_NAME as TAG_INDEX_VERSION
+from .tag_matcher import VERSION_NAME as TAG_MATCHER_VERSION
+from .versions import bump_version
+
+CATEGORY_TYPES = {model: category_type for category_type, model in CATEGORY_MODELS.items()}
+CATEGORY_ID_FIELDS = [f"{field}_id" for field in counts.CATEGORY_FIELDS]
+
+# Fields that feed the search document (see bjj.search)
+SEARCH_FIELDS = {"title", *counts.CATEGORY_FIELDS}
+
+VideoTag = Video.tags.through
+
+
+def _reindex(video_ids):
+    # A rename can reach thousands of videos: rebuild their search
+    # documents in the job worker, not in the admin request
+    if video_ids:
+        jobs.enqueue("index", video_ids=sorted(video_ids))
+
+
+def _touch(model, ids):
+    ids = [pk for pk in ids if pk is not None]
+    if ids:
+        model.objects.filter(pk__in=ids).update(updated_at=timezone.now())
+
+
+# -----------------------------
+# Videos
+# -----------------------------
+@receiver(pre_save, sender=Video)
+def video_saving(sender, instance, update_fields=None, **kwargs):
+    """Remember the current categories so post_save can adjust counts."""
+    instance._old_categories = None
+    if update_fields is not None and not set(counts.CATEGORY_FIELDS).intersection(update_fields):
+        return
+    old = {}
+    if instance.pk is not None:
+        old = Video.objects.filter(pk=instance.pk).values(*CATEGORY_ID_FIELDS).first() or {}
+    instance._old_categories = old
+
+
+@receiver(post_save, sender=Video)
+def video_saved(sender, instance, update_fields=None, **kwargs):
+    old = getattr(instance, "_old_categories", None)
+    if old is not None:
+        for field in counts.CATEGORY_FIELDS:
+            old_id, new_id = old.get(f"{field}_id"), getattr(instance, f"{field}_id")
+            if old_id != new_id:
+                counts.adjust(field, [old_id], -1)
+                counts.adjust(field, [new_id], 1)
+                _touch(CATEGORY_MODELS[field], [old_id])
+    caching.touch_videos([instance.pk])
+
+    if update_fields is None or SEARCH_FIELDS.intersection(update_fields):
+        search.index_videos([instance.pk])
+    caching.invalidate()
+
+
+@receiver(pre_delete, sender=Video)
+def video_deleting(sender, instance, **kwargs):
+    # Through rows are cascaded without m2m_changed
+    instance._deleted_tag_ids = list(
+        VideoTag.objects.filter(video_id=instance.pk).values_list("tag_id", flat=True)
+    )
+
+
+@receiver(post_delete, sender=Video)
+def video_deleted(sender, instance, **kwargs):
+    for field in counts.CATEGORY_FIELDS:
+        counts.adjust(field, [getattr(instance, f"{field}_id")], -1)
+        _touch(CATEGORY_MODELS[field], [getattr(instance, f"{field}_id")])
+    counts.adjust("tag", getattr(instance, "_deleted_tag_ids", []), -1)
+    _touch(Tag, getattr(instance, "_deleted_tag_ids", []))
+    search.remove_videos([instance.pk])
+    bump_version(TAG_INDEX_VERSION)
+    caching.invalidate()
+
+
+@receiver(m2m_changed, sender=VideoTag)
+def video_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Refresh ``Video.tag_cache``, tag counts and indexes when tags change.
+
+    ``instance`` is a Video (``reverse=False``, ``pk_set`` = tag ids) or a
+    Tag (``reverse=True``, ``pk_set`` = video ids).
+    """
+    if action == "pre_remove":
+        # pk_set holds every requested id, not only the links that exist
+        if reverse:
+            instance._removed_links = VideoTag.objects.filter(tag_id=instance.pk, video_id__in=pk_set).count()
+        else:
+            instance._removed_links = list(
+                VideoTag.objects.filter(video_id=instance.pk, tag_id__in=pk_set).values_list("tag_id", flat=True)
+            )
+        return
+    if action == "pre_clear":
+        if reverse:
+            # tag.videos.clear(): remember which videos lose the tag
+            instance._cleared_video_ids = list(instance.videos.values_list("pk", flat=True))
+        else:
+            instance._cleared_tag_ids = list(instance.tags.values_list("pk", flat=True))
+        return
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+
+    if not reverse:
+        video_ids = [instance.pk]
+        if action == "post_add":
+            counts.adjust("tag", pk_set or [], 1)
+        elif action == "post_remove":
+            counts.adjust("tag", getattr(instance, "_removed_links", []), -1)
+            _touch(Tag, getattr(instance, "_removed_links", []))
+        else:
+            counts.adjust("tag", getattr(instance, "_cleared_tag_ids", []), -1)
+            _touch(Tag, getattr(instance, "_cleared_tag_ids", []))
+    elif action == "post_clear":
+        video_ids = getattr(instance, "_cleared_video_ids", [])
+        counts.adjust("tag", [instance.pk], -len(video_ids))
+        _touch(Tag, [instance.pk])
+    else:
+        video_ids = pk_set or []
+        if action == "post_add":
+            counts.adjust("tag", [instance.pk], len(video_ids))
+        else:
+            counts.adjust("tag", [instance.pk], -getattr(instance, "_removed_links", 0))
+            _touch(Tag, [instance.pk])
+
+    Video.refresh_tag_cache(video_ids)
+    caching.touch_videos(video_ids)
+    search.index_videos(video_ids)
+    bump_version(TAG_INDEX_VERSION)
+    caching.invalidate()
+
+
+# -----------------------------
+# Tags
+# -----------------------------
+@receiver(post_save, sender=Tag)
+def tag_saved(sender, instance, created, **kwargs):
+    """A renamed tag changes the cached name on every video that carries it."""
+    bump_version(TAG_MATCHER_VERSION)
+    counts.invalidate("tag")
+    caching.invalidate()
+    if not created:
+        video_ids = list(instance.videos.values_list("pk", flat=True))
+        Video.refresh_tag_cache(video_ids)
+        _reindex(video_ids)
+        caching.touch_videos(video_ids)
+
+
+@receiver(pre_delete, sender=Tag)
+def tag_deleting(sender, instance, **kwargs):
+    instance._deleted_video_ids = list(instance.videos.values_list("pk", flat=True))
+
+
+@receiver(post_delete, sender=Tag)
+def tag_deleted(sender, instance, **kwargs):
+    # Deleting a tag removes through rows without firing m2m_changed
+    video_ids = getattr(instance, "_deleted_video_ids", [])
+    Video.refresh_tag_cache(video_ids)
+    _reindex(video_ids)
+    caching.touch_videos(video_ids)
+    bump_version(TAG_INDEX_VERSION)
+    bump_version(TAG_MATCHER_VERSION)
+    counts.invalidate("tag")
+    caching.invalidate()
+
+
+# -----------------------------
+# Categories (Position / Technique / Guard)
+# -----------------------------
+def _category_video_ids(instance):
+    return list(instance.video_set.values_list("pk", flat=True))
+
+
+def category_saved(sender, instance, created, **kwargs):
+    counts.invalidate(CATEGORY_TYPES[sender])
+    caching.invalidate()
+    if not created:
+        _reindex(_category_video_ids(instance))
+
+
+def category_deleting(sender, instance, **kwargs):
+    instance._deleted_video_ids = _category_video_ids(instance)
+
+
+def category_deleted(sender, instance, **kwargs):
+    # on_delete=SET_NULL updates videos without firing post_save
+    counts.invalidate(CATEGORY_TYPES[sender])
+    caching.invalidate()
+    _reindex(getattr(instance, "_deleted_video_ids", []))
+
+
+for _model in CATEGORY_MODELS.values():
+    post_save.connect(category_saved, sender=_model, dispatch_uid=f"bjj_{_model.__name__}_saved")
+    pre_delete.connect(category_deleting, sender=_model, dispatch_uid=f"bjj_{_model.__name__}_deleting")
+    post_delete.connect(category_deleted, sender=_model, dispatch_uid=f"bjj_{_model.__name__}_deleted")
@@ -0,0 +1,77 @@
+/*
+ * Adaptive-bitrate playback of a video's HLS renditions (see bjj/hls.py).
+ * Safari and iOS play HLS natively and pick the variant themselves; other
+ * browsers load hls.js, which picks it from measured bandwidth and player
+ * size, with a manual quality menu. Without either, or if HLS fails, the
+ * signed progressive MP4 in <source> plays as before.
+ *
+ * Like preload="none" on the progressive MP4, hls.js only fetches the
+ * playlists up front (for the quality menu) and waits for the first play
+ * before loading any segment.
+ *
+ *   <video data-hls="/video/1/hls/master.m3u8"><source src="…mp4"></video>
+ *   <div class="hls-quality" data-video="player-id"><select></select></div>
+ */
+(function () {
+  "use strict";
+
+  const HLS_JS = "https://cdn.jsdelivr.net/npm/hls.js@1.5.17/dist/hls.min.js";
+
+  function loadScript(src) {
+    return new Promise((resolve, reject) => {
+      const script = document.createElement("script");
+      script.src = src;
+      script.onload = resolve;
+      script.onerror = reject;
+      document.head.appendChild(script);
+    });
+  }
+
+  function qualityMenu(video, hls) {
+    const menu = document.querySelector(`.hls-quality[data-video="${video.id}"]`);
+    if (!menu || hls.levels.length < 2) return;
+    const select = menu.querySelector("select");
+    select.add(new Option("Auto", -1));
+    hls.levels
+      .map((level, index) => ({ height: level.height, index }))
+      .sort((a, b) => b.height - a.height)
+      .forEach(({ height, index }) => select.add(new Option(`${height}p`, index)));
+    // nextLevel switches at the next segment instead of flushing the buffer
+    select.addEventListener("change", () => { hls.nextLevel = +select.value; });
+    menu.hidden = false;
+  }
+
+  function fallback(video) {
+    const source = video.querySelector("source");
+    if (source) {
+      video.src = source.src;
+      video.load();
+    }
+  }
+
+  function bind(video) {
+    if (video.canPlayType("application/vnd.apple.mpegurl")) {
+      video.src = video.dataset.hls;
+      video.addEventListener("error", () => fallback(video), { once: true });
+      return;
+    }
+    if (!window.MediaSource) return;
+
+    loadScript(HLS_JS).then(() => {
+      if (!window.Hls || !Hls.isSupported()) return;
+      const hls = new Hls({ capLevelToPlayerSize: true, autoStartLoad: false });
+      hls.on(Hls.Events.MANIFEST_PARSED, () => qualityMenu(video, hls));
+      hls.on(Hls.Events.ERROR, (event, data) => {
+        if (data.fatal) {
+          hls.destroy();
+          fallback(video);
+        }
+      });
+      video.addEventListener("play", () => hls.startLoad(), { once: true });
+      hls.loadSource(video.dataset.hls);
+      hls.attachMedia(video);
+    }).catch(() => {});
+  }
+
+  document.querySelectorAll("video[data-hls]").forEach(bind);
+})();
@@ -0,0 +1,94 @@
+/*
+ * Storyboard previews: hover a grid card or the scrub bar under the player
+ * to see frames from a WebVTT thumbnails track (sprite tiles addressed with
+ * #xywh=), without loading any bytes of the signed video stream.
+ *
+ *   <div data-storyboard="…/video-storyboard.vtt"><div class="storyboard-frame"></div></div>
+ *   <div class="storyboard-scrub" data-storyboard="…" data-video="player-id">…</div>
+ */
+(function () {
+  "use strict";
+
+  const tracks = {};
+
+  function seconds(timestamp) {
+    return timestamp.split(":").reduce((total, part) => total * 60 + parseFloat(part), 0);
+  }
+
+  function load(url) {
+    if (!tracks[url]) {
+      tracks[url] = fetch(url)
+        .then((response) => response.text())
+        .then((text) => {
+          const cues = [];
+          for (const block of text.split(/\r?\n\r?\n/)) {
+            const match = block.match(/([\d:.]+)\s+-->\s+([\d:.]+)\s*\r?\n(\S+)#xywh=(\d+),(\d+),(\d+),(\d+)/);
+            if (match) {
+              cues.push({
+                start: seconds(match[1]),
+                end: seconds(match[2]),
+                src: new URL(match[3], url).href,
+                x: +match[4], y: +match[5], w: +match[6], h: +match[7],
+              });
+            }
+          }
+          const sheet = {
+            w: Math.max(...cues.map((cue) => cue.x + cue.w)),
+            h: Math.max(...cues.map((cue) => cue.y + cue.h)),
+          };
+          return { cues, sheet, duration: cues.length ? cues[cues.length - 1].end : 0 };
+        });
+    }
+    return tracks[url];
+  }
+
+  function paint(frame, track, time) {
+    const cue = track.cues.find((c) => time < c.end) || track.cues[track.cues.length - 1];
+    if (!cue) return;
+    const scale = frame.clientWidth / cue.w;
+    frame.style.backgroundImage = `url("${cue.src}")`;
+    frame.style.backgroundSize = `${track.sheet.w * scale}px ${track.sheet.h * scale}px`;
+    frame.style.backgroundPosition = `-${cue.x * scale}px -${cue.y * scale}px`;
+  }
+
+  function fraction(event, element) {
+    const rect = element.getBoundingClientRect();
+    return Math.min(1, Math.max(0, (event.clientX - rect.left) / rect.width));
+  }
+
+  // Grid cards: the pointer position across the card picks the frame
+  function bindCard(card) {
+    const frame = card.querySelector(".storyboard-frame");
+    card.addEventListener("mousemove", (event) => {
+      load(card.dataset.storyboard).then((track) => {
+        paint(frame, track, fraction(event, card) * track.duration);
+        frame.hidden = false;
+      });
+    });
+    card.addEventListener("mouseleave", () => { frame.hidden = true; });
+  }
+
+  // Detail page: preview while hovering the bar, seek (and play) on click
+  function bindScrub(bar) {
+    const frame = bar.querySelector(".storyboard-frame");
+    const video = document.getElementById(bar.dataset.video);
+    bar.addEventListener("mousemove", (event) => {
+      load(bar.dataset.storyboard).then((track) => {
+        const at = fraction(event, bar);
+        paint(frame, track, at * track.duration);
+        frame.style.left = `calc(${at * 100}% - ${frame.clientWidth / 2}px)`;
+        frame.hidden = false;
+      });
+    });
+    bar.addEventListener("mouseleave", () => { frame.hidden = true; });
+    bar.addEventListener("click", (event) => {
+      load(bar.dataset.storyboard).then((track) => {
+        video.currentTime = fraction(event, bar) * track.duration;
+        video.play();
+      });
+    });
+  }
+
+  document.querySelectorAll(".storyboard-card[data-storyboard]").forEach(bindCard);
+  document.querySelectorAll(".storyboard-scrub[data-storyboard]").forEach(bindScrub);
+})();
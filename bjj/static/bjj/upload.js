@@ -0,0 +1,174 @@
+/*
+ * Direct-to-S3 video upload: the file is cut into parts that are PUT in
+ * parallel to presigned multipart URLs, then the server assembles them and
+ * creates the Video (see bjj/uploads.py). If the direct upload can't start,
+ * the form is submitted normally and the server uploads the file instead.
+ * The file's content hash is sent first: a file already stored for another
+ * video is refused, and one already at its own key isn't sent again.
+ *
+ *   <form data-direct-upload data-start="…" data-sign="…" data-complete="…" data-abort="…">
+ */
+(function () {
+  "use strict";
+
+  const CONCURRENCY = 4;
+  const RETRIES = 3;
+  const HASH_BLOCK_SIZE = 8 * 1024 * 1024; // uploads.HASH_BLOCK_SIZE
+
+  function hex(buffer) {
+    return Array.from(new Uint8Array(buffer), (byte) => byte.toString(16).padStart(2, "0")).join("");
+  }
+
+  // uploads.BlockHasher: SHA-256 of the SHA-256 digests of each block ("" without WebCrypto)
+  async function contentHash(file, onProgress) {
+    if (!window.crypto || !crypto.subtle) return "";
+    const blocks = Math.max(1, Math.ceil(file.size / HASH_BLOCK_SIZE));
+    const digests = new Uint8Array(blocks * 32);
+    for (let i = 0; i < blocks; i++) {
+      const block = await file.slice(i * HASH_BLOCK_SIZE, (i + 1) * HASH_BLOCK_SIZE).arrayBuffer();
+      digests.set(new Uint8Array(await crypto.subtle.digest("SHA-256", block)), i * 32);
+      onProgress((i + 1) / blocks);
+    }
+    return hex(await crypto.subtle.digest("SHA-256", digests));
+  }
+
+  function post(url, data) {
+    return fetch(url, { method: "POST", body: data, credentials: "same-origin" }).then((response) =>
+      response.json().then((body) => {
+        if (!response.ok) throw Object.assign(new Error(body.error || "Upload failed"), { body });
+        return body;
+      })
+    );
+  }
+
+  function putPart(url, blob, onProgress) {
+    return new Promise((resolve, reject) => {
+      const xhr = new XMLHttpRequest();
+      xhr.open("PUT", url);
+      xhr.upload.onprogress = (event) => onProgress(event.loaded);
+      xhr.onload = () => {
+        const etag = xhr.getResponseHeader("ETag");
+        if (xhr.status === 200 && etag) resolve(etag);
+        else reject(new Error(`Part upload failed (${xhr.status})`));
+      };
+      xhr.onerror = () => reject(new Error("Network error"));
+      xhr.send(blob);
+    });
+  }
+
+  async function upload(form, file, digest, progress) {
+    const fields = () => {
+      const data = new FormData(form);
+      data.delete("file");
+      data.append("content_hash", digest);
+      return data;
+    };
+    const start = fields();
+    start.append("filename", file.name);
+    start.append("size", file.size);
+    const started = await post(form.dataset.start, start);
+    if (started.unchanged) return started;
+    const { upload_id, part_size, parts, sign_batch } = started;
+
+    const loaded = new Array(parts).fill(0);
+    const report = () => progress(loaded.reduce((a, b) => a + b, 0) / file.size);
+    const etags = [];
+    const batches = {};
+    let next = 1;
+
+    // Part URLs are presigned sign_batch at a time, one request per batch
+    function url(n) {
+      const batch = Math.floor((n - 1) / sign_batch);
+      if (!batches[batch]) {
+        const data = fields();
+        data.append("upload_id", upload_id);
+        for (let p = batch * sign_batch + 1; p <= Math.min((batch + 1) * sign_batch, parts); p++) {
+          data.append("part", p);
+        }
+        batches[batch] = post(form.dataset.sign, data).then((body) => body.urls);
+      }
+      return batches[batch].then((urls) => urls[n]);
+    }
+
+    async function worker() {
+      while (next <= parts) {
+        const n = next++;
+        const blob = file.slice((n - 1) * part_size, n * part_size);
+        for (let attempt = 1; ; attempt++) {
+          try {
+            etags[n - 1] = { PartNumber: n, ETag: await putPart(await url(n), blob, (bytes) => { loaded[n - 1] = bytes; report(); }) };
+            break;
+          } catch (error) {
+            loaded[n - 1] = 0;
+            if (attempt === RETRIES) throw error;
+          }
+        }
+      }
+    }
+
+    try {
+      await Promise.all(Array.from({ length: Math.min(CONCURRENCY, parts) }, worker));
+      const done = fields();
+      done.append("upload_id", upload_id);
+      done.append("filename", file.name);
+      done.append("size", file.size);
+      done.append("parts", JSON.stringify(etags));
+      return await post(form.dataset.complete, done);
+    } catch (error) {
+      error.started = true;
+      const abort = fields();
+      abort.append("upload_id", upload_id);
+      post(form.dataset.abort, abort).catch(() => {});
+      throw error;
+    }
+  }
+
+  function bind(form) {
+    const input = form.querySelector('input[type="file"]');
+    const bar = form.querySelector(".upload-progress");
+    const status = form.querySelector(".upload-status");
+    let fallback = false;
+
+    form.addEventListener("submit", (event) => {
+      if (fallback || !input.files.length || !window.fetch) return;
+      event.preventDefault();
+      form.querySelector('[type="submit"]').disabled = true;
+      bar.hidden = false;
+      const file = input.files[0];
+      const progress = (fraction) => { bar.value = fraction; };
+      status.textContent = "Checking for an identical video…";
+      contentHash(file, progress)
+        .then((digest) => {
+          status.textContent = "";
+          return upload(form, file, digest, progress);
+        })
+        .then((result) => { window.location.href = result.url; })
+        .catch((error) => {
+          const errors = error.body && error.body.errors;
+          if (error.body && error.body.duplicate) {
+            status.textContent = `❌ ${error.message} `;
+            const link = document.createElement("a");
+            link.href = error.body.url;
+            link.textContent = "View it";
+            status.appendChild(link);
+            form.querySelector('[type="submit"]').disabled = false;
+            bar.hidden = true;
+            return;
+          }
+          if (!errors && !error.started) {
+            // Direct upload unavailable: send the file through the server
+            fallback = true;
+            form.submit();
+            return;
+          }
+          status.textContent = errors
+            ? Object.entries(errors).map(([field, messages]) => `${field}: ${messages.join(" ")}`).join("\n")
+            : `❌ ${error.message}`;
+          form.querySelector('[type="submit"]').disabled = false;
+          bar.hidden = true;
+        });
+    });
+  }
+
+  document.querySelectorAll("form[data-direct-upload]").forEach(bind);
+})();
@@ -0,0 +1,72 @@
+"""In-memory inverted index from tag id to the ids of videos carrying it.
+
+Posting lists are sorted ``array('q')`` of video ids, so a multi-tag AND
+query walks the shortest list and binary-searches the others instead of
+joining the tag table once per term. The index is built lazily on first use
+and rebuilt when the ``tag_index`` version is bumped by ``bjj.signals``.
+"""
+
+import threading
+from array import array
+from bisect import bisect_left
+
+from .models import Video
+from .versions import get_version
+
+VERSION_NAME = "tag_index"
+
+
+class TagIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._postings = {}
+        self._version = None
+
+    def _build(self):
+        postings = {}
+        rows = (
+            Video.tags.through.objects
+            .values_list("tag_id", "video_id")
+            .order_by("tag_id", "video_id")
+            .iterator(chunk_size=10000)
+        )
+        for tag_id, video_id in rows:
+            ids = postings.get(tag_id)
+            if ids is None:
+                ids = postings[tag_id] = array("q")
+            ids.append(video_id)
+        return postings
+
+    def _ensure_fresh(self):
+        version = get_version(VERSION_NAME)
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    self._postings = self._build()
+                    self._version = version
+        return self._postings
+
+    def video_ids(self, tag_ids):
+        """Return ids of videos carrying *all* ``tag_ids``, newest (highest id) first."""
+        postings = self._ensure_fresh()
+        lists = [postings.get(tag_id) for tag_id in set(tag_ids)]
+        if not lists or any(ids is None for ids in lists):
+            return []
+        lists.sort(key=len)
+        smallest, others = lists[0], lists[1:]
+
+        def contains(ids, video_id):
+            i = bisect_left(ids, video_id)
+            return i < len(ids) and ids[i] == video_id
+
+        return [
+            video_id for video_id in reversed(smallest)
+            if all(contains(ids, video_id) for ids in others)
+        ]
+
+    def invalidate(self):
+        """Drop this process's copy; the next query rebuilds it."""
+        self._version = None
+
+
+tag_index = TagIndex()
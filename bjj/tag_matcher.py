@@ -0,0 +1,151 @@
+"""Precompiled matcher that finds DB tag names inside free-text search queries.
+
+Tag names are compiled once into an Aho–Corasick automaton, so a query is
+scanned in a single pass instead of testing every tag with ``in``. Results
+follow the original rules: longer tags win, a shorter tag is skipped when it
+is a word of an already matched tag, and leftover single words (minus
+STOPWORDS) are matched exactly. Queries and tag names go through the same
+normalisation, including SYNONYMS ("no gi" / "no-gi" → "nogi").
+
+The automaton is rebuilt when the ``tag_matcher`` version is bumped by
+``bjj.signals`` (tag created, renamed or deleted).
+"""
+
+import re
+import threading
+from collections import deque
+
+from .models import Tag
+from .versions import get_version
+
+VERSION_NAME = "tag_matcher"
+
+STOPWORDS = {"from", "in", "on", "at", "the", "a", "an", "of", "and", "with"}
+
+# ✅ Add a synonyms dictionary
+SYNONYMS = {
+    "no gi": "nogi",
+    "no-gi": "nogi",
+}
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+
+
+def _strip(text):
+    """Lowercase, strip punctuation (like the search box does) and collapse spaces."""
+    return " ".join(_PUNCTUATION.sub(" ", text.lower()).split())
+
+
+_SYNONYM_MAP = {_strip(phrase): replacement for phrase, replacement in SYNONYMS.items()}
+_SYNONYM_PATTERN = re.compile(
+    r"\b(" + "|".join(re.escape(p) for p in sorted(_SYNONYM_MAP, key=len, reverse=True)) + r")\b"
+)
+
+
+def normalize(text):
+    """Normalise a query or tag name for matching."""
+    return _SYNONYM_PATTERN.sub(lambda m: _SYNONYM_MAP[m.group(1)], _strip(text))
+
+
+class _Automaton:
+    """Character-level Aho–Corasick automaton over normalised tag names."""
+
+    def __init__(self, patterns):
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [[]]
+
+        for index, pattern in enumerate(patterns):
+            state = 0
+            for char in pattern:
+                nxt = self.goto[state].get(char)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[state][char] = nxt
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append([])
+                state = nxt
+            self.out[state].append(index)
+
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, nxt in self.goto[state].items():
+                queue.append(nxt)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[nxt] = self.goto[fallback].get(char, 0)
+                self.out[nxt] = self.out[nxt] + self.out[self.fail[nxt]]
+
+    def find(self, text):
+        """Return the set of pattern indexes occurring anywhere in ``text``."""
+        found = set()
+        state = 0
+        goto, fail, out = self.goto, self.fail, self.out
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if out[state]:
+                found.update(out[state])
+        return found
+
+
+class TagMatcher:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._compiled = None
+
+    def _build(self):
+        tag_map = {}  # normalised name → (id, canonical name)
+        for tag_id, name in Tag.objects.order_by("id").values_list("id", "name"):
+            tag_map[normalize(name)] = (tag_id, name)
+        tag_map.pop("", None)
+
+        # Longest tags first; ties keep tag order (sorted() is stable)
+        ranked = sorted(tag_map, key=len, reverse=True)
+        ids_by_name = {name: tag_id for tag_id, name in tag_map.values()}
+        return tag_map, ranked, _Automaton(ranked), ids_by_name
+
+    def _ensure_fresh(self):
+        version = get_version(VERSION_NAME)
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    self._compiled = self._build()
+                    self._version = version
+        return self._compiled
+
+    def match(self, query):
+        """Return canonical tag names found in ``query`` (longest match first)."""
+        tag_map, ranked, automaton, _ = self._ensure_fresh()
+        query = normalize(query)
+
+        matched_tags = []
+        used_tokens = set()
+
+        # First: full multi-word tags occurring in the query, longest first
+        for rank in sorted(automaton.find(query)):
+            tag = ranked[rank]
+            if tag not in used_tokens:
+                matched_tags.append(tag_map[tag][1])
+                used_tokens.update(tag.split())
+
+        # Second: leftover single terms
+        for term in query.split():
+            if term not in STOPWORDS and term not in used_tokens and term in tag_map:
+                matched_tags.append(tag_map[term][1])
+                used_tokens.add(term)
+
+        return matched_tags
+
+    def ids_for(self, names):
+        """Return tag ids for canonical names returned by ``match``."""
+        ids_by_name = self._ensure_fresh()[3]
+        return [ids_by_name[name] for name in names if name in ids_by_name]
+
+
+tag_matcher = TagMatcher()
@@ -1,3 +1,421 @@
-from django.test import TestCase
+import os
+import shutil
+import subprocess
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django import forms
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from jiujitsuteria.utils.cloudfront import SignedUrlCache
+from . import jobs, search, thumbnails, uploads
+from .forms import VideoUploadForm
+from .models import Job, Position, Tag, Video
+from .pagination import KeysetPaginator, paginate
+from .tag_matcher import tag_matcher
+from .thumbnails import video_s3_key
+
+
+class SignalTests(TestCase):
+    def setUp(self):
+        self.closed = Position.objects.create(name="Closed Guard")
+        self.mount = Position.objects.create(name="Mount")
+        self.video = Video.objects.create(title="Armbar", position=self.closed)
+
+    def assertCounts(self, **expected):
+        for name, count in expected.items():
+            obj = getattr(self, name)
+            obj.refresh_from_db()
+            self.assertEqual(obj.video_count, count, name)
+
+    def test_category_counts(self):
+        self.assertCounts(closed=1, mount=0)
+        self.video.position = self.mount
+        self.video.save()
+        self.assertCounts(closed=0, mount=1)
+        self.video.delete()
+        self.assertCounts(closed=0, mount=0)
+
+    def test_tag_counts_and_cache(self):
+        self.armbar = Tag.objects.create(name="armbar")
+        self.gi = Tag.objects.create(name="gi")
+        self.video.tags.add(self.armbar, self.gi)
+        self.video.refresh_from_db()
+        self.assertEqual([tag["name"] for tag in self.video.tag_cache], ["armbar", "gi"])
+        self.assertCounts(armbar=1, gi=1)
+
+        self.video.tags.remove(self.armbar)
+        self.assertCounts(armbar=0, gi=1)
+        self.gi.name = "nogi"
+        self.gi.save()
+        self.video.refresh_from_db()
+        self.assertEqual(self.video.tag_cache, [{"id": self.gi.pk, "name": "nogi"}])
+
+        self.gi.videos.clear()
+        self.assertCounts(gi=0)
+        self.video.refresh_from_db()
+        self.assertEqual(self.video.tag_cache, [])
+
+    def test_deleted_tag_leaves_cache(self):
+        tag = Tag.objects.create(name="armbar")
+        self.video.tags.add(tag)
+        tag.delete()
+        self.video.refresh_from_db()
+        self.assertEqual(self.video.tag_cache, [])
+
+    def test_rename_reindexes_in_a_job(self):
+        self.closed.name = "Half Guard"
+        self.closed.save()
+        self.assertEqual(search.search_video_ids("half"), [])
+        job = Job.objects.get(kind="index")
+        self.assertEqual(job.payload, {"video_ids": [self.video.pk]})
+        self.assertTrue(jobs.run(jobs.claim("test")))
+        self.assertEqual(search.search_video_ids("half"), [self.video.pk])
+
+
+class TagMatcherTests(TestCase):
+    def setUp(self):
+        cache.clear()  # the matcher is rebuilt per version, not per test database
+        for name in ("closed guard", "guard", "armbar", "No-Gi"):
+            Tag.objects.create(name=name)
+
+    def test_longest_tag_wins(self):
+        self.assertEqual(tag_matcher.match("Armbar from Closed Guard"), ["closed guard", "armbar"])
+
+    def test_word_of_matched_tag_is_skipped(self):
+        self.assertNotIn("guard", tag_matcher.match("closed guard"))
+
+    def test_synonyms(self):
+        for query in ("no gi guard", "no-gi guard", "NOGI guard"):
+            self.assertEqual(tag_matcher.match(query), ["guard", "No-Gi"], query)
+
+    def test_ids_for(self):
+        names = tag_matcher.match("armbar")
+        self.assertEqual(tag_matcher.ids_for(names), [Tag.objects.get(name="armbar").pk])
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.ids = [Video.objects.create(title=f"Video {n}").pk for n in range(5)][::-1]
+        self.videos = Video.objects.order_by("-id")
+
+    def page_ids(self, page):
+        return [item if isinstance(item, int) else item.pk for item in page]
+
+    def test_after_and_before(self):
+        for items in (self.videos, self.ids):
+            paginator = KeysetPaginator(per_page=2)
+            first = paginator.paginate(items)
+            self.assertEqual(self.page_ids(first), self.ids[:2])
+            self.assertEqual((first.has_previous(), first.has_next()), (False, True))
+
+            second = paginator.paginate(items, after=first.next_cursor)
+            self.assertEqual(self.page_ids(second), self.ids[2:4])
+            self.assertEqual((second.has_previous(), second.has_next()), (True, True))
+
+            last = paginator.paginate(items, after=second.next_cursor)
+            self.assertEqual(self.page_ids(last), self.ids[4:])
+            self.assertFalse(last.has_next())
+
+            back = paginator.paginate(items, before=second.previous_cursor)
+            self.assertEqual(self.page_ids(back), self.ids[:2])
+            self.assertFalse(back.has_previous())
+
+    def test_request_cursor(self):
+        request = RequestFactory().get("/", {"after": self.ids[1]})
+        page = paginate(request, self.videos, per_page=2, count=5)
+        self.assertEqual(self.page_ids(page), self.ids[2:4])
+        self.assertEqual(page.total_count, 5)
+
+
+@override_settings(CLOUDFRONT_SIGNED_URL_CACHE_ALIAS=None)
+class SignedUrlCacheTests(TestCase):
+    def test_url_reused_within_bucket(self):
+        signed = []
+
+        def sign(key, expire_date):
+            signed.append(expire_date)
+            return f"{key}?Expires={int(expire_date.timestamp())}"
+
+        urls = SignedUrlCache()
+        with mock.patch("time.time", return_value=6000):
+            first = urls.get("a.mp4", expires_in=3600, reuse_for=3000, sign=sign)
+        with mock.patch("time.time", return_value=8999):
+            self.assertEqual(urls.get("a.mp4", expires_in=3600, reuse_for=3000, sign=sign), first)
+        self.assertEqual(len(signed), 1)
+        self.assertEqual(first, "a.mp4?Expires=9600")
+
+        with mock.patch("time.time", return_value=9000):  # next bucket
+            self.assertEqual(urls.get("a.mp4", expires_in=3600, reuse_for=3000, sign=sign), "a.mp4?Expires=12600")
+        self.assertEqual((urls.hits, urls.misses), (1, 2))
+
+    @override_settings(CLOUDFRONT_SIGNED_URL_REUSE=3000)
+    def test_short_lived_url_reused_for_part_of_its_life(self):
+        urls = SignedUrlCache()
+
+        def get(now):
+            with mock.patch("time.time", return_value=now):
+                return urls.get("a.mp4", expires_in=600, sign=lambda key, expire_date: int(expire_date.timestamp()))
+
+        self.assertEqual(get(6000), 6600)
+        self.assertEqual(get(6499), 6600)
+        self.assertEqual(get(6500), 7100)
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.position = Position.objects.create(name="Mount")
+        self.video = Video.objects.create(title="Armbar", position=self.position)
+        self.url = reverse("bjj:category_videos", args=["position", self.position.pk])
+
+    def test_not_modified(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        etag = response["ETag"]
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_changed_video_changes_etag(self):
+        etag = self.client.get(self.url)["ETag"]
+        self.video.title = "Armbar from mount"
+        self.video.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Armbar from mount")
+
+    def test_signing_bucket_only_changes_signed_pages(self):
+        detail_url = reverse("bjj:video_detail", args=[self.video.pk])
+        with mock.patch("time.time", return_value=6000):
+            etags = [self.client.get(url)["ETag"] for url in (self.url, detail_url)]
+        with mock.patch("time.time", return_value=6000 + 24 * 60 * 60):
+            self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etags[0]).status_code, 304)
+            self.assertEqual(self.client.get(detail_url, HTTP_IF_NONE_MATCH=etags[1]).status_code, 200)
+
+
+class PageCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.video = Video.objects.create(title="Armbar", video_url="cdn.example.com/Guard/armbar.mp4")
+
+    def test_only_issued_placeholders_are_signed(self):
+        forged = [
+            "cf-signed:R3VhcmQvU2VjcmV0L3ByZW1pdW0ubXA0:315360000:",  # b64 of a private key
+            "cf-signed:0123456789abcdef:0:",
+        ]
+        for text in forged:
+            response = self.client.get(reverse("bjj:video_search"), {"q": text})
+            self.assertNotContains(response, "Signature=")
+            self.assertContains(response, text)
+
+        url = reverse("bjj:video_detail", args=[self.video.pk])
+        for _ in range(2):  # rendered, then from the cache
+            self.assertContains(self.client.get(url), "Guard/armbar.mp4?Expires=")
+
+    def test_other_parameters_bypass_the_cache(self):
+        url = reverse("bjj:video_detail", args=[self.video.pk])
+        self.assertContains(self.client.get(url, {"ref": "spam"}), "ref=spam")
+        self.assertNotContains(self.client.get(url), "ref=spam")
+
+
+class JobQueueTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch.dict(jobs.HANDLERS, {"fail": mock.Mock(side_effect=RuntimeError("boom"))})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_duplicate_not_queued(self):
+        self.assertIsNotNone(jobs.enqueue("fail", video_id=1))
+        self.assertIsNone(jobs.enqueue("fail", video_id=1))
+        self.assertIsNotNone(jobs.enqueue("fail", video_id=2))
+
+    def test_claim_marks_running(self):
+        job = jobs.enqueue("fail", video_id=1)
+        claimed = jobs.claim("worker-1")
+        self.assertEqual(claimed.pk, job.pk)
+        self.assertEqual((claimed.status, claimed.attempts, claimed.locked_by), (Job.RUNNING, 1, "worker-1"))
+        self.assertIsNone(jobs.claim("worker-2"))
+
+    def test_failure_is_retried_later_then_fails(self):
+        jobs.enqueue("fail", max_attempts=2, video_id=1)
+        self.assertFalse(jobs.run(jobs.claim("test")))
+        job = Job.objects.get()
+        self.assertEqual(job.status, Job.QUEUED)
+        self.assertGreater(job.run_at, timezone.now())
+        self.assertIn("boom", job.last_error)
+        self.assertIsNone(jobs.claim("test"))  # backing off
+
+        Job.objects.update(run_at=timezone.now())
+        self.assertFalse(jobs.run(jobs.claim("test")))
+        self.assertEqual(Job.objects.get().status, Job.FAILED)
+
+    def test_lost_worker_job_is_claimed_again(self):
+        jobs.enqueue("fail", video_id=1)
+        jobs.claim("lost")
+        Job.objects.update(locked_at=timezone.now() - timedelta(seconds=jobs.lock_timeout() + 1))
+        self.assertEqual(jobs.claim("worker-2").attempts, 2)
+
+    def test_retry_resets_attempts(self):
+        jobs.enqueue("fail", max_attempts=1, video_id=1)
+        jobs.run(jobs.claim("test"))
+        self.assertEqual(jobs.retry(Job.objects.filter(status=Job.FAILED)), 1)
+        job = Job.objects.get()
+        self.assertEqual((job.status, job.attempts), (Job.QUEUED, 0))
+
+
+@override_settings(CLOUDFRONT_DOMAIN="d123.cloudfront.net")
+class VideoS3KeyTests(TestCase):
+    def test_stored_url_without_scheme(self):
+        # As saved by bjj.uploads.create_video
+        video = Video(video_url="d123.cloudfront.net/Guard/Closed_Guard/sweep.mp4")
+        self.assertEqual(video_s3_key(video), "Guard/Closed_Guard/sweep.mp4")
+
+    def test_full_url(self):
+        video = Video(video_url="https://d123.cloudfront.net/Guard/Closed_Guard/sweep.mp4")
+        self.assertEqual(video_s3_key(video), "Guard/Closed_Guard/sweep.mp4")
+
+    def test_other_domain_without_scheme(self):
+        video = Video(video_url="old.cloudfront.net/Uncategorized/a.mp4?v=2")
+        self.assertEqual(video_s3_key(video), "Uncategorized/a.mp4")
+
+    def test_missing_url(self):
+        self.assertIsNone(video_s3_key(Video(video_url="")))
+
+
+@override_settings(
+    CLOUDFRONT_DOMAIN="d123.cloudfront.net",
+    CLOUDFRONT_PUBLIC_DOMAIN="thumbs.example.net",
+    AWS_PUBLIC_THUMBNAIL_BUCKET="thumbs",
+)
+class SyncThumbnailsTests(TestCase):
+    def test_stored_url_without_scheme(self):
+        video = Video.objects.create(title="Sweep", video_url="d123.cloudfront.net/Guard/sweep.mp4")
+        pages = [{"Contents": [{"Key": "thumbnails/Guard/sweep-320.jpg"}]}]
+        with mock.patch("bjj.management.commands.sync_thumbnails.get_client") as get_client:
+            get_client.return_value.get_paginator.return_value.paginate.return_value = pages
+            call_command("sync_thumbnails", stdout=StringIO())
+        video.refresh_from_db()
+        self.assertEqual(video.thumbnail_url, "https://thumbs.example.net/thumbnails/Guard/sweep-320.jpg")
+
+
+@skipUnless(shutil.which("ffmpeg"), "ffmpeg is not installed")
+class StoryboardTests(SimpleTestCase):
+    def test_failed_tile_repeats_nearest(self):
+        run = subprocess.run
+        failing_seek = thumbnails._vtt_time(3)
+
+        def flaky_run(args, **kwargs):
+            if "-ss" in args and args[args.index("-ss") + 1] == failing_seek:
+                raise subprocess.CalledProcessError(1, args)
+            return run(args, **kwargs)
+
+        with tempfile.TemporaryDirectory() as workdir:
+            source = os.path.join(workdir, "video.mp4")
+            sprite = os.path.join(workdir, "sprite.jpg")
+            run(
+                ["ffmpeg", "-loglevel", "error", "-f", "lavfi", "-i", "testsrc=duration=6:size=320x240", source],
+                check=True,
+            )
+            with mock.patch("subprocess.run", side_effect=flaky_run):
+                vtt = thumbnails.generate_storyboard(source, sprite, "sprite.jpg", duration=6)
+            self.assertGreater(os.path.getsize(sprite), 0)
+        self.assertEqual(vtt.count("sprite.jpg#xywh="), 3)
+
+
+class PostUploadJobTests(TestCase):
+    def test_file_jobs_wait_for_probe(self):
+        video = Video.objects.create(title="Sweep", video_url="d123.cloudfront.net/Guard/a.mp4")
+        jobs.enqueue_post_upload(video.pk)
+        self.assertCountEqual(Job.objects.values_list("kind", flat=True), ["probe", "index"])
+
+        fields = {"duration": 12.5, "faststart": True}
+        with mock.patch("bjj.jobs.get_client"), mock.patch("bjj.metadata.probe_video", return_value=fields):
+            self.assertTrue(jobs.run(jobs.claim("test")))
+
+        video.refresh_from_db()
+        self.assertEqual(video.duration, 12.5)
+        queued = Job.objects.filter(status=Job.QUEUED).values_list("kind", "payload")
+        self.assertCountEqual(queued, [
+            ("index", {"video_id": video.pk}),
+            ("thumbnail", {"video_id": video.pk, "force": True}),
+            ("hls", {"video_id": video.pk, "force": True}),
+        ])
+
+
+@override_settings(CLOUDFRONT_DOMAIN="d123.cloudfront.net")
+class UploadDedupTests(TestCase):
+    data = b"sweep" * 1000
+
+    def upload(self, title, filename):
+        form = VideoUploadForm({"title": title}, {"file": SimpleUploadedFile(filename, self.data)})
+        self.assertTrue(form.is_valid(), form.errors)
+        return form.save()
+
+    def setUp(self):
+        patcher = mock.patch("bjj.uploads.get_client")
+        self.s3 = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+        self.first = self.upload("Sweep", "sweep.mp4")
+
+    def test_hash_stored_for_server_uploads(self):
+        hasher = uploads.BlockHasher()
+        hasher.update(self.data)
+        self.assertEqual(self.first.content_hash, hasher.hexdigest())
+        self.assertEqual(self.first.video_url, "d123.cloudfront.net/Uncategorized/sweep.mp4")
+
+    def test_same_file_for_another_video_is_refused(self):
+        with self.assertRaisesMessage(forms.ValidationError, "already uploaded as “Sweep”"):
+            self.upload("Other title", "copy.mp4")
+        self.assertEqual(self.s3.upload_fileobj.call_count, 1)
+        self.first.refresh_from_db()
+        self.assertEqual(self.first.title, "Sweep")
+        self.assertEqual(Video.objects.count(), 1)
+
+    def test_same_file_at_same_key_is_not_sent_again(self):
+        Job.objects.all().delete()
+        video = self.upload("Renamed", "sweep.mp4")
+        self.assertEqual(video.pk, self.first.pk)
+        self.assertEqual(video.title, "Renamed")
+        self.assertEqual(self.s3.upload_fileobj.call_count, 1)
+        self.assertEqual(list(Job.objects.values_list("kind", flat=True)), ["index"])
+
+    def test_existing_upload(self):
+        digest = self.first.content_hash
+        self.assertEqual(uploads.existing_upload(digest, "Uncategorized/sweep.mp4"), self.first)
+        self.assertIsNone(uploads.existing_upload("", "Uncategorized/sweep.mp4"))
+        with self.assertRaises(uploads.DuplicateUpload):
+            uploads.existing_upload(digest, "Guard/X/sweep.mp4")
+
+
+@override_settings(CLOUDFRONT_DOMAIN="d123.cloudfront.net")
+class ClaimedHashTests(TestCase):
+    claimed = "a" * 64
+
+    def setUp(self):
+        self.video = uploads.create_video(Video(title="Sweep"), "Guard/a.mp4", claimed_hash=self.claimed)
+
+    def run_probe(self, object_hash):
+        fields = {"duration": 3.0, "faststart": True}
+        with mock.patch("bjj.jobs.get_client"), \
+                mock.patch("bjj.uploads.object_hash", return_value=object_hash), \
+                mock.patch("bjj.metadata.probe_video", return_value=fields):
+            self.assertTrue(jobs.run(jobs.claim("test")))
+        self.video.refresh_from_db()
+
+    def test_not_trusted_before_the_probe(self):
+        self.assertEqual(self.video.content_hash, "")
+        self.assertIsNone(uploads.existing_upload(self.claimed, "Other/b.mp4"))
+
+    def test_stored_when_object_matches(self):
+        self.run_probe(self.claimed)
+        self.assertEqual(self.video.content_hash, self.claimed)
+
+    def test_dropped_when_object_differs(self):
+        self.run_probe("b" * 64)
+        self.assertEqual(self.video.content_hash, "")
@@ -0,0 +1,588 @@
+"""Thumbnail generation for videos stored in the private S3 bucket.
+
+``generate_thumbnail`` does the per-video work (fetch, ffmpeg, upload)
+inside its own temporary directory, so nothing is left behind when a step
+fails. One frame is grabbed and rendered at every width in
+``BJJ_THUMBNAIL_WIDTHS`` and every format in ``BJJ_THUMBNAIL_FORMATS``
+(AVIF only when ffmpeg has an AV1 encoder), plus a tiny blurred JPEG that
+is stored inline on the video as a data URI placeholder.
+
+``generate_storyboard`` adds a tiled sprite sheet of frames across the
+whole video and a WebVTT file mapping time ranges to tiles
+(``#xywh=`` fragments), used for hover previews and scrubbing
+(``bjj/storyboard.js``) without touching the signed video stream. Every
+tile is its own input seek to one keyframe, so a streamed video is read in
+small ranges (the index and one keyframe per tile) rather than in full.
+
+Only the bytes needed for the frame are fetched. The default ``ranged``
+method walks the top-level MP4 boxes with small ranged GETs, fetches the
+``moov`` index and the head of the file, and lays them out in a sparse
+local file that ffmpeg can seek in; the head is doubled until the frame
+decodes. ``stream`` hands ffmpeg a presigned URL and lets its HTTP reader
+seek (input seeking, ``-ss`` before ``-i``). ``download`` fetches the whole
+object, as the command used to, and is kept for comparison
+(``generate_thumbnails --compare``).
+
+``ThumbnailPipeline`` runs ``generate_thumbnail`` for many videos on a
+thread pool: S3 transfers and ffmpeg (a subprocess) release the GIL, so
+fetches, encodes and uploads of different videos overlap. Database writes
+stay on the calling thread.
+
+Progress is checkpointed to a JSON file after every video, so an
+interrupted run resumes where it stopped.
+"""
+
+import base64
+import functools
+import json
+import math
+import os
+import re
+import shutil
+import struct
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import quote, urlparse
+
+from django.conf import settings
+
+from .models import THUMBNAIL_TYPES
+
+
+def video_s3_key(video):
+    """Return the video's key in the private bucket, or None.
+
+    ``video_url`` is stored as ``<CLOUDFRONT_DOMAIN>/<key>``, without a
+    scheme (see ``bjj.uploads.create_video``); full URLs are accepted too.
+    """
+    url = video.video_url or ""
+    domain = getattr(settings, "CLOUDFRONT_DOMAIN", "")
+    if domain and f"{domain}/" in url:
+        key = video.object_key
+    else:
+        # Without a scheme urlparse would take the host for part of the path
+        key = urlparse(url if "://" in url else f"//{url}").path
+    return key.split("?")[0].lstrip("/") or None
+
+
+DEFAULT_WIDTHS = (320, 640, 960)
+DEFAULT_FORMATS = ("avif", "webp", "jpg")
+
+_ENCODER_ARGS = {
+    "avif": ["-c:v", "libaom-av1", "-still-picture", "1", "-crf", "32", "-cpu-used", "6"],
+    "webp": ["-c:v", "libwebp", "-quality", "75"],
+    "jpg": ["-c:v", "mjpeg", "-q:v", "4"],
+}
+
+PLACEHOLDER_WIDTH = 24
+
+STORYBOARD_TILE = (160, 90)
+STORYBOARD_COLUMNS = 10
+STORYBOARD_MAX_TILES = 100
+STORYBOARD_MIN_INTERVAL = 2  # seconds between tiles on short videos
+STORYBOARD_WORKERS = 8  # tiles extracted at once
+
+_DURATION = re.compile(rb"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)")
+
+
+def variant_key_for(s3_key, width, fmt):
+    return f"thumbnails/{os.path.splitext(s3_key)[0]}-{width}.{fmt}"
+
+
+def storyboard_keys_for(s3_key):
+    base = os.path.splitext(s3_key)[0]
+    return f"thumbnails/{base}-storyboard.jpg", f"thumbnails/{base}-storyboard.vtt"
+
+
+def public_url_for(thumbnail_key):
+    return f"https://{settings.CLOUDFRONT_PUBLIC_DOMAIN}/{thumbnail_key}"
+
+
+@functools.lru_cache(maxsize=None)
+def _has_av1_encoder():
+    encoders = subprocess.run(
+        ["ffmpeg", "-hide_banner", "-encoders"], capture_output=True, check=False
+    ).stdout
+    return b"libaom-av1" in encoders
+
+
+def thumbnail_formats():
+    formats = getattr(settings, "BJJ_THUMBNAIL_FORMATS", DEFAULT_FORMATS)
+    return [fmt for fmt in formats if fmt != "avif" or _has_av1_encoder()]
+
+
+def thumbnail_widths():
+    return sorted(getattr(settings, "BJJ_THUMBNAIL_WIDTHS", DEFAULT_WIDTHS))
+
+
+METHODS = ("ranged", "stream", "download")
+
+HEAD_BYTES = 2 * 1024 * 1024       # first ranged read; doubled until the frame decodes
+MAX_HEAD_BYTES = 64 * 1024 * 1024  # beyond this, fall back to streaming
+
+_BYTES_READ = re.compile(rb"Statistics: (\d+) bytes read")
+
+
+class ThumbnailError(Exception):
+    pass
+
+
+def thumbnail_seek(duration=None):
+    """Timestamp of the thumbnail frame: 1s in, or halfway through shorter clips.
+
+    ``duration`` comes from the probed metadata (``bjj.metadata``) when known.
+    """
+    seconds = 1.0 if not duration or duration >= 2 else duration / 2
+    return _vtt_time(seconds)
+
+
+def extract_frame(source, frame_path, seek="00:00:01.000"):
+    """Write the frame of ``source`` (path or URL) at ``seek`` to ``frame_path`` (PNG).
+
+    The frame is scaled down to the largest thumbnail width. Returns the
+    number of bytes ffmpeg read from ``source`` when it reports it.
+    """
+    max_width = thumbnail_widths()[-1]
+    result = subprocess.run(
+        [
+            "ffmpeg",
+            "-loglevel", "verbose",  # for the "bytes read" statistics
+            "-y",
+            "-ss", seek,  # input seeking: jump to the frame instead of decoding up to it
+            "-i", source,
+            "-frames:v", "1",
+            "-vf", f"scale='min({max_width},iw)':-2",  # never upscale, keep aspect ratio
+            frame_path,
+        ],
+        check=True,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+    )
+    if not os.path.exists(frame_path) or not os.path.getsize(frame_path):
+        raise ThumbnailError("ffmpeg produced no frame")
+    counts = _BYTES_READ.findall(result.stderr)
+    return sum(int(n) for n in counts) if counts else None
+
+
+def _png_width(path):
+    with open(path, "rb") as f:
+        header = f.read(24)
+    return struct.unpack(">I", header[16:20])[0]  # IHDR width
+
+
+def render_variants(frame_path, workdir):
+    """Render every width/format of ``frame_path`` in one ffmpeg run.
+
+    Returns ``(variants, placeholder)``: ``[(fmt, width, path)]`` and a
+    ``data:`` URI of the blurred placeholder.
+    """
+    frame_width = _png_width(frame_path)
+    widths = [width for width in thumbnail_widths() if width <= frame_width] or [frame_width]
+    variants = [
+        (fmt, width, os.path.join(workdir, f"{width}.{fmt}"))
+        for fmt in thumbnail_formats()
+        for width in widths
+    ]
+    placeholder_path = os.path.join(workdir, "placeholder.jpg")
+
+    branches = [f"[s{i}]scale={width}:-2[v{i}]" for i, (_, width, _) in enumerate(variants)]
+    branches.append(f"[s{len(variants)}]scale={PLACEHOLDER_WIDTH}:-2,gblur=sigma=1[p]")
+    split = "".join(f"[s{i}]" for i in range(len(variants) + 1))
+    args = [
+        "ffmpeg", "-loglevel", "error", "-y", "-i", frame_path,
+        "-filter_complex", f"[0:v]split={len(variants) + 1}{split};" + ";".join(branches),
+    ]
+    for i, (fmt, _, path) in enumerate(variants):
+        args += ["-map", f"[v{i}]", *_ENCODER_ARGS[fmt], "-frames:v", "1", path]
+    args += ["-map", "[p]", "-c:v", "mjpeg", "-q:v", "12", "-frames:v", "1", placeholder_path]
+    subprocess.run(args, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    with open(placeholder_path, "rb") as f:
+        placeholder = "data:image/jpeg;base64," + base64.b64encode(f.read()).decode("ascii")
+    return variants, placeholder
+
+
+def probe_duration(source):
+    """Return the duration of ``source`` (path or URL) in seconds, from the container header."""
+    result = subprocess.run(["ffmpeg", "-hide_banner", "-i", source], capture_output=True, check=False)
+    match = _DURATION.search(result.stderr)
+    if not match:
+        raise ThumbnailError("could not read the video duration")
+    hours, minutes, seconds = match.groups()
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+
+def _vtt_time(seconds):
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    return f"{int(hours):02d}:{int(minutes):02d}:{seconds:06.3f}"
+
+
+def _storyboard_tile(source, tile_path, seconds):
+    """Write the keyframe of ``source`` nearest ``seconds`` as one storyboard tile; False if none."""
+    width, height = STORYBOARD_TILE
+    keyframe_path = f"{os.path.splitext(tile_path)[0]}.mp4"
+    # Input seeking plus stream copy of one packet: a URL source is read with
+    # a ranged request for that keyframe only. Decoding straight from the
+    # source would read on until the decoder's reorder delay is filled.
+    try:
+        subprocess.run(
+            [
+                "ffmpeg", "-loglevel", "error", "-y",
+                "-ss", _vtt_time(seconds),
+                "-i", source,
+                "-map", "0:v:0", "-c", "copy", "-frames:v", "1", "-avoid_negative_ts", "make_zero",
+                keyframe_path,
+            ],
+            check=True,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        subprocess.run(
+            [
+                "ffmpeg", "-loglevel", "error", "-y",
+                "-i", keyframe_path,
+                "-frames:v", "1",
+                "-vf", (
+                    f"scale={width}:{height}:force_original_aspect_ratio=decrease,"
+                    f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,format=yuvj420p"
+                ),
+                "-q:v", "5",
+                tile_path,
+            ],
+            check=True,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+    except subprocess.CalledProcessError:
+        return False  # seek past the end, undecodable keyframe: use the nearest tile
+    return os.path.exists(tile_path) and os.path.getsize(tile_path) > 0
+
+
+def generate_storyboard(source, sprite_path, sprite_name, duration=None):
+    """Tile frames from across ``source`` into ``sprite_path``; return the WebVTT text.
+
+    Each tile is the keyframe nearest the middle of its time range, fetched
+    with its own seek (``STORYBOARD_WORKERS`` at a time), so only the index
+    and one keyframe per tile are read. ``sprite_name`` is how the VTT cues
+    refer to the sprite (relative to the VTT file). ``duration`` is probed
+    from ``source`` unless given.
+    """
+    duration = duration or probe_duration(source)
+    interval = max(STORYBOARD_MIN_INTERVAL, duration / STORYBOARD_MAX_TILES)
+    count = max(1, math.ceil(duration / interval))
+    columns = min(count, STORYBOARD_COLUMNS)
+    rows = math.ceil(count / columns)
+    width, height = STORYBOARD_TILE
+    ranges = [(index * interval, min(duration, (index + 1) * interval)) for index in range(count)]
+
+    with tempfile.TemporaryDirectory(prefix="bjj-storyboard-") as tiledir:
+        tile_paths = [os.path.join(tiledir, f"{index:03d}.jpg") for index in range(count)]
+        with ThreadPoolExecutor(max_workers=STORYBOARD_WORKERS, thread_name_prefix="tile") as pool:
+            middles = [(start + end) / 2 for start, end in ranges]
+            found = list(pool.map(_storyboard_tile, [source] * count, tile_paths, middles))
+        if not any(found):
+            raise ThumbnailError("ffmpeg produced no storyboard frame")
+        # A keyframe that fails to decode: repeat the nearest tile
+        for index, ok in enumerate(found):
+            if not ok:
+                nearest = min((i for i, ok in enumerate(found) if ok), key=lambda i: abs(i - index))
+                shutil.copyfile(tile_paths[nearest], tile_paths[index])
+
+        subprocess.run(
+            [
+                "ffmpeg", "-loglevel", "error", "-y",
+                "-i", os.path.join(tiledir, "%03d.jpg"),
+                "-vf", f"tile={columns}x{rows}",
+                "-frames:v", "1", "-q:v", "5",
+                sprite_path,
+            ],
+            check=True,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+
+    cues = ["WEBVTT", ""]
+    for index, (start, end) in enumerate(ranges):
+        x, y = (index % columns) * width, (index // columns) * height
+        cues += [
+            f"{_vtt_time(start)} --> {_vtt_time(end)}",
+            f"{quote(sprite_name)}#xywh={x},{y},{width},{height}",
+            "",
+        ]
+    return "\n".join(cues)
+
+
+class RangedObject:
+    """Random access to an S3 object through ranged GETs, counting bytes fetched."""
+
+    def __init__(self, s3_client, bucket, key, head_bytes=HEAD_BYTES):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.key = key
+        self.bytes_read = 0
+        self.size = None
+        self.head = b""
+        self.extend_head(head_bytes)
+
+    def _get(self, start, end):
+        response = self.s3_client.get_object(Bucket=self.bucket, Key=self.key, Range=f"bytes={start}-{end}")
+        data = response["Body"].read()
+        self.size = int(response["ContentRange"].rsplit("/", 1)[1])
+        self.bytes_read += len(data)
+        return data
+
+    def extend_head(self, length):
+        """Grow the locally held prefix of the object to ``length`` bytes."""
+        if self.size is not None:
+            length = min(length, self.size)
+        if length > len(self.head):
+            self.head += self._get(len(self.head), length - 1)
+
+    def read(self, start, length):
+        if start + length <= len(self.head):
+            return self.head[start:start + length]
+        return self._get(start, min(start + length, self.size) - 1)
+
+
+def top_level_boxes(obj):
+    """Yield ``(type, offset, size)`` for the top-level boxes of an MP4 ``RangedObject``."""
+    offset = 0
+    while offset + 8 <= obj.size:
+        header = obj.read(offset, 16)
+        box_size, box_type = struct.unpack(">I4s", header[:8])
+        if box_size == 1:  # 64-bit size follows the type
+            box_size = struct.unpack(">Q", header[8:16])[0]
+        elif box_size == 0:  # box runs to the end of the file
+            box_size = obj.size - offset
+        if box_size < 8:
+            raise ThumbnailError(f"corrupt MP4 box at offset {offset}")
+        yield box_type.decode("latin-1"), offset, box_size
+        offset += box_size
+
+
+def _presigned_url(s3_client, s3_key):
+    return s3_client.generate_presigned_url(
+        "get_object",
+        Params={"Bucket": settings.AWS_PRIVATE_VIDEO_BUCKET, "Key": s3_key},
+        ExpiresIn=600,
+    )
+
+
+def _extract_ranged(s3_client, s3_key, frame_path, workdir, seek):
+    obj = RangedObject(s3_client, settings.AWS_PRIVATE_VIDEO_BUCKET, s3_key)
+    moov = next((box for box in top_level_boxes(obj) if box[0] == "moov"), None)
+    if moov is None:
+        raise ThumbnailError("no moov box")
+    _, moov_offset, moov_size = moov
+    moov_data = None
+    if moov_offset + moov_size > len(obj.head):  # not "faststart": index sits after the media
+        moov_data = obj.read(moov_offset, moov_size)
+
+    partial_path = os.path.join(workdir, "partial.mp4")
+    while True:
+        # Sparse file: real bytes where we fetched them, holes everywhere else
+        with open(partial_path, "wb") as f:
+            f.truncate(obj.size)
+            f.write(obj.head)
+            if moov_data is not None:
+                f.seek(moov_offset)
+                f.write(moov_data)
+        try:
+            extract_frame(partial_path, frame_path, seek)
+            return obj.bytes_read
+        except (subprocess.CalledProcessError, ThumbnailError):
+            if len(obj.head) >= min(obj.size, MAX_HEAD_BYTES):
+                raise
+            obj.extend_head(len(obj.head) * 2)
+
+
+def extract_thumbnail(s3_client, s3_key, frame_path, workdir, method="ranged", seek="00:00:01.000"):
+    """Write the thumbnail frame for ``s3_key`` to ``frame_path``.
+
+    Returns the number of bytes transferred from S3 (None if unknown).
+    ``ranged`` falls back to ``stream`` when the file cannot be read in parts.
+    """
+    if method == "download":
+        video_path = os.path.join(workdir, "video.mp4")
+        s3_client.download_file(settings.AWS_PRIVATE_VIDEO_BUCKET, s3_key, video_path)
+        extract_frame(video_path, frame_path, seek)
+        return os.path.getsize(video_path)
+
+    if method == "ranged":
+        try:
+            return _extract_ranged(s3_client, s3_key, frame_path, workdir, seek)
+        except (subprocess.CalledProcessError, ThumbnailError):
+            pass  # cannot be read in parts (no moov box, frame too deep): stream it
+    streamed = extract_frame(_presigned_url(s3_client, s3_key), frame_path, seek)
+    return streamed if method == "stream" else None
+
+
+def _upload(s3_client, path, key, content_type):
+    s3_client.upload_file(
+        path,
+        settings.AWS_PUBLIC_THUMBNAIL_BUCKET,
+        key,
+        ExtraArgs={"ContentType": content_type, "ACL": "public-read"},
+    )
+    return public_url_for(key)
+
+
+def generate_thumbnail(s3_client, s3_key, method="ranged", storyboard=True, duration=None):
+    """Create and upload every thumbnail variant (and the storyboard) for ``s3_key``.
+
+    Returns the ``Video`` field values: ``thumbnail_url`` (smallest JPEG),
+    ``thumbnail_srcset``, ``thumbnail_placeholder`` and, with
+    ``storyboard``, ``storyboard_vtt_url``. ``duration`` (seconds, when
+    known) picks the frame of very short clips and spares probing it again.
+    """
+    fields = {}
+    with tempfile.TemporaryDirectory(prefix="bjj-thumb-") as workdir:
+        frame_path = os.path.join(workdir, "frame.png")
+        extract_thumbnail(s3_client, s3_key, frame_path, workdir, method, thumbnail_seek(duration))
+        variants, fields["thumbnail_placeholder"] = render_variants(frame_path, workdir)
+
+        srcset = {}
+        for fmt, width, path in variants:
+            url = _upload(s3_client, path, variant_key_for(s3_key, width, fmt), THUMBNAIL_TYPES[fmt])
+            srcset.setdefault(fmt, []).append([width, url])
+        fallback = srcset.get("jpg") or next(iter(srcset.values()))
+        fields["thumbnail_url"] = fallback[0][1]
+        fields["thumbnail_srcset"] = srcset
+
+        if storyboard:
+            # A full local copy exists only with method="download"
+            video_path = os.path.join(workdir, "video.mp4")
+            source = video_path if os.path.exists(video_path) else _presigned_url(s3_client, s3_key)
+            sprite_key, vtt_key = storyboard_keys_for(s3_key)
+            sprite_path = os.path.join(workdir, "storyboard.jpg")
+            vtt_path = os.path.join(workdir, "storyboard.vtt")
+            vtt = generate_storyboard(source, sprite_path, os.path.basename(sprite_key), duration)
+            with open(vtt_path, "w") as f:
+                f.write(vtt)
+            _upload(s3_client, sprite_path, sprite_key, "image/jpeg")
+            fields["storyboard_vtt_url"] = _upload(s3_client, vtt_path, vtt_key, "text/vtt")
+
+    return fields
+
+
+def compare_methods(s3_client, s3_key, methods=METHODS):
+    """Extract the frame with each method; return ``{method: (bytes, seconds)}``.
+
+    Nothing is uploaded. ``bytes`` is None when ffmpeg does not report it or
+    the method failed (then ``seconds`` is None too).
+    """
+    results = {}
+    for method in methods:
+        with tempfile.TemporaryDirectory(prefix="bjj-thumb-") as workdir:
+            started = time.monotonic()
+            try:
+                fetched = extract_thumbnail(
+                    s3_client, s3_key, os.path.join(workdir, "frame.png"), workdir, method
+                )
+            except Exception:  # one failing method must not end the comparison
+                results[method] = (None, None)
+                continue
+            results[method] = (fetched, time.monotonic() - started)
+    return results
+
+
+class Checkpoint:
+    """Set of finished video ids persisted as JSON (written atomically)."""
+
+    def __init__(self, path):
+        self.path = path
+        self.done = set()
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.done = set(json.load(f).get("done", []))
+
+    def add(self, video_id):
+        self.done.add(video_id)
+        if not self.path:
+            return
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"done": sorted(self.done)}, f)
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        self.done.clear()
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class ThumbnailPipeline:
+    """Generate thumbnails for many videos concurrently.
+
+    ``report(message)`` receives one progress line per finished video.
+    """
+
+    def __init__(self, s3_client, workers=4, force=False, checkpoint=None, report=print,
+                 method="ranged", storyboard=True):
+        self.s3_client = s3_client
+        self.workers = max(1, workers)
+        self.force = force
+        self.method = method
+        self.storyboard = storyboard
+        self.checkpoint = checkpoint or Checkpoint(None)
+        self.report = report
+        self.stats = {"generated": 0, "skipped": 0, "failed": 0}
+
+    def _pending(self, videos):
+        for video in videos:
+            has_thumbnails = (
+                video.thumbnail_url and video.thumbnail_srcset
+                and (video.storyboard_vtt_url or not self.storyboard)
+            )
+            if video.pk in self.checkpoint.done or (has_thumbnails and not self.force):
+                self.stats["skipped"] += 1
+                continue
+            s3_key = video_s3_key(video)
+            if not s3_key:
+                self.report(f"❌ Skipping {video.title}: no valid S3 key")
+                self.stats["failed"] += 1
+                continue
+            yield video, s3_key
+
+    def run(self, videos):
+        """Process ``videos`` and return the stats dict (plus elapsed seconds)."""
+        pending = list(self._pending(videos))
+        total = len(pending)
+        started = time.monotonic()
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="thumb") as pool:
+            futures = {
+                pool.submit(
+                    generate_thumbnail, self.s3_client, s3_key, self.method, self.storyboard, video.duration
+                ): video
+                for video, s3_key in pending
+            }
+            for finished, future in enumerate(as_completed(futures), start=1):
+                video = futures[future]
+                try:
+                    fields = future.result()
+                except Exception as e:
+                    self.stats["failed"] += 1
+                    self.report(f"❌ Failed {video.title}: {e}")
+                    continue
+
+                for name, value in fields.items():
+                    setattr(video, name, value)
+                video.save(update_fields=list(fields))
+                self.checkpoint.add(video.pk)
+                self.stats["generated"] += 1
+
+                elapsed = time.monotonic() - started
+                rate = finished / elapsed if elapsed else 0.0
+                eta = (total - finished) / rate if rate else 0.0
+                self.report(
+                    f"✅ [{finished}/{total}] {video.title} "
+                    f"({rate:.2f} videos/s, ETA {eta:.0f}s)"
+                )
+
+        self.stats["elapsed"] = time.monotonic() - started
+        self.stats["processed"] = total
+        return self.stats
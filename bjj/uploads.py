@@ -0,0 +1,267 @@
+"""Video uploads to the private S3 bucket.
+
+Browsers upload straight to S3 with presigned multipart URLs, so web workers
+never handle video bytes:
+
+1. ``start_upload`` creates the multipart upload for the key built from the
+   video's metadata (``video_key``) and picks a part size.
+2. ``sign_parts`` presigns ``upload_part`` URLs, a batch at a time; the
+   browser PUTs the parts in parallel and keeps each response's ``ETag``.
+3. ``complete_upload`` assembles the parts and ``create_video`` saves the row;
+   ``abort_upload`` discards the parts of a cancelled upload.
+
+The bucket's CORS rules must allow ``PUT`` from the site and expose the
+``ETag`` header. ``upload_file`` is the server-side fallback used by
+``VideoUploadForm`` when the browser cannot upload directly; it streams the
+file with the multipart settings of ``transfer_config``.
+
+Either way, the new video's thumbnails and search entry are then produced
+by background jobs (``bjj.jobs.enqueue_post_upload``).
+
+Uploads are deduplicated by content: the file's ``BlockHasher`` digest is
+computed before any byte goes to S3 (by the browser, or by the server in a
+first pass over the fallback upload) and looked up with ``existing_upload``.
+A file already stored under another key is refused (``DuplicateUpload``),
+never copied and never allowed to change the other video; the same file
+sent again to its own key is not transferred again. Only hashes computed on
+the server are trusted: a browser's hash is stored by the ``probe`` job once
+the uploaded object matches it.
+"""
+
+import hashlib
+import math
+import re
+
+from django.conf import settings
+from django.db import transaction
+
+from jiujitsuteria.utils.aws import get_client
+from . import jobs
+from .models import Video
+from .thumbnails import video_s3_key
+
+MB = 1024 * 1024
+
+EXTRA_ARGS = {
+    "ContentType": "video/mp4",
+    "CacheControl": "max-age=31536000, public",
+}
+
+PART_SIZE = getattr(settings, "BJJ_UPLOAD_PART_SIZE", 16 * MB)
+MIN_PART_SIZE = 5 * MB  # S3 minimum, except for the last part
+MAX_PARTS = 10000       # S3 maximum per upload
+SIGN_BATCH = 100        # most part URLs presigned per request
+URL_EXPIRES = 3600
+HASH_BLOCK_SIZE = 8 * MB  # fixed: upload.js hashes the same blocks
+
+
+class UploadError(Exception):
+    pass
+
+
+class DuplicateUpload(UploadError):
+    """The uploaded file is already stored for another video."""
+
+    def __init__(self, video):
+        self.video = video
+        super().__init__(f"This file was already uploaded as “{video.title}”.")
+
+
+def bucket():
+    return settings.AWS_PRIVATE_VIDEO_BUCKET
+
+
+def transfer_config():
+    from boto3.s3.transfer import TransferConfig
+
+    return TransferConfig(
+        multipart_threshold=PART_SIZE,
+        multipart_chunksize=PART_SIZE,
+        max_concurrency=getattr(settings, "BJJ_UPLOAD_CONCURRENCY", 8),
+    )
+
+
+def sanitize_path(path: str) -> str:
+    """Make a path S3-safe (alphanumeric, _, ., -, / allowed)."""
+    return re.sub(r"[^a-zA-Z0-9/_\.-]", "_", path)
+
+
+def video_key(video, filename):
+    """Build path: Category/SubCategory/filename"""
+    if video.guard:
+        key = f"Guard/{video.guard.name}/{filename}"
+    elif video.position:
+        key = f"Position/{video.position.name}/{filename}"
+    elif video.technique:
+        key = f"Technique/{video.technique.name}/{filename}"
+    else:
+        key = f"Uncategorized/{filename}"
+    return sanitize_path(key)
+
+
+class BlockHasher:
+    """SHA-256 of the SHA-256 digests of consecutive ``HASH_BLOCK_SIZE`` blocks.
+
+    Browsers can compute it a block at a time (WebCrypto has no streaming
+    digest), and unlike S3's multipart ETag it doesn't depend on part sizes.
+    """
+
+    def __init__(self):
+        self._digests = hashlib.sha256()
+        self._block = hashlib.sha256()
+        self._filled = 0
+        self._blocks = 0
+
+    def update(self, data):
+        view = memoryview(data)
+        while view:
+            take = min(len(view), HASH_BLOCK_SIZE - self._filled)
+            self._block.update(view[:take])
+            self._filled += take
+            view = view[take:]
+            if self._filled == HASH_BLOCK_SIZE:
+                self._digests.update(self._block.digest())
+                self._block = hashlib.sha256()
+                self._filled = 0
+                self._blocks += 1
+
+    def hexdigest(self):
+        digests = self._digests.copy()
+        if self._filled or not self._blocks:
+            digests.update(self._block.digest())
+        return digests.hexdigest()
+
+
+def content_hash(fileobj):
+    """``BlockHasher`` digest of an uploaded file, read in blocks and rewound."""
+    hasher = BlockHasher()
+    for chunk in fileobj.chunks(HASH_BLOCK_SIZE):
+        hasher.update(chunk)
+    fileobj.seek(0)
+    return hasher.hexdigest()
+
+
+def object_hash(s3_client, key):
+    """``BlockHasher`` digest of an object in the private bucket (reads all of it)."""
+    hasher = BlockHasher()
+    body = s3_client.get_object(Bucket=bucket(), Key=key)["Body"]
+    for chunk in body.iter_chunks(HASH_BLOCK_SIZE):
+        hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def existing_upload(digest, key):
+    """The video whose file at ``key`` already has this content hash, or None.
+
+    Raises ``DuplicateUpload`` when the file is stored under another key.
+    """
+    if not digest:
+        return None
+    video = Video.objects.filter(content_hash=digest).order_by("id").first()
+    if video is None:
+        return None
+    if video_s3_key(video) != key:
+        raise DuplicateUpload(video)
+    return video
+
+
+def create_video(video, key, tags=None, digest="", claimed_hash="", replaced=True):
+    """Save or update the DB entry for an uploaded key (no duplicates) and queue its processing.
+
+    ``digest`` is the file's content hash computed on the server. A
+    ``claimed_hash`` computed by the browser is handed to the ``probe`` job,
+    which stores it if the object matches. ``replaced=False`` means the file
+    at ``key`` was kept (``existing_upload``): only the details change.
+    """
+    cloudfront_domain = getattr(settings, "CLOUDFRONT_DOMAIN", "")
+    if not cloudfront_domain:
+        raise UploadError("CloudFront domain is not configured in settings.")
+
+    fields = {
+        "title": video.title,
+        "guard": video.guard,
+        "position": video.position,
+        "technique": video.technique,
+    }
+    if replaced:
+        fields["content_hash"] = digest  # a claimed hash is stored once verified
+    with transaction.atomic():
+        # Use CloudFront URL (clean, no ?v=)
+        saved, created = Video.objects.update_or_create(
+            video_url=f"{cloudfront_domain}/{key}",
+            defaults=fields,
+        )
+        if tags is not None:
+            saved.tags.set(tags)
+        if replaced:
+            jobs.enqueue_post_upload(saved.pk, claimed_hash="" if digest else claimed_hash)
+        else:
+            jobs.enqueue("index", video_id=saved.pk)  # new title and tags
+    return saved
+
+
+def upload_file(fileobj, key):
+    """Stream an uploaded file to S3 from the server (multipart, parallel parts)."""
+    try:
+        get_client("s3").upload_fileobj(fileobj, bucket(), key, ExtraArgs=EXTRA_ARGS, Config=transfer_config())
+    except Exception as e:
+        raise UploadError(f"Failed to upload video to S3: {e}") from e
+
+
+def part_size_for(size):
+    """Smallest part size from ``PART_SIZE`` up (whole MBs) that fits ``size`` in MAX_PARTS."""
+    needed = math.ceil(size / MAX_PARTS / MB) * MB
+    return max(PART_SIZE, needed, MIN_PART_SIZE)
+
+
+def start_upload(key, size):
+    """Create a multipart upload; return its id, part size and part count."""
+    part_size = part_size_for(size)
+    try:
+        upload = get_client("s3").create_multipart_upload(Bucket=bucket(), Key=key, **EXTRA_ARGS)
+    except Exception as e:
+        raise UploadError(f"Failed to start upload: {e}") from e
+    return {
+        "upload_id": upload["UploadId"],
+        "part_size": part_size,
+        "parts": max(1, math.ceil(size / part_size)),
+    }
+
+
+def sign_parts(key, upload_id, part_numbers):
+    """Presigned ``upload_part`` URLs, keyed by part number."""
+    part_numbers = [int(n) for n in part_numbers][:SIGN_BATCH]
+    if any(not 1 <= n <= MAX_PARTS for n in part_numbers):
+        raise UploadError("Part numbers must be between 1 and 10000.")
+    s3 = get_client("s3")
+    return {
+        n: s3.generate_presigned_url(
+            "upload_part",
+            Params={"Bucket": bucket(), "Key": key, "UploadId": upload_id, "PartNumber": n},
+            ExpiresIn=URL_EXPIRES,
+        )
+        for n in part_numbers
+    }
+
+
+def complete_upload(key, upload_id, parts):
+    """Assemble uploaded parts (``[{"PartNumber": n, "ETag": etag}, ...]``)."""
+    parts = sorted(
+        ({"PartNumber": int(p["PartNumber"]), "ETag": str(p["ETag"])} for p in parts),
+        key=lambda p: p["PartNumber"],
+    )
+    if not parts:
+        raise UploadError("No parts were uploaded.")
+    try:
+        get_client("s3").complete_multipart_upload(
+            Bucket=bucket(), Key=key, UploadId=upload_id, MultipartUpload={"Parts": parts}
+        )
+    except Exception as e:
+        raise UploadError(f"Failed to complete upload: {e}") from e
+
+
+def abort_upload(key, upload_id):
+    try:
+        get_client("s3").abort_multipart_upload(Bucket=bucket(), Key=key, UploadId=upload_id)
+    except Exception as e:
+        raise UploadError(f"Failed to abort upload: {e}") from e
@@ -12,11 +12,17 @@ urlpatterns = [
 
     # Tag search and views
     path('search/', views.tag_search, name='tag_search'),
+    path('search/videos/', views.video_search, name='video_search'),
     path('tag/<int:tag_id>/', views.videos_by_tag, name='videos_by_tag'),
 
     # Video detail
     path('video/<int:video_id>/', views.video_detail, name='video_detail'),
+    path('video/<int:video_id>/hls/<path:name>', views.video_playlist, name='video_playlist'),
 
     # Video upload (staff only)
     path('upload/', views.upload_video, name='upload'),
+    path('upload/start/', views.upload_start, name='upload_start'),
+    path('upload/sign/', views.upload_sign, name='upload_sign'),
+    path('upload/complete/', views.upload_complete, name='upload_complete'),
+    path('upload/abort/', views.upload_abort, name='upload_abort'),
 ]
@@ -0,0 +1,41 @@
+"""Cache-backed version counters for invalidating derived data across processes.
+
+In-process structures (tag index, tag matcher, ...) remember the version they
+were built from and rebuild when it changes. Versions live in the default
+Django cache, so every worker sees a bump only if that cache is shared
+(see CACHES in settings), and concurrent bumps are only all counted if its
+``incr`` is atomic: Redis is, the database cache is not.
+"""
+
+import time
+
+from django.core.cache import cache
+
+
+def _key(name):
+    return f"bjj:version:{name}"
+
+
+def _fresh_version():
+    # Millisecond clock: a version recreated after eviction never collides
+    # with one an older process may still remember.
+    return int(time.time() * 1000)
+
+
+def get_version(name):
+    """Return the current version for ``name``, initialising it if missing."""
+    version = cache.get(_key(name))
+    if version is None:
+        cache.add(_key(name), _fresh_version(), timeout=None)
+        version = cache.get(_key(name))
+    return version
+
+
+def bump_version(name):
+    """Invalidate everything derived from ``name`` and return the new version."""
+    try:
+        return cache.incr(_key(name))
+    except ValueError:
+        version = _fresh_version()
+        cache.set(_key(name), version, timeout=None)
+        return version
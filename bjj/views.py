@@ -1,102 +1,258 @@
 """Views for Brazilian Jiu-Jitsu (BJJ) video management and display.
 Includes video upload, listing, categorization, and searching by tags."""
 
-import re
+import json
+import posixpath
+from functools import partial
+
+from django.conf import settings
+from django.http import Http404, HttpResponse, JsonResponse
 from django.shortcuts import render, get_object_or_404, redirect
+from django.urls import reverse
+from django.views.decorators.http import require_POST
 from django.contrib.auth.decorators import login_required, user_passes_test
+from django.core.exceptions import ValidationError
 from django.core.paginator import Paginator
-from django.db.models import Count, Q
+from django.db.models import Q
+from django.utils.cache import patch_cache_control
 
-from .forms import VideoUploadForm
-from .models import Video, Position, Technique, Guard, Tag
+from jiujitsuteria.utils.aws import get_client
+from . import hls, uploads
+from .caching import cache_timeout, cached_page, conditional_page, content_version
+from .counts import category_listing
+from .forms import VideoMetadataForm, VideoUploadForm
+from .models import CATEGORY_MODELS, Video, Tag
+from .pagination import PAGE_PARAMS, paginate
+from .search import search_video_ids
+from .tag_index import tag_index
+from .tag_matcher import STOPWORDS, SYNONYMS, tag_matcher  # noqa: F401  (re-exported)
 
 
 # Reusable map for category models
-MODEL_MAP = {
-    'position': Position,
-    'technique': Technique,
-    'guard': Guard,
-}
+MODEL_MAP = CATEGORY_MODELS
 
 
 def staff_check(user):
     return user.is_staff
 
 
+def with_card_tags(videos):
+    """Prefetch tags for grid cards unless the denormalized ``tag_cache`` is used."""
+    if getattr(settings, "BJJ_DENORMALIZED_TAGS", True):
+        return videos
+    return videos.prefetch_related('tags')
+
+
+def render_video_page(request, template_name, context, videos):
+    """Render a video grid page with what its cached card fragment is keyed on."""
+    context = {
+        **context,
+        "content_version": content_version(),
+        "cache_timeout": cache_timeout(),
+        "grid_key": ",".join(str(video.pk) for video in videos),
+    }
+    return render(request, template_name, context)
+
+
 @login_required
 @user_passes_test(staff_check)
-def upload_video(request):          # I need to fix this function
+def upload_video(request):
+    """Upload page; the form posts here only when the browser can't upload to S3 directly."""
     if request.method == "POST":
         form = VideoUploadForm(request.POST, request.FILES)
         if form.is_valid():
-            video = form.save(commit=False)
-            video.save()
-            # Redirect to homepage OR video detail page
-            # return redirect('bjj:index')
-            return redirect('bjj:video_detail', video_id=video.id)
+            try:
+                video = form.save()
+            except ValidationError as e:
+                form.add_error(None, e)
+            else:
+                return redirect('bjj:video_detail', video_id=video.id)
     else:
         form = VideoUploadForm()
     return render(request, 'bjj/upload_video.html', {'form': form})
 
 
+# -----------------------------
+# Direct-to-S3 multipart upload (see bjj.uploads)
+# -----------------------------
+UPLOADS_SESSION_KEY = "bjj_uploads"
+
+
+def _pending_upload(request):
+    """Key of a multipart upload this session started, or None."""
+    return request.session.get(UPLOADS_SESSION_KEY, {}).get(request.POST.get("upload_id", ""))
+
+
+def _end_upload(request):
+    request.session.get(UPLOADS_SESSION_KEY, {}).pop(request.POST["upload_id"], None)
+    request.session.modified = True
+
+
+@login_required
+@user_passes_test(staff_check)
+@require_POST
+def upload_start(request):
+    form = VideoMetadataForm(request.POST)
+    if not form.is_valid():
+        return JsonResponse({"errors": form.errors}, status=400)
+    key = form.key()
+    try:
+        existing = form.existing()
+    except uploads.DuplicateUpload as e:
+        return JsonResponse({
+            "error": str(e), "duplicate": True, "url": reverse('bjj:video_detail', args=[e.video.id]),
+        }, status=409)
+    if existing is not None:
+        # This file is already at this key: update its details, nothing to upload
+        try:
+            video = form.save(key, replaced=False)
+        except ValidationError as e:
+            return JsonResponse({"error": str(e)}, status=502)
+        return JsonResponse(
+            {"unchanged": True, "video_id": video.id, "url": reverse('bjj:video_detail', args=[video.id])}
+        )
+    try:
+        upload = uploads.start_upload(key, form.cleaned_data["size"])
+    except uploads.UploadError as e:
+        return JsonResponse({"error": str(e)}, status=502)
+    request.session.setdefault(UPLOADS_SESSION_KEY, {})[upload["upload_id"]] = key
+    request.session.modified = True
+    return JsonResponse({**upload, "sign_batch": uploads.SIGN_BATCH})
+
+
+@login_required
+@user_passes_test(staff_check)
+@require_POST
+def upload_sign(request):
+    key = _pending_upload(request)
+    if key is None:
+        return JsonResponse({"error": "Unknown upload."}, status=404)
+    try:
+        urls = uploads.sign_parts(key, request.POST["upload_id"], request.POST.getlist("part"))
+    except (ValueError, uploads.UploadError) as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    return JsonResponse({"urls": urls})
+
+
+@login_required
+@user_passes_test(staff_check)
+@require_POST
+def upload_complete(request):
+    key = _pending_upload(request)
+    if key is None:
+        return JsonResponse({"error": "Unknown upload."}, status=404)
+    form = VideoMetadataForm(request.POST)
+    if not form.is_valid() or form.key() != key:
+        return JsonResponse({"errors": form.errors or {"__all__": ["Metadata changed during upload."]}}, status=400)
+    try:
+        uploads.complete_upload(key, request.POST["upload_id"], json.loads(request.POST.get("parts", "[]")))
+        video = form.save(key)
+    except (ValueError, KeyError, TypeError) as e:
+        return JsonResponse({"error": f"Invalid parts: {e}"}, status=400)
+    except (uploads.UploadError, ValidationError) as e:
+        return JsonResponse({"error": str(e)}, status=502)
+    _end_upload(request)
+    return JsonResponse({"video_id": video.id, "url": reverse('bjj:video_detail', args=[video.id])})
+
+
+@login_required
+@user_passes_test(staff_check)
+@require_POST
+def upload_abort(request):
+    key = _pending_upload(request)
+    if key is None:
+        return JsonResponse({"error": "Unknown upload."}, status=404)
+    try:
+        uploads.abort_upload(key, request.POST["upload_id"])
+    except uploads.UploadError as e:
+        return JsonResponse({"error": str(e)}, status=502)
+    _end_upload(request)
+    return JsonResponse({"aborted": True})
+
+
+@cached_page
 def index(request):
+    # Cached listings, only fetched if the template actually uses them
     context = {
-        "positions": Position.objects.all(),
-        "techniques": Technique.objects.all(),
-        "guards": Guard.objects.all(),
-        "tags": Tag.objects.all(),
+        "positions": partial(category_listing, "position"),
+        "techniques": partial(category_listing, "technique"),
+        "guards": partial(category_listing, "guard"),
+        "tags": partial(category_listing, "tag"),
     }
     return render(request, "bjj/index.html", context)
 
 
+@cached_page
 def category_list(request, category_type):
     model = MODEL_MAP.get(category_type)
-    categories = (
-        model.objects.annotate(video_count=Count('video')).order_by('name')
-        if model else []
-    )
+    categories = category_listing(category_type) if model else []  # cached, counts precomputed
     return render(request, 'bjj/category_list.html', {
         'category_type': category_type,
         'categories': categories,
     })
 
 
+@conditional_page(lambda category_type, category_id: (MODEL_MAP.get(category_type), category_id))
+@cached_page(params=PAGE_PARAMS)
 def category_videos(request, category_type, category_id):
     model = MODEL_MAP.get(category_type)
     category = get_object_or_404(model, id=category_id)
-    videos = Video.objects.filter(**{category_type: category}).order_by('-id')
+    videos = with_card_tags(Video.objects.filter(**{category_type: category}).order_by('-id'))
 
-    paginator = Paginator(videos, 12)
-    page_obj = paginator.get_page(request.GET.get('page'))
+    page_obj = paginate(request, videos, count=category.video_count)
 
-    return render(request, 'bjj/category_videos.html', {
+    return render_video_page(request, 'bjj/category_videos.html', {
         'category': category,
         'videos': page_obj,
         'category_type': category_type,
-        'video_count': videos.count(),  # ✅ total count
-    })
+        'video_count': page_obj.total_count,  # ✅ total count (materialized)
+    }, page_obj)
 
 
+@conditional_page(lambda tag_id: (Tag, tag_id))
+@cached_page(params=PAGE_PARAMS)
 def videos_by_tag(request, tag_id):
     tag = get_object_or_404(Tag, id=tag_id)
-    videos = tag.videos.all().order_by('-id')
+    videos = with_card_tags(tag.videos.all().order_by('-id'))
 
-    paginator = Paginator(videos, 12)
-    page_obj = paginator.get_page(request.GET.get('page'))
+    page_obj = paginate(request, videos, count=tag.video_count)
 
-    return render(request, 'bjj/tag_search_results.html', {
+    return render_video_page(request, 'bjj/tag_search_results.html', {
         'query': tag.name,
         'tag': tag,
         'videos': page_obj,
-        'video_count': videos.count(),  # ✅ total count
-    })
+        'video_count': page_obj.total_count,  # ✅ total count (materialized)
+    }, page_obj)
 
 
+@conditional_page(lambda video_id: (Video, video_id), signed=True, expires_in=3600)
+@cached_page
 def video_detail(request, video_id):
     video = get_object_or_404(Video, id=video_id)
     return render(request, 'bjj/video_detail.html', {'video': video})
 
 
+def video_playlist(request, video_id, name):
+    """HLS playlist of a video with signed segment URLs (see bjj.hls)."""
+    master_key = Video.objects.filter(pk=video_id).values_list('hls_playlist_key', flat=True).first()
+    if not master_key or not hls.PLAYLIST_NAME.fullmatch(name):
+        raise Http404("No such playlist")
+    prefix = posixpath.dirname(master_key) + "/"
+    s3 = get_client("s3")
+    try:
+        text = hls.playlist_text(s3, prefix + name)
+    except s3.exceptions.NoSuchKey:
+        raise Http404("No such playlist")
+
+    body = hls.signed_playlist(
+        text, prefix, name, lambda nested: reverse('bjj:video_playlist', args=[video_id, nested])
+    )
+    response = HttpResponse(body, content_type=hls.PLAYLIST_TYPE)
+    # Shorter than the segment signatures, so a cached playlist never holds expired URLs
+    patch_cache_control(response, private=True, max_age=300)
+    return response
+
+
 """
 Fallback simple tag search (term-based, not multi-word aware)
 def tag_search(request):
@@ -119,57 +275,53 @@ def tag_search(request):
     })"""
 
 
-STOPWORDS = {"from", "in", "on", "at", "the", "a", "an", "of", "and", "with"}
-
-# ✅ Add a synonyms dictionary
-SYNONYMS = {
-    "no gi": "nogi",
-    "no-gi": "nogi",
-}
-
-def extract_tags_from_query(query): #nogi querries need to be fixed!
-    """Match query text against DB tags (multi-word aware)."""
-    query = query.lower().strip()
-    query = re.sub(r"[^\w\s]", " ", query)  # strip punctuation
-
-    # Load all tag names once
-    tag_names = list(Tag.objects.values_list("name", flat=True))
-    tag_map = {t.lower(): t for t in tag_names}  # lowercase → canonical tag
-
-    matched_tags = []
-    used_tokens = set()
+def extract_tags_from_query(query):
+    """Match query text against DB tags (multi-word and synonym aware)."""
+    return tag_matcher.match(query)
 
-    # First: check full multi-word tags (longest tags first)
-    for tag in sorted(tag_map.keys(), key=len, reverse=True):
-        if tag in query and tag not in used_tokens:
-            matched_tags.append(tag_map[tag])
-            used_tokens.update(tag.split())
-
-    # Second: check leftover single terms
-    terms = [t for t in query.split() if t not in STOPWORDS and t not in used_tokens]
-    for term in terms:
-        if term in tag_map:
-            matched_tags.append(tag_map[term])
-
-    return matched_tags
 
+@cached_page(params=("q", *PAGE_PARAMS))
 def tag_search(request):
     query = request.GET.get("q", "").strip().lower()
     matched_tags = extract_tags_from_query(query)
 
-    videos = Video.objects.all()
-    for tag in matched_tags:
-        videos = videos.filter(tags__name__iexact=tag)
+    if matched_tags:
+        # AND across tags via the in-memory index, then load only this page
+        tag_ids = tag_matcher.ids_for(matched_tags)
+        page_obj = paginate(request, tag_index.video_ids(tag_ids))
+        page_obj.object_list = list(
+            with_card_tags(Video.objects.filter(id__in=list(page_obj.object_list))).order_by("-id")
+        )
+    else:
+        page_obj = paginate(request, with_card_tags(Video.objects.order_by("-id")))
+
+    return render_video_page(request, "bjj/tag_search_results.html", {
+        "query": query,
+        "videos": page_obj,
+        "video_count": page_obj.total_count,
+        "matched_tags": matched_tags,  # ✅ useful for debugging or display
+    }, page_obj)
 
-    videos = videos.distinct().order_by("-id")
 
-    paginator = Paginator(videos, 12)
+@cached_page(params=("q", "page"))
+def video_search(request):
+    """Ranked full-text search over titles, tags and categories (typo tolerant)."""
+    query = request.GET.get("q", "").strip()
+
+    # Results are in relevance order, so they use numbered pages, not id cursors
+    paginator = Paginator(search_video_ids(query) if query else [], 12)
     page_obj = paginator.get_page(request.GET.get("page"))
+    page_obj.is_keyset = False
+    page_obj.total_count = paginator.count
+    page_obj.page_links = paginator.get_elided_page_range(page_obj.number, on_each_side=2, on_ends=1)
+
+    # Keep the relevance order of this page's ids
+    page_ids = list(page_obj.object_list)
+    videos = with_card_tags(Video.objects.filter(id__in=page_ids)).in_bulk()
+    page_obj.object_list = [videos[video_id] for video_id in page_ids if video_id in videos]
 
-    return render(request, "bjj/tag_search_results.html", {
+    return render_video_page(request, "bjj/tag_search_results.html", {
         "query": query,
         "videos": page_obj,
-        "video_count": videos.count(),
-        "matched_tags": matched_tags,  # ✅ useful for debugging or display
-    })
-
+        "video_count": paginator.count,
+    }, page_obj)
@@ -0,0 +1,104 @@
+"""Request instrumentation (see jiujitsuteria/utils/metrics.py).
+
+``MetricsMiddleware`` times every request, counts its database queries,
+CloudFront signatures and template rendering, and records them per view
+(the URL name, e.g. ``bjj:category_videos``). With ``METRICS_SERVER_TIMING``
+(on in development with DEBUG, off otherwise) the same numbers are sent in
+a ``Server-Timing`` header, so browser dev tools show them next to each page.
+
+Each view can have a budget in ``METRICS_BUDGETS`` (``METRICS_DEFAULT_BUDGET``
+otherwise): a request running more queries or taking longer logs a warning,
+so an N+1 query on a grid page shows up in the logs at once::
+
+    METRICS_BUDGETS = {"bjj:category_videos": {"queries": 10, "ms": 300}}
+"""
+
+import contextlib
+import logging
+import time
+
+from django.conf import settings
+from django.db import connections
+
+from jiujitsuteria.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUDGET = {"queries": 50, "ms": 1000}
+
+
+def _record_query(execute, sql, params, many, context):
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.record("db", time.perf_counter() - started)
+
+
+def view_name(request):
+    """Metrics label of the view that handled ``request``."""
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return "<unresolved>"  # 404s, not one label per URL
+    return match.view_name
+
+
+def budget_for(view):
+    budgets = getattr(settings, "METRICS_BUDGETS", {})
+    return {**getattr(settings, "METRICS_DEFAULT_BUDGET", DEFAULT_BUDGET), **budgets.get(view, {})}
+
+
+def server_timing(timings, elapsed):
+    entries = [
+        ("db", timings.seconds("db"), f"{timings.count('db')} queries"),
+        ("sign", timings.seconds("sign"), f"{timings.count('sign')} signatures"),
+        ("tpl", timings.seconds("template"), "templates"),
+        ("total", elapsed, "total"),
+    ]
+    return ", ".join(f'{name};dur={seconds * 1000:.1f};desc="{desc}"' for name, seconds, desc in entries)
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with metrics.request_timings() as timings, contextlib.ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(_record_query))
+            response = self.get_response(request)
+        elapsed = timings.elapsed()
+
+        view = view_name(request)
+        self.observe(view, request.method, response.status_code, timings, elapsed)
+        self.check_budget(view, request, timings, elapsed)
+        if getattr(settings, "METRICS_SERVER_TIMING", False):
+            response["Server-Timing"] = server_timing(timings, elapsed)
+        return response
+
+    def observe(self, view, method, status, timings, elapsed):
+        metrics.REQUEST_LATENCY.observe((view, method), elapsed)
+        metrics.REQUESTS.inc((view, method, f"{status // 100}xx"))
+        metrics.DB_QUERIES.observe((view,), timings.count("db"))
+        metrics.DB_SECONDS.inc((view,), timings.seconds("db"))
+        if timings.count("sign"):
+            metrics.SIGNATURES.inc((view,), timings.count("sign"))
+            metrics.SIGNING_SECONDS.inc((view,), timings.seconds("sign"))
+        if timings.count("template"):
+            metrics.TEMPLATE_SECONDS.observe((view,), timings.seconds("template"))
+
+    def check_budget(self, view, request, timings, elapsed):
+        budget = budget_for(view)
+        queries = timings.count("db")
+        if budget.get("queries") is not None and queries > budget["queries"]:
+            metrics.BUDGET_EXCEEDED.inc((view, "queries"))
+            logger.warning(
+                "%s ran %d queries (budget %d): %s", view, queries, budget["queries"], request.get_full_path()
+            )
+        if budget.get("ms") is not None and elapsed * 1000 > budget["ms"]:
+            metrics.BUDGET_EXCEEDED.inc((view, "latency"))
+            logger.warning(
+                "%s took %.0f ms (budget %d ms, %.0f ms in %d queries): %s",
+                view, elapsed * 1000, budget["ms"], timings.seconds("db") * 1000, queries,
+                request.get_full_path(),
+            )
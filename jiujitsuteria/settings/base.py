@@ -34,12 +34,14 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",  # full-text search / trigram lookups (bjj.search)
 
     # Third-party
     "storages",
 ]
 
 MIDDLEWARE = [
+    "jiujitsuteria.middleware.MetricsMiddleware",  # first, so it times everything below
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -54,7 +56,7 @@ ROOT_URLCONF = "jiujitsuteria.urls"
 
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        "BACKEND": "jiujitsuteria.utils.metrics.TimedDjangoTemplates",  # DjangoTemplates, timed
         "DIRS": [BASE_DIR / "templates"],  # project-wide templates (optional)
         "APP_DIRS": True,
         "OPTIONS": {
@@ -82,6 +84,17 @@ DATABASES = {
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
+# =============================================================================
+# Cache (overridden in prod)
+# =============================================================================
+# bjj.versions keeps its invalidation counters here; with several worker
+# processes this must be a shared backend.
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    }
+}
+
 # =============================================================================
 # Static & Media Files
 # =============================================================================
@@ -100,6 +113,103 @@ STATIC_ROOT = BASE_DIR / "staticfiles"
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
+# =============================================================================
+# BJJ Video Grids
+# =============================================================================
+# Render card tags from the denormalized Video.tag_cache column (no join).
+# Set to False to fall back to prefetch_related('tags').
+BJJ_DENORMALIZED_TAGS = os.environ.get("BJJ_DENORMALIZED_TAGS", "True") == "True"
+
+# "keyset" pages listings with ?after=/?before= id cursors (flat cost at any
+# depth); "page" keeps numbered ?page=N links. Totals are cached for
+# BJJ_COUNT_CACHE_TIMEOUT seconds instead of counted on every request.
+BJJ_PAGINATION_MODE = os.environ.get("BJJ_PAGINATION_MODE", "keyset")
+BJJ_COUNT_CACHE_TIMEOUT = int(os.environ.get("BJJ_COUNT_CACHE_TIMEOUT", 300))
+
+# Upper bound on ranked results returned by the full-text video search.
+BJJ_SEARCH_MAX_RESULTS = int(os.environ.get("BJJ_SEARCH_MAX_RESULTS", 1000))
+
+# Lifetime of cached public pages and video grid fragments (bjj.caching).
+# Entries are invalidated on any content change; 0 disables the cache.
+BJJ_PAGE_CACHE_TIMEOUT = int(os.environ.get("BJJ_PAGE_CACHE_TIMEOUT", 600))
+
+# Thumbnail variants generated by generate_thumbnails (grid cards use srcset).
+# AVIF is skipped when ffmpeg has no AV1 encoder.
+BJJ_THUMBNAIL_WIDTHS = (320, 640, 960)
+BJJ_THUMBNAIL_FORMATS = ("avif", "webp", "jpg")
+
+# HLS renditions made by the "hls" job / `package_hls` (bjj.hls): (height,
+# video kbps) rungs up to the source height, segment length, and how long the
+# signed segment URLs in a served playlist stay valid (seconds).
+BJJ_HLS_LADDER = ((360, 800), (540, 1600), (720, 3000), (1080, 5000))
+BJJ_HLS_SEGMENT_SECONDS = 4
+BJJ_HLS_URL_TTL = int(os.environ.get("BJJ_HLS_URL_TTL", 6 * 3600))
+
+# Remux uploads whose MP4 index (moov) sits after the media so playback can
+# start at once (the "probe" job, bjj.metadata). `probe_videos --remux` does
+# it for existing files. Set CLOUDFRONT_DISTRIBUTION_ID to invalidate the
+# rewritten files in CloudFront.
+BJJ_REMUX_FASTSTART = os.environ.get("BJJ_REMUX_FASTSTART", "False") == "True"
+
+# Multipart part size (bytes) for video uploads, and parallel parts for the
+# server-side fallback (bjj.uploads). Browsers upload straight to S3.
+BJJ_UPLOAD_PART_SIZE = int(os.environ.get("BJJ_UPLOAD_PART_SIZE", 16 * 1024 * 1024))
+BJJ_UPLOAD_CONCURRENCY = int(os.environ.get("BJJ_UPLOAD_CONCURRENCY", 8))
+
+# Seconds after which a running background job is assumed lost and claimed
+# again by another `run_jobs` worker (bjj.jobs).
+BJJ_JOB_LOCK_TIMEOUT = int(os.environ.get("BJJ_JOB_LOCK_TIMEOUT", 15 * 60))
+
+# =============================================================================
+# AWS Clients
+# =============================================================================
+# Shared boto3 clients (jiujitsuteria/utils/aws.py): connection pool size per
+# client, attempts per call (standard retry mode) and socket timeouts.
+AWS_MAX_POOL_CONNECTIONS = int(os.environ.get("AWS_MAX_POOL_CONNECTIONS", 32))
+AWS_MAX_ATTEMPTS = int(os.environ.get("AWS_MAX_ATTEMPTS", 5))
+AWS_CONNECT_TIMEOUT = int(os.environ.get("AWS_CONNECT_TIMEOUT", 5))
+AWS_READ_TIMEOUT = int(os.environ.get("AWS_READ_TIMEOUT", 60))
+
+# =============================================================================
+# CloudFront Signing
+# =============================================================================
+# RSA implementation used for CloudFront signatures: "cryptography" (OpenSSL,
+# fast) or "rsa" (pure Python). Compare them with `manage.py benchmark_signing`.
+CLOUDFRONT_SIGNING_BACKEND = os.environ.get("CLOUDFRONT_SIGNING_BACKEND", "cryptography")
+
+# A signed URL valid for TTL seconds is reused for REUSE seconds, capped at
+# 5/6 of the TTL of shorter-lived URLs (see
+# jiujitsuteria/utils/cloudfront.py). Set CACHE_ALIAS to share URLs between
+# workers through a Django cache backend.
+CLOUDFRONT_SIGNED_URL_TTL = int(os.environ.get("CLOUDFRONT_SIGNED_URL_TTL", 3600))
+CLOUDFRONT_SIGNED_URL_REUSE = int(os.environ.get("CLOUDFRONT_SIGNED_URL_REUSE", 3000))
+CLOUDFRONT_SIGNED_URL_CACHE_SIZE = int(os.environ.get("CLOUDFRONT_SIGNED_URL_CACHE_SIZE", 1024))
+CLOUDFRONT_SIGNED_URL_CACHE_ALIAS = os.environ.get("CLOUDFRONT_SIGNED_URL_CACHE_ALIAS") or None
+
+# =============================================================================
+# Request Metrics
+# =============================================================================
+# Per-view latency, query, signing and template metrics (jiujitsuteria/
+# middleware.py), served in the Prometheus format at /metrics/ to staff or to
+# scrapers sending "Authorization: Bearer <METRICS_TOKEN>".
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN") or None
+
+# Add a Server-Timing header (db, sign, tpl, total) to every response. Off
+# by default: it tells anyone how many queries and signatures a page costs.
+METRICS_SERVER_TIMING = os.environ.get("METRICS_SERVER_TIMING", "False") == "True"
+
+# Requests over their view's budget (query count, milliseconds) log a warning.
+METRICS_DEFAULT_BUDGET = {"queries": 50, "ms": 1000}
+METRICS_BUDGETS = {
+    "bjj:index": {"queries": 10, "ms": 200},
+    "bjj:category_list": {"queries": 10, "ms": 200},
+    "bjj:category_videos": {"queries": 10, "ms": 300},
+    "bjj:videos_by_tag": {"queries": 10, "ms": 300},
+    "bjj:tag_search": {"queries": 10, "ms": 300},
+    "bjj:video_search": {"queries": 10, "ms": 500},
+    "bjj:video_detail": {"queries": 10, "ms": 200},
+}
+
 # =============================================================================
 # Auth Redirects
 # =============================================================================
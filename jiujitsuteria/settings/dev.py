@@ -20,6 +20,7 @@ if env_path.exists():
 SECRET_KEY = os.getenv("DJANGO_SECRET_KEY", "fallback-dev-key")
 DEBUG = os.getenv("DJANGO_DEBUG", "True") == "True"
 ALLOWED_HOSTS = os.getenv("DJANGO_ALLOWED_HOSTS", "127.0.0.1,localhost").split(",")
+METRICS_SERVER_TIMING = os.getenv("METRICS_SERVER_TIMING", str(DEBUG)) == "True"
 
 # ---------------------
 # AWS S3 / CloudFront
@@ -28,14 +29,15 @@ AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID")
 AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
 
 AWS_PRIVATE_VIDEO_BUCKET = os.getenv("AWS_PRIVATE_VIDEO_BUCKET")
-AWS_S3_REGION_NAME = os.getenv("AWS_S3_REGION_NAME")
+AWS_S3_REGION_NAME = os.getenv("AWS_S3_REGION_NAME", "ap-southeast-1")
 
 AWS_PUBLIC_THUMBNAIL_BUCKET = os.getenv("AWS_PUBLIC_THUMBNAIL_BUCKET")
 
 CLOUDFRONT_DOMAIN = os.getenv("CLOUDFRONT_DOMAIN", "").replace("https://", "")
+CLOUDFRONT_DISTRIBUTION_ID = os.getenv("CLOUDFRONT_DISTRIBUTION_ID")
 CLOUDFRONT_KEY_ID = os.getenv("CLOUDFRONT_KEY_ID")
 CLOUDFRONT_KEY_FILE = os.getenv("CLOUDFRONT_KEY_FILE")
-CLOUDFRONT_PRIVATE_KEY_PATH = CLOUDFRONT_KEY_FILE  # used in utils/cloudfront.py
+CLOUDFRONT_PRIVATE_KEY_PATH = CLOUDFRONT_KEY_FILE  # alias kept for older scripts
 
 CLOUDFRONT_PUBLIC_DOMAIN = os.getenv("CLOUDFRONT_PUBLIC_DOMAIN")
 
@@ -26,7 +26,7 @@ ALLOWED_HOSTS = os.environ.get("DJANGO_ALLOWED_HOSTS", "jiujitsuteria.com,www.ji
 # =============================================================================
 AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID")
 AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
-AWS_S3_REGION_NAME = os.getenv("AWS_S3_REGION_NAME")
+AWS_S3_REGION_NAME = os.getenv("AWS_S3_REGION_NAME", "ap-southeast-1")
 
 # Private bucket (videos)
 AWS_PRIVATE_VIDEO_BUCKET = os.getenv("AWS_PRIVATE_VIDEO_BUCKET")
@@ -36,6 +36,7 @@ AWS_PUBLIC_THUMBNAIL_BUCKET = os.getenv("AWS_PUBLIC_THUMBNAIL_BUCKET")
 
 # CloudFront private (signed video URLs)
 CLOUDFRONT_DOMAIN = os.getenv("CLOUDFRONT_DOMAIN", "").replace("https://", "")
+CLOUDFRONT_DISTRIBUTION_ID = os.getenv("CLOUDFRONT_DISTRIBUTION_ID")
 CLOUDFRONT_KEY_ID = os.getenv("CLOUDFRONT_KEY_ID")
 CLOUDFRONT_PRIVATE_KEY_PATH = os.getenv("CLOUDFRONT_PRIVATE_KEY_PATH")
 # Alias for backward compatibility with cloudfront.py
@@ -55,6 +56,33 @@ DATABASES = {
     )
 }
 
+# =============================================================================
+# Cache (shared between gunicorn workers)
+# =============================================================================
+# Redis when REDIS_URL is set in .env.prod (see "Production cache" in the
+# README), otherwise a database table created by `manage.py createcachetable`
+# during deploy. The page cache only runs on Redis: every request reads the
+# bjj.versions counters, which would cost a query each on the database cache,
+# and its incr() is a read-then-write that can lose a concurrent bump and
+# leave pages stale. Without Redis, pages are rendered on every request.
+REDIS_URL = os.environ.get("REDIS_URL")
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+            "LOCATION": "django_cache",
+        }
+    }
+    BJJ_PAGE_CACHE_TIMEOUT = 0
+    print("⚠️ REDIS_URL is not set: page caching is off", file=sys.stderr)
+
 # =============================================================================
 # Static & Media (Production)
 # =============================================================================
@@ -0,0 +1,85 @@
+"""Shared boto3 clients.
+
+Clients are created on first use, not at import (importing boto3 alone
+takes a noticeable share of process startup), and then shared by every
+thread of the process: boto3 clients are thread-safe, creating them is not,
+so creation is serialized. Sharing one client keeps its connection pool warm
+across requests, jobs and bulk commands.
+
+The region and credentials come from the ``AWS_*`` settings; connection pool
+size, retries and timeouts from ``AWS_MAX_POOL_CONNECTIONS``,
+``AWS_MAX_ATTEMPTS``, ``AWS_CONNECT_TIMEOUT`` and ``AWS_READ_TIMEOUT``.
+
+    from jiujitsuteria.utils.aws import get_client
+    get_client("s3").head_object(Bucket=..., Key=...)
+"""
+
+import contextlib
+import threading
+
+from django.conf import settings
+
+_lock = threading.Lock()
+_session = None
+_clients = {}
+
+
+def client_config():
+    """botocore ``Config`` shared by every client."""
+    from botocore.config import Config
+
+    return Config(
+        region_name=getattr(settings, "AWS_S3_REGION_NAME", None) or None,
+        max_pool_connections=getattr(settings, "AWS_MAX_POOL_CONNECTIONS", 32),
+        retries={"total_max_attempts": getattr(settings, "AWS_MAX_ATTEMPTS", 5), "mode": "standard"},
+        connect_timeout=getattr(settings, "AWS_CONNECT_TIMEOUT", 5),
+        read_timeout=getattr(settings, "AWS_READ_TIMEOUT", 60),
+        tcp_keepalive=True,
+    )
+
+
+def _get_session():
+    global _session
+    if _session is None:
+        import boto3.session
+
+        _session = boto3.session.Session(
+            aws_access_key_id=getattr(settings, "AWS_ACCESS_KEY_ID", None) or None,
+            aws_secret_access_key=getattr(settings, "AWS_SECRET_ACCESS_KEY", None) or None,
+        )
+    return _session
+
+
+def get_client(service="s3"):
+    """Return the process-wide client for ``service``, creating it once."""
+    client = _clients.get(service)
+    if client is None:
+        with _lock:
+            client = _clients.get(service)
+            if client is None:
+                client = _clients[service] = _get_session().client(service, config=client_config())
+    return client
+
+
+def reset_clients():
+    """Drop cached clients (e.g. after settings change in tests or a fork)."""
+    global _session
+    with _lock:
+        _clients.clear()
+        _session = None
+
+
+@contextlib.contextmanager
+def use_client(service, client):
+    """Make ``get_client(service)`` return ``client`` while active (benchmarks, tests)."""
+    with _lock:
+        previous = _clients.get(service)
+        _clients[service] = client
+    try:
+        yield client
+    finally:
+        with _lock:
+            if previous is None:
+                _clients.pop(service, None)
+            else:
+                _clients[service] = previous
@@ -1,15 +1,227 @@
+"""CloudFront signed URL helpers for private video access.
+
+This is the single signing module for the project; ``utils/cloudfront.py``
+only re-exports it. The RSA implementation is pluggable through
+``CLOUDFRONT_SIGNING_BACKEND``: ``"cryptography"`` (OpenSSL, the default) or
+``"rsa"`` (pure Python, kept as a fallback).
+
+The private key is parsed once per process and kept by a shared
+``CloudFrontSignerService``. The key file is re-checked at most every
+``CLOUDFRONT_KEY_CHECK_INTERVAL`` seconds and only reloaded when its mtime
+changes, so rotating the key on disk takes effect without a restart.
+
+Signed URLs are cached by ``get_signed_url`` in expiry buckets: a URL valid
+for ``CLOUDFRONT_SIGNED_URL_TTL`` seconds is reused for
+``CLOUDFRONT_SIGNED_URL_REUSE`` seconds (at most 5/6 of its lifetime), so
+repeat views cost no RSA work and the URL stays stable for browser and CDN
+caches.
+
+HLS playlists (``bjj.hls``) avoid one signature per segment with
+``signing_scope``: inside the scope, keys under a shared prefix are signed
+with one custom policy covering ``<prefix>*`` instead of a canned policy
+per object.
+
+Cached HTML must never hold a signature: inside ``deferred_signing``
+``get_signed_url`` emits placeholders that ``splice_signed_urls`` swaps for
+fresh signed URLs each time the page is served. The placeholders a render
+issued are kept with the cached page, and nothing else is ever signed.
+"""
+
+import base64
+import contextlib
+import contextvars
 import datetime
-import boto3
-from django.conf import settings
+import hashlib
+import html
+import json
+import os
+import re
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlencode
+
 from botocore.signers import CloudFrontSigner
-import rsa
+from django.conf import settings
+from django.core.cache import caches
+
+from . import metrics
+
+
+# -----------------------------
+# Signing backends
+# -----------------------------
+class CryptographySigningBackend:
+    """RSA-SHA1 via ``cryptography`` (OpenSSL). Accepts PKCS#1 and PKCS#8 PEM keys."""
+
+    name = "cryptography"
+
+    def load_private_key(self, pem):
+        from cryptography.hazmat.primitives import serialization
+        # CloudFront keys typically don't use passwords
+        return serialization.load_pem_private_key(pem, password=None)
+
+    def sign(self, private_key, message):
+        from cryptography.hazmat.primitives import hashes
+        from cryptography.hazmat.primitives.asymmetric import padding
+        return private_key.sign(message, padding.PKCS1v15(), hashes.SHA1())
+
+
+class RsaSigningBackend:
+    """RSA-SHA1 via the pure-Python ``rsa`` package. Accepts PKCS#1 PEM keys only."""
+
+    name = "rsa"
+
+    def load_private_key(self, pem):
+        import rsa
+        return rsa.PrivateKey.load_pkcs1(pem)
+
+    def sign(self, private_key, message):
+        import rsa
+        return rsa.sign(message, private_key, "SHA-1")
+
+
+SIGNING_BACKENDS = {
+    CryptographySigningBackend.name: CryptographySigningBackend,
+    RsaSigningBackend.name: RsaSigningBackend,
+}
+
+
+def get_signing_backend(name=None):
+    """Return an instance of the configured (or named) signing backend."""
+    name = name or getattr(settings, "CLOUDFRONT_SIGNING_BACKEND", CryptographySigningBackend.name)
+    try:
+        return SIGNING_BACKENDS[name]()
+    except KeyError:
+        raise ValueError(
+            f"❌ Unknown CLOUDFRONT_SIGNING_BACKEND {name!r} (choose from {', '.join(SIGNING_BACKENDS)})"
+        )
+
+
+# -----------------------------
+# Signer service
+# -----------------------------
+class CloudFrontSignerService:
+    """Process-wide signer that caches the parsed private key and tracks throughput.
+
+    ``backend`` and ``key_file`` default to ``CLOUDFRONT_SIGNING_BACKEND`` and
+    ``CLOUDFRONT_KEY_FILE``; they are resolved lazily so settings can change
+    after import.
+    """
+
+    def __init__(self, backend=None, key_file=None):
+        self._lock = threading.Lock()
+        self._backend = backend
+        self._key_file = key_file
+        self._private_key = None
+        self._key_path = None
+        self._key_mtime = None
+        self._next_check = 0.0
+        self._signers = {}
+
+        self.sign_count = 0
+        self.sign_seconds = 0.0
+        self.key_loads = 0
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            self._backend = get_signing_backend()
+        return self._backend
+
+    # -----------------------------
+    # Key loading
+    # -----------------------------
+    def _get_private_key(self):
+        """Return the parsed private key, reloading it if the file changed."""
+        path = self._key_file or getattr(settings, "CLOUDFRONT_KEY_FILE", None)
+        if not path:
+            raise ValueError("❌ CLOUDFRONT_KEY_FILE must be set in settings.py")
+
+        now = time.monotonic()
+        if self._private_key is not None and path == self._key_path and now < self._next_check:
+            return self._private_key
+
+        with self._lock:
+            try:
+                mtime = os.stat(path).st_mtime_ns
+            except FileNotFoundError:
+                raise FileNotFoundError(f"❌ CloudFront private key file not found: {path}")
+            if self._private_key is None or path != self._key_path or mtime != self._key_mtime:
+                with open(path, "rb") as key_file:
+                    try:
+                        self._private_key = self.backend.load_private_key(key_file.read())
+                    except Exception as e:
+                        raise ValueError(f"❌ Failed to load private key: {str(e)}")
+                self._key_path = path
+                self._key_mtime = mtime
+                self.key_loads += 1
+            self._next_check = now + getattr(settings, "CLOUDFRONT_KEY_CHECK_INTERVAL", 5)
+        return self._private_key
+
+    # -----------------------------
+    # Signing
+    # -----------------------------
+    def sign(self, message):
+        """Sign a CloudFront policy with RSA-SHA1 (the only algorithm CloudFront accepts)."""
+        private_key = self._get_private_key()
+        started = time.perf_counter()
+        signature = self.backend.sign(private_key, message)
+        elapsed = time.perf_counter() - started
+        metrics.record("sign", elapsed)
+        with self._lock:
+            self.sign_count += 1
+            self.sign_seconds += elapsed
+        return signature
+
+    def get_signer(self, key_id):
+        """Return a cached ``CloudFrontSigner`` for the given key pair ID."""
+        signer = self._signers.get(key_id)
+        if signer is None:
+            signer = CloudFrontSigner(key_id, self.sign)
+            self._signers[key_id] = signer
+        return signer
+
+    def stats(self):
+        """Return signing throughput numbers for this process."""
+        with self._lock:
+            count, seconds, loads = self.sign_count, self.sign_seconds, self.key_loads
+        return {
+            "backend": self.backend.name,
+            "signatures": count,
+            "total_seconds": seconds,
+            "avg_ms": (seconds / count * 1000) if count else 0.0,
+            "signatures_per_second": (count / seconds) if seconds else 0.0,
+            "key_loads": loads,
+        }
+
+    def reset_stats(self):
+        with self._lock:
+            self.sign_count = 0
+            self.sign_seconds = 0.0
+
+
+signer_service = CloudFrontSignerService()
 
 
 def _rsa_signer(message):
     """Helper function for CloudFrontSigner (signs the policy with your private key)."""
-    with open(settings.CLOUDFRONT_KEY_FILE, "rb") as key_file:
-        private_key = rsa.PrivateKey.load_pkcs1(key_file.read())
-    return rsa.sign(message, private_key, "SHA-1")
+    return signer_service.sign(message)
+
+
+def _signed_url_for(key, expire_date):
+    """Sign ``https://CLOUDFRONT_DOMAIN/<key>`` with a canned policy ending at ``expire_date``."""
+    cloudfront_domain = getattr(settings, "CLOUDFRONT_DOMAIN", None)
+    key_id = getattr(settings, "CLOUDFRONT_KEY_ID", None)
+
+    if not cloudfront_domain or not key_id:
+        raise ValueError("❌ CLOUDFRONT_DOMAIN and CLOUDFRONT_KEY_ID must be set in settings.py")
+
+    # Normalize key (remove leading slashes)
+    url = f"https://{cloudfront_domain}/{key.lstrip('/')}"
+    signer = signer_service.get_signer(key_id)
+    return signer.generate_presigned_url(url, date_less_than=expire_date)
 
 
 def generate_signed_url(key, expires_in=3600):
@@ -24,16 +236,230 @@ def generate_signed_url(key, expires_in=3600):
     Returns:
         str: Signed CloudFront URL
     """
+    expire_date = datetime.datetime.utcnow() + datetime.timedelta(seconds=expires_in)
+    return _signed_url_for(key, expire_date)
+
+
+# -----------------------------
+# Signed URL cache
+# -----------------------------
+def _expiry_bucket(expires_in=None, reuse_for=None):
+    """Return ``(now, bucket_start, reuse_for, expires_at)`` for the current bucket."""
+    expires_in = expires_in or getattr(settings, "CLOUDFRONT_SIGNED_URL_TTL", 3600)
+    if not reuse_for:
+        # A short-lived URL keeps at least a sixth of its life when last served
+        reuse_for = min(getattr(settings, "CLOUDFRONT_SIGNED_URL_REUSE", expires_in), expires_in * 5 // 6)
+    reuse_for = max(1, min(reuse_for, expires_in))
+
+    # Every URL issued within a bucket shares one expiry, so it is still
+    # valid for at least (expires_in - reuse_for) seconds when last served.
+    now = int(time.time())
+    bucket_start = now - now % reuse_for
+    return now, bucket_start, reuse_for, bucket_start + expires_in
+
+
+def signing_epoch(expires_in=None):
+    """Return the start (epoch seconds) of the current signing bucket.
+
+    Signed URLs and cookies change exactly when this does, so HTTP validators
+    for pages that embed them must include it.
+    """
+    return _expiry_bucket(expires_in)[1]
+
+
+class SignedUrlCache:
+    """Two-tier cache of signed URLs keyed by object path and expiry bucket.
+
+    Tier 1 is a bounded in-process LRU. Tier 2 is an optional Django cache
+    backend (``CLOUDFRONT_SIGNED_URL_CACHE_ALIAS``) shared between workers.
+    """
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _backend(self):
+        alias = getattr(settings, "CLOUDFRONT_SIGNED_URL_CACHE_ALIAS", None)
+        return caches[alias] if alias else None
+
+    def get(self, key, expires_in=None, reuse_for=None, sign=None):
+        """Return a signed URL for ``key``, signing only once per expiry bucket.
+
+        ``sign(key, expire_date)`` produces the value to cache; it defaults to
+        a canned-policy URL. Any JSON-serialisable result can be cached.
+        """
+        sign = sign or _signed_url_for
+        now, bucket_start, reuse_for, expires_at = _expiry_bucket(expires_in, reuse_for)
+        cache_key = (sign.__name__, key, expires_at)
+
+        with self._lock:
+            url = self._entries.get(cache_key)
+            if url is not None:
+                self._entries.move_to_end(cache_key)
+                self.hits += 1
+                return url
+
+        backend = self._backend()
+        shared_key = None
+        if backend is not None:
+            digest = hashlib.md5(key.encode("utf-8")).hexdigest()
+            shared_key = f"cf-signed:{sign.__name__}:{expires_at}:{digest}"
+            url = backend.get(shared_key)
+
+        if url is None:
+            expire_date = datetime.datetime.fromtimestamp(expires_at, datetime.timezone.utc)
+            url = sign(key, expire_date)
+            if backend is not None:
+                backend.set(shared_key, url, timeout=max(1, bucket_start + reuse_for - now))
+
+        with self._lock:
+            self.misses += 1
+            self._entries[cache_key] = url
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return url
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+signed_url_cache = SignedUrlCache(getattr(settings, "CLOUDFRONT_SIGNED_URL_CACHE_SIZE", 1024))
+
+
+def get_signed_url(key, expires_in=None):
+    """Return a cached signed CloudFront URL for ``key`` (see ``SignedUrlCache``).
+
+    Inside a ``signing_scope`` whose prefix covers ``key``, the URL carries
+    the scope's shared wildcard policy instead of its own signature.
+    """
+    key = key.lstrip("/")
+    issued = _deferred.get()
+    if issued is not None:
+        return issued.issue(key, expires_in)
+    prefix = _active_scope.get()
+    if prefix and key.startswith(prefix):
+        params = get_signed_policy(prefix, expires_in=expires_in)
+        return f"https://{settings.CLOUDFRONT_DOMAIN}/{key}?{urlencode(params)}"
+    return signed_url_cache.get(key, expires_in=expires_in)
+
+
+# -----------------------------
+# Wildcard (custom policy) signing
+# -----------------------------
+def _cloudfront_b64(data):
+    """CloudFront's URL-safe base64 variant (+ → -, = → _, / → ~)."""
+    encoded = base64.b64encode(data).decode("ascii")
+    return encoded.replace("+", "-").replace("=", "_").replace("/", "~")
+
+
+def _signed_policy_for(prefix, expire_date):
+    """Sign one custom policy granting access to every object under ``prefix``."""
     cloudfront_domain = getattr(settings, "CLOUDFRONT_DOMAIN", None)
     key_id = getattr(settings, "CLOUDFRONT_KEY_ID", None)
 
     if not cloudfront_domain or not key_id:
         raise ValueError("❌ CLOUDFRONT_DOMAIN and CLOUDFRONT_KEY_ID must be set in settings.py")
 
-    url = f"https://{cloudfront_domain}/{key}"
-    expire_date = datetime.datetime.utcnow() + datetime.timedelta(seconds=expires_in)
+    policy = json.dumps({
+        "Statement": [{
+            "Resource": f"https://{cloudfront_domain}/{prefix}*",
+            "Condition": {"DateLessThan": {"AWS:EpochTime": int(expire_date.timestamp())}},
+        }]
+    }, separators=(",", ":")).encode("utf-8")
+
+    return {
+        "Policy": _cloudfront_b64(policy),
+        "Signature": _cloudfront_b64(signer_service.sign(policy)),
+        "Key-Pair-Id": key_id,
+    }
+
+
+def get_signed_policy(prefix, expires_in=None):
+    """Return cached ``Policy``/``Signature``/``Key-Pair-Id`` params for ``<prefix>*``."""
+    return signed_url_cache.get(prefix, expires_in=expires_in, sign=_signed_policy_for)
+
+
+_active_scope = contextvars.ContextVar("cloudfront_signing_scope", default="")
+
+
+@contextlib.contextmanager
+def signing_scope(prefix):
+    """Sign every key under ``prefix`` with one shared wildcard policy while active.
+
+    The policy is signed lazily on first use, so a scope that never signs a
+    URL costs nothing. An empty prefix disables the scope.
+    """
+    token = _active_scope.set(prefix or "")
+    try:
+        yield
+    finally:
+        _active_scope.reset(token)
+
+
+# -----------------------------
+# Deferred signing (for cached HTML)
+# -----------------------------
+_deferred = contextvars.ContextVar("cloudfront_deferred_signing", default=None)
+
+# Only characters HTML autoescaping leaves untouched
+_PLACEHOLDER = re.compile(r"cf-signed:[0-9a-f]+:\d+:")
+
+
+class IssuedPlaceholders(dict):
+    """Placeholders written by one render, mapped to the ``(key, expires_in)`` they stand for.
+
+    Only these are ever signed: a placeholder-shaped string anywhere else in
+    the page (a search query echoed back, a share link) is left as it is.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.nonce = secrets.token_hex(8)
+        self._by_target = {target: placeholder for placeholder, target in self.items()}
+
+    def issue(self, key, expires_in):
+        target = (key, expires_in)
+        placeholder = self._by_target.get(target)
+        if placeholder is None:
+            placeholder = f"cf-signed:{self.nonce}:{len(self)}:"
+            self[placeholder] = target
+            self._by_target[target] = placeholder
+        return placeholder
+
+
+@contextlib.contextmanager
+def deferred_signing():
+    """Make ``get_signed_url`` return placeholders instead of signed URLs while active.
+
+    Yields the ``IssuedPlaceholders`` to pass to ``splice_signed_urls``.
+    """
+    issued = IssuedPlaceholders()
+    token = _deferred.set(issued)
+    try:
+        yield issued
+    finally:
+        _deferred.reset(token)
+
+
+def splice_signed_urls(content, issued):
+    """Replace the ``issued`` placeholders in HTML ``content`` with signed URLs.
+
+    URLs are HTML-escaped like autoescaped template output. Keys and
+    lifetimes come from ``issued``, never from the page.
+    """
+    if not issued:
+        return content
 
-    signer = CloudFrontSigner(key_id, _rsa_signer)
-    signed_url = signer.generate_presigned_url(url, date_less_than=expire_date)
+    def sign(match):
+        target = issued.get(match.group(0))
+        if target is None:
+            return match.group(0)
+        key, expires_in = target
+        return html.escape(get_signed_url(key, expires_in=expires_in))
 
-    return signed_url
+    return _PLACEHOLDER.sub(sign, content)
@@ -0,0 +1,236 @@
+"""In-process request metrics, exposed in the Prometheus text format.
+
+``MetricsMiddleware`` (jiujitsuteria/middleware.py) opens a ``request_timings``
+scope around every request. Code anywhere below it reports work with
+``record``: database queries (a connection execute wrapper), CloudFront
+signatures (``CloudFrontSignerService.sign``) and template rendering
+(``TimedDjangoTemplates``, the template backend). At the end of the request
+the totals go into the histograms and counters defined here, into a
+``Server-Timing`` header (``METRICS_SERVER_TIMING``), and are checked
+against ``METRICS_BUDGETS``.
+
+Metrics live in the memory of each process, so every web worker reports its
+own numbers; ``render_metrics`` produces the text served at ``/metrics/``.
+
+    with metrics.request_timings() as timings:
+        ...
+        metrics.record("db", 0.004)
+    timings.seconds("db"), timings.count("db")
+"""
+
+import abc
+import bisect
+import contextlib
+import contextvars
+import math
+import threading
+import time
+
+from django.template.backends.django import DjangoTemplates
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+REGISTRY = []
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format(value):
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, int):
+        return str(value)
+    return repr(float(value))
+
+
+# -----------------------------
+# Metric types
+# -----------------------------
+class Metric(abc.ABC):
+    kind = "untyped"
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _label_text(self, values, extra=()):
+        pairs = [*zip(self.labels, values), *extra]
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+    @abc.abstractmethod
+    def samples(self):
+        """``(name, label_text, value)`` tuples, in label order."""
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, labels=()):
+        return self._values.get(labels, 0)
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        for labels, value in values:
+            yield self.name, self._label_text(labels), value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, labels, value):
+        index = bisect.bisect_left(self.buckets, value)  # first bucket with bound >= value
+        with self._lock:
+            counts, total = self._values.get(labels) or ([0] * (len(self.buckets) + 1), 0)
+            counts[index] += 1
+            self._values[labels] = (counts, total + value)
+
+    def samples(self):
+        with self._lock:
+            values = sorted((labels, (list(counts), total)) for labels, (counts, total) in self._values.items())
+        for labels, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, math.inf), counts):
+                cumulative += count
+                yield f"{self.name}_bucket", self._label_text(labels, [("le", _format(bound))]), cumulative
+            yield f"{self.name}_sum", self._label_text(labels), total
+            yield f"{self.name}_count", self._label_text(labels), cumulative
+
+
+def render_metrics():
+    """All registered metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(f"{name}{labels} {_format(value)}" for name, labels, value in metric.samples())
+    return "\n".join(lines) + "\n"
+
+
+def reset_metrics():
+    for metric in REGISTRY:
+        metric.reset()
+
+
+# -----------------------------
+# Request metrics
+# -----------------------------
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Time spent in the view and middleware, per view.", ("view", "method")
+)
+REQUESTS = Counter("http_requests_total", "Responses per view and status class.", ("view", "method", "status"))
+DB_QUERIES = Histogram(
+    "db_queries_per_request", "Database queries run by one request.", ("view",), buckets=QUERY_COUNT_BUCKETS
+)
+DB_SECONDS = Counter("db_query_seconds_total", "Time spent running database queries.", ("view",))
+SIGNATURES = Counter("cloudfront_signatures_total", "CloudFront RSA signatures made.", ("view",))
+SIGNING_SECONDS = Counter("cloudfront_signing_seconds_total", "Time spent making CloudFront signatures.", ("view",))
+TEMPLATE_SECONDS = Histogram("template_render_seconds", "Time spent rendering templates, per request.", ("view",))
+BUDGET_EXCEEDED = Counter(
+    "view_budget_exceeded_total", "Requests over their view's query or latency budget.", ("view", "budget")
+)
+
+
+class RequestTimings:
+    """Count and total seconds of each kind of work done by one request."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._totals = {}
+
+    def add(self, name, seconds):
+        count, total = self._totals.get(name, (0, 0.0))
+        self._totals[name] = (count + 1, total + seconds)
+
+    def count(self, name):
+        return self._totals.get(name, (0, 0.0))[0]
+
+    def seconds(self, name):
+        return self._totals.get(name, (0, 0.0))[1]
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+
+_current = contextvars.ContextVar("request_timings", default=None)
+
+
+@contextlib.contextmanager
+def request_timings():
+    """Collect ``record`` calls made while active into a new ``RequestTimings``."""
+    timings = RequestTimings()
+    token = _current.set(timings)
+    try:
+        yield timings
+    finally:
+        _current.reset(token)
+
+
+def record(name, seconds):
+    """Add ``seconds`` of ``name`` work to the current request, if any."""
+    timings = _current.get()
+    if timings is not None:
+        timings.add(name, seconds)
+
+
+@contextlib.contextmanager
+def timed(name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - started)
+
+
+# -----------------------------
+# Template timing
+# -----------------------------
+_rendering = contextvars.ContextVar("template_rendering", default=False)
+
+
+class TimedTemplate:
+    """A Django backend template whose top-level renders are recorded as ``template``."""
+
+    def __init__(self, template):
+        self._template = template
+        self.origin = template.origin
+        self.template = template.template
+
+    def render(self, context=None, request=None):
+        # Templates rendered while rendering another one are part of its time
+        if _rendering.get():
+            return self._template.render(context, request)
+        token = _rendering.set(True)
+        try:
+            with timed("template"):
+                return self._template.render(context, request)
+        finally:
+            _rendering.reset(token)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """``DjangoTemplates`` that reports render time to the request metrics."""
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name))
@@ -0,0 +1,20 @@
+"""Project-level views."""
+
+import hmac
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
+
+from jiujitsuteria.utils.metrics import render_metrics
+
+
+def metrics(request):
+    """Prometheus scrape endpoint, for staff or a ``Bearer METRICS_TOKEN`` header."""
+    token = getattr(settings, "METRICS_TOKEN", None)
+    authorization = request.headers.get("Authorization", "")
+    allowed = request.user.is_staff or (
+        token and hmac.compare_digest(authorization.encode(), f"Bearer {token}".encode())
+    )
+    if not allowed:
+        raise Http404()
+    return HttpResponse(render_metrics(), content_type="text/plain; version=0.0.4; charset=utf-8")
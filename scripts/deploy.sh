@@ -9,6 +9,7 @@ VENV_DIR=$BASE_DIR/shared/venv
 LOG_DIR=$BASE_DIR/shared/logs
 LOG_FILE=$LOG_DIR/deploy.log
 SCRIPT_DIR=$BASE_DIR/Jiujitsuteria/scripts
+JOBS_SERVICE=bjj-jobs   # background job worker (scripts/bjj-jobs.service)
 
 # --- Flags ---
 DRY_RUN=false
@@ -70,6 +71,7 @@ python3 $NEW_RELEASE/manage.py collectstatic --noinput --settings=jiujitsuteria.
 # 6. Apply migrations with prod settings
 echo "🗂️ Applying migrations..."
 python3 $NEW_RELEASE/manage.py migrate --noinput --settings=jiujitsuteria.settings.prod
+python3 $NEW_RELEASE/manage.py createcachetable --settings=jiujitsuteria.settings.prod
 
 # 7. Update symlink to point to new release
 ln -sfn "$NEW_RELEASE" "$CURRENT_LINK"
@@ -79,8 +81,14 @@ echo "🔗 Updated current symlink to $NEW_RELEASE"
 if $DRY_RUN; then
     echo "⏭️ Skipping service restart (dry-run mode)"
 else
+    echo "⚙️ Installing job worker unit..."
+    sudo install -m 644 "$NEW_RELEASE/scripts/$JOBS_SERVICE.service" "/etc/systemd/system/$JOBS_SERVICE.service"
+    sudo systemctl daemon-reload
+    sudo systemctl enable "$JOBS_SERVICE"
+
     echo "🔄 Restarting services..."
     sudo systemctl restart gunicorn
+    sudo systemctl restart "$JOBS_SERVICE"
     sudo systemctl restart nginx
 fi
 
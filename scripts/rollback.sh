@@ -11,6 +11,7 @@ SCRIPT_DIR="$APP_DIR/Jiujitsuteria/scripts"
 
 GUNICORN_SERVICE="gunicorn"   # change if different
 NGINX_SERVICE="nginx"
+JOBS_SERVICE="bjj-jobs"       # installed by deploy.sh (scripts/bjj-jobs.service)
 
 # --- Config ---
 RELEASE_RETENTION=5   # keep only the last 5 releases
@@ -48,6 +49,10 @@ echo "[Rollback] 🔗 Updated 'current' symlink -> $previous_release"
 # Restart services
 echo "[Rollback] 🔄 Restarting services..."
 sudo systemctl restart "$GUNICORN_SERVICE"
+# Absent if the first deploy that installs it is the one failing
+if systemctl cat "$JOBS_SERVICE" >/dev/null 2>&1; then
+    sudo systemctl restart "$JOBS_SERVICE"
+fi
 sudo systemctl restart "$NGINX_SERVICE"
 
 echo "[Rollback] ✅ Rollback complete. Active release is now: $previous_release"
@@ -1,37 +1,11 @@
 """
-Utilities for generating signed CloudFront URLs for secure access to private video objects.
-"""
-
-import os
-from datetime import datetime, timedelta, timezone
-from django.conf import settings
-from botocore.signers import CloudFrontSigner
-from cryptography.hazmat.primitives import hashes, serialization
-from cryptography.hazmat.primitives.asymmetric import padding
-
-
-def _rsa_signer(message: bytes) -> bytes:
-    """Helper for CloudFrontSigner: signs the policy with your private key."""
-    key_file_path = getattr(settings, "CLOUDFRONT_KEY_FILE", None)
+Backward-compatible entry points for signed CloudFront video URLs.
 
-    if not key_file_path or not os.path.exists(key_file_path):
-        raise FileNotFoundError(f"❌ CloudFront private key file not found: {key_file_path}")
-
-    try:
-        with open(key_file_path, "rb") as key_file:
-            private_key = serialization.load_pem_private_key(
-                key_file.read(),
-                password=None,  # CloudFront keys typically don't use passwords
-            )
-
-        return private_key.sign(
-            message,
-            padding.PKCS1v15(),
-            hashes.SHA1()  # CloudFront requires RSA-SHA1
-        )
+Signing lives in ``jiujitsuteria.utils.cloudfront``; the backend
+(``cryptography`` by default) is chosen with ``CLOUDFRONT_SIGNING_BACKEND``.
+"""
 
-    except Exception as e:
-        raise ValueError(f"❌ Failed to load/sign with private key: {str(e)}")
+from jiujitsuteria.utils.cloudfront import generate_signed_url
 
 
 def generate_signed_video_url(key: str, expires_in: int = 3600) -> str:
@@ -46,31 +20,7 @@ def generate_signed_video_url(key: str, expires_in: int = 3600) -> str:
     Returns:
         str: Signed CloudFront URL
     """
-    cloudfront_domain = getattr(settings, "CLOUDFRONT_DOMAIN", None)
-    key_id = getattr(settings, "CLOUDFRONT_KEY_ID", None)  # CloudFront Key Pair ID (Kxxxxxxx)
-    key_file_path = getattr(settings, "CLOUDFRONT_KEY_FILE", None)
-
-    if not cloudfront_domain:
-        raise ValueError("❌ CLOUDFRONT_DOMAIN must be set in settings.py")
-    if not key_id:
-        raise ValueError("❌ CLOUDFRONT_KEY_ID must be set in settings.py (use CloudFront Key Pair ID starting with 'K')")
-    if not key_file_path:
-        raise ValueError("❌ CLOUDFRONT_KEY_FILE must be set in settings.py")
-
-    # Normalize key (remove leading slashes)
-    key = key.lstrip('/')
-
-    # Full URL before signing
-    url = f"https://{cloudfront_domain}/{key}"
-
-    # Expiration time
-    expire_date = datetime.now(timezone.utc) + timedelta(seconds=expires_in)
-
-    try:
-        signer = CloudFrontSigner(key_id, _rsa_signer)
-        return signer.generate_presigned_url(url, date_less_than=expire_date)
-    except Exception as e:
-        raise ValueError(f"❌ Failed to generate signed URL: {str(e)}")
+    return generate_signed_url(key, expires_in=expires_in)
 
 
 def test_signed_video_url():